@@ -1,16 +1,40 @@
+"""
+TMC_2209 simulator
+
+Drop-in replacement of the TMC_2209 library for development without the hardware. It simulates the driver instead
+of doing nothing: the step pulses and the VACTUAL velocity move a simulated motor shaft, the library movement follows
+the step timing and acceleration ramps of the library, the stop modes work, and the registers are kept in memory.
+All timing runs on the clock of the driver, which is real time by default or the Clock of the dip coater (e.g. its
+VirtualClock, to time long moves without waiting for them).
+"""
 from ._TMC_2209_logger import TMC_logger, Loglevel
+from ._TMC_2209_uart import TMC_UART
+from ._TMC_2209_move import MovementAbsRel, StopMode, Direction
 
 import time
 import logging
+import threading
+
+# ======== REGISTER ADDRESSES ========
+GCONF = 0x00
+IOIN = 0x06
+VACTUAL = 0x22
+DRV_STATUS = 0x6F
+CHOPCONF = 0x6C
+
+VACTUAL_UNIT_HZ = 12e6 / 2 ** 24    # One VACTUAL unit in µsteps/s (internal 12 MHz clock)
+FULLSTEPS_PER_REV = 200
+
 
 class TMC_2209:
     from ._TMC_2209_comm import (set_direction_reg, set_current, set_interpolation, get_spreadcycle, set_spreadcycle,
                                  set_microstepping_resolution, set_internal_rsense)
 
-    from ._TMC_2209_move import (set_max_speed, set_acceleration, run_to_position_revolutions,
+    from ._TMC_2209_move import (set_max_speed, set_acceleration, run_to_position_steps, run_to_position_revolutions,
                                  run_to_position_revolutions_threaded, run_to_position_steps_threaded,
                                  wait_for_movement_finished_threaded,
-                                 set_movement_abs_rel, get_current_position, set_current_position, distance_to_go)
+                                 set_movement_abs_rel, get_current_position, set_current_position, distance_to_go, make_a_step,
+                                 stop)
 
     from ._TMC_2209_test import (
         test_stallguard_threshold
@@ -19,26 +43,135 @@ class TMC_2209:
     def __init__(self, pin_en, pin_step=-1, pin_dir=-1, baudrate=115200, serialport="/dev/serial0",
                  driver_address=0, gpio_mode=None, loglevel=None, logprefix=None,
                  log_handlers: list = None, log_formatter: logging.Formatter = None,
-                 skip_uart_init: bool = False):
-        self.tmc_logger = TMC_logger(loglevel, logprefix, log_handlers, log_formatter)
+                 skip_uart_init: bool = False, clock=None):
+        """constructor
 
-        self.tmc_logger.log("Using mock TMC library", Loglevel.WARNING)
+        Args:
+            clock: clock with monotonic() and sleep() to run the simulation on, e.g. the Clock of the dip coater
+                (Default value = None = real time)
+        """
+        self.tmc_logger = TMC_logger(loglevel, logprefix, log_handlers, log_formatter)
+        self.tmc_uart = TMC_UART(self.tmc_logger, serialport, baudrate, driver_address)
+        self.clock = clock if clock is not None else time
+
+        # Simulated motor
+        self.shaft_position = 0     # Position of the motor shaft in µsteps (moved by step pulses and VACTUAL)
+        self.steps_made = 0         # Number of step pulses since start-up
+        self.last_step_time = None
+        self.motor_enabled = False
+        self._direction_pin = True
+        self._vactual = 0           # VACTUAL velocity in µsteps/s
+        self._vactual_since = None
+        self._vactual_lock = threading.Lock()
+
+        # Library movement state (AccelStepper)
+        self._movement_abs_rel = MovementAbsRel.ABSOLUTE
+        self._movement_thread = None
+        self._stop = StopMode.NO
+        self._direction = Direction.CW
+        self._current_pos = 0
+        self._target_pos = 0
+        self._speed = 0.0
+        self._max_speed = 0.0
+        self._acceleration = 0.0
+        self._step_interval = 0
+        self._last_step_time = 0
+        self._n = 0
+        self._c0 = 0.0
+        self._cn = 0.0
+        self._cmin = 1.0
+        self._steps_per_rev = FULLSTEPS_PER_REV
+        self.set_max_speed(1)
+        self.set_acceleration(1)
+
+        self.tmc_logger.log("Using the simulated TMC library", Loglevel.WARNING)
         self.tmc_logger.log("Init", Loglevel.INFO)
 
     def set_step_mode(self, _step_mode: int):
         pass
 
+    def set_direction_pin(self, direction):
+        """sets the motor direction pin
+
+        Args:
+            direction (bool): True for the positive (CW) direction, False for the negative (CCW) direction
+        """
+        self._direction_pin = bool(direction)
+
     def set_motor_enabled(self, en):
+        self.motor_enabled = en
         self.tmc_logger.log(f"Motor output active: {en}", Loglevel.INFO)
 
-    def set_vactual(self, flag: bool):
-        pass
+    def set_vactual(self, vactual):
+        """sets the register bit "VACTUAL" to to a given value
+        VACTUAL allows moving the motor by UART control.
+        It gives the motor velocity in +-(2^23)-1 [µsteps / t]
+        0: Normal operation. Driver reacts to STEP input
+
+        Args:
+            vactual (int): value for VACTUAL (24-bit two's complement)
+        """
+        vactual = int(vactual) & 0xFFFFFF
+        self.tmc_uart.write_reg(VACTUAL, vactual)
+        if vactual & 0x800000:
+            vactual -= 1 << 24
+        with self._vactual_lock:
+            self._update_vactual_position()
+            self._vactual = vactual * VACTUAL_UNIT_HZ
+            self._vactual_since = self.clock.monotonic()
+
+    def _update_vactual_position(self):
+        """moves the shaft by the distance the VACTUAL velocity covered since the last update"""
+        now = self.clock.monotonic()
+        if self._vactual and self._vactual_since is not None:
+            steps = round(self._vactual * (now - self._vactual_since))
+            self.shaft_position += steps
+            self._vactual_since += steps / self._vactual
+        else:
+            self._vactual_since = now
+
+    def get_shaft_position(self):
+        """returns the position of the simulated motor shaft in µsteps, including a running VACTUAL movement"""
+        with self._vactual_lock:
+            self._update_vactual_position()
+            return self.shaft_position
 
     def set_vactual_rps(self, rps, duration=0, revolutions=0, acceleration=0):
-        pass
+        """converts the rps parameter to a vactual value which represents
+        rotation speed in µsteps/s and runs the motor for the given duration or revolutions
+
+        Args:
+            rps (float): value for vactual in rps
+            duration (int): time in s (Default value = 0)
+            revolutions (int): amount of revolutions (Default value = 0)
+            acceleration (int): ignored by the simulator (Default value = 0)
+        """
+        speed = rps * self._steps_per_rev
+        if revolutions:
+            duration = abs(revolutions / rps) if rps else 0
+            speed = abs(speed) if revolutions > 0 else -abs(speed)
+        self.set_vactual(round(speed / VACTUAL_UNIT_HZ))
+        if duration:
+            self.clock.sleep(duration)
+            self.set_vactual(0)
 
     def read_steps_per_rev(self):
-        return 200
+        """returns how many steps are needed for one revolution, from the MRES field of CHOPCONF"""
+        mres = (self.tmc_uart.read_int(CHOPCONF) >> 24) & 0xF
+        self._steps_per_rev = FULLSTEPS_PER_REV * (256 >> mres)
+        return self._steps_per_rev
+
+    def read_gconf(self):
+        self.tmc_logger.log(f"GCONF: {self.tmc_uart.read_int(GCONF):#010x}", Loglevel.INFO)
+
+    def read_chopconf(self):
+        self.tmc_logger.log(f"CHOPCONF: {self.tmc_uart.read_int(CHOPCONF):#010x}", Loglevel.INFO)
+
+    def read_ioin(self):
+        self.tmc_logger.log(f"IOIN: enable {self.motor_enabled}, direction {self._direction_pin}", Loglevel.INFO)
+
+    def read_drv_status(self):
+        self.tmc_logger.log(f"DRV_STATUS: standstill {self._vactual == 0}", Loglevel.INFO)
 
     def do_homing(self, diag_pin, revolutions=10, threshold=None, speed_rpm=None):
         """homes the motor in the given direction using stallguard.
@@ -55,7 +188,8 @@ class TMC_2209:
             not homing_failed (bool): true when homing was successful
         """
         # Simulate the homing process
-        time.sleep(5)
+        self.clock.sleep(5)
+        return True
 
     def do_homing2(self, revolutions, threshold=None):
         """homes the motor in the given direction using stallguard
@@ -67,4 +201,4 @@ class TMC_2209:
             threshold (int, optional): StallGuard detection threshold (Default value = None)
         """
         # Simulate the homing process
-        time.sleep(5)
+        self.clock.sleep(5)
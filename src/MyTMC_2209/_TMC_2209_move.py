@@ -1,5 +1,13 @@
+"""
+TMC_2209 simulator: movement
+
+The library movement (run_to_position_*) follows the AccelStepper algorithm of the TMC library, step by step on the
+clock of the driver, so the step timing, acceleration ramps, position counters and stop modes behave like on the
+hardware.
+"""
 from enum import Enum
-import time
+import math
+import threading
 
 class MovementAbsRel(Enum):
     """movement absolute or relative"""
@@ -12,44 +20,245 @@ class StopMode(Enum):
     SOFTSTOP = 1
     HARDSTOP = 2
 
+class Direction(Enum):
+    """movement direction of the motor"""
+    CCW = 0
+    CW = 1
+
 
 def set_max_speed(self, speed):
-    pass
+    """sets the maximum motor speed in µsteps per second
+
+    Args:
+        speed (int): speed in µsteps/sec
+    """
+    speed = abs(speed)
+    if self._max_speed != speed and speed > 0:
+        self._max_speed = speed
+        self._cmin = 1000000.0 / speed
+        # Recompute _n from the current speed and adjust the speed if accelerating or cruising
+        if self._n > 0:
+            self._n = (self._speed * self._speed) / (2.0 * self._acceleration)
+            compute_new_speed(self)
 
 def set_acceleration(self, acceleration):
-    pass
+    """sets the motor acceleration/deceleration in µsteps per sec per sec
+
+    Args:
+        acceleration (int): acceleration/deceleration in µsteps/sec²
+    """
+    acceleration = abs(acceleration)
+    if acceleration == 0:
+        return
+    if self._acceleration != acceleration:
+        # Recompute _n per Equation 17
+        self._n = self._n * (self._acceleration / acceleration)
+        # New c0 per Equation 7, with correction per Equation 15
+        self._c0 = 0.676 * math.sqrt(2.0 / acceleration) * 1000000.0
+        self._acceleration = acceleration
+        compute_new_speed(self)
+
+def run_to_position_steps(self, steps, movement_abs_rel = None):
+    """runs the motor to the given position (blocking, on the clock of the driver).
+    with acceleration and deceleration
+
+    Args:
+        steps (int): amount of steps; can be negative
+        movement_abs_rel (enum): whether the movement should be absolute or relative (Default value = None)
+
+    Returns:
+        stop (enum): how the movement was finished
+    """
+    if movement_abs_rel is None:
+        movement_abs_rel = self._movement_abs_rel
+    if movement_abs_rel == MovementAbsRel.RELATIVE:
+        self._target_pos = self._current_pos + steps
+    else:
+        self._target_pos = steps
+
+    self._stop = StopMode.NO
+    self._step_interval = 0
+    self._speed = 0.0
+    self._n = 0
+    self._last_step_time = self.clock.monotonic() * 1e6
+    compute_new_speed(self)
+    softstop_started = False
+    while run(self):
+        if self._stop == StopMode.HARDSTOP:
+            break
+        if self._stop == StopMode.SOFTSTOP and not softstop_started:
+            # Decelerate to standstill: move the target to the stopping distance
+            steps_to_stop = math.ceil((self._speed * self._speed) / (2.0 * self._acceleration))
+            self._target_pos = self._current_pos + (steps_to_stop if self._speed > 0 else -steps_to_stop)
+            softstop_started = True
+    self._speed = 0.0
+    self._step_interval = 0
+    return self._stop
 
 def run_to_position_revolutions(self, revolutions, movement_abs_rel = None):
-    time.sleep(1)   # Simulate the movement
+    """runs the motor to the given position (blocking).
+    with acceleration and deceleration
+
+    Args:
+        revolutions (int): amount of revs; can be negative
+        movement_abs_rel (enum): whether the movement should be absolute or relative (Default value = None)
+
+    Returns:
+        stop (enum): how the movement was finished
+    """
+    return run_to_position_steps(self, round(revolutions * self._steps_per_rev), movement_abs_rel)
 
 def run_to_position_revolutions_threaded(self, revolutions, movement_abs_rel = None):
-    pass
+    """runs the motor to the given position in a thread.
+    with acceleration and deceleration
+
+    Args:
+        revolutions (int): amount of revs; can be negative
+        movement_abs_rel (enum): whether the movement should be absolute or relative (Default value = None)
+    """
+    run_to_position_steps_threaded(self, round(revolutions * self._steps_per_rev), movement_abs_rel)
 
 def run_to_position_steps_threaded(self, steps, movement_abs_rel = None):
-    pass
+    """runs the motor to the given position in a thread.
+    with acceleration and deceleration
+
+    Args:
+        steps (int): amount of steps; can be negative
+        movement_abs_rel (enum): whether the movement should be absolute or relative (Default value = None)
+    """
+    self._movement_thread = threading.Thread(target=run_to_position_steps, args=(self, steps, movement_abs_rel),
+                                             daemon=True)
+    self._movement_thread.start()
 
 def wait_for_movement_finished_threaded(self):
-    return StopMode.NO
+    """wait for the motor to finish the movement, if started threaded
+
+    Returns:
+        stop (enum): how the movement was finished
+    """
+    if self._movement_thread is not None:
+        self._movement_thread.join()
+        self._movement_thread = None
+    return self._stop
+
+def make_a_step(self):
+    """method that makes one step
+
+    The simulated motor moves one µstep in the direction of the direction pin.
+    """
+    self.shaft_position += 1 if self._direction_pin else -1
+    self.steps_made += 1
+    self.last_step_time = self.clock.monotonic()
+
+def stop(self, stop_mode = StopMode.HARDSTOP):
+    """stop the current movement
+
+    Args:
+        stop_mode (enum): whether the movement should be stopped immediately or softly
+            (Default value = StopMode.HARDSTOP)
+    """
+    self._stop = stop_mode
 
 def set_movement_abs_rel(self, movement_abs_rel):
-    pass
+    """sets whether the movement should be relative or absolute
+
+    Args:
+        movement_abs_rel (enum): whether the movement should be absolute or relative
+    """
+    self._movement_abs_rel = movement_abs_rel
 
 def get_current_position(self):
     """returns the current motor position in µsteps
 
     Returns:
-        bool: current motor position
+        int: current motor position
     """
-    return 0
+    return self._current_pos
 
 def set_current_position(self, new_pos):
     """overwrites the current motor position in µsteps
 
     Args:
-        new_pos (bool): new position of the motor in µsteps
+        new_pos (int): new position of the motor in µsteps
     """
-    pass
+    self._current_pos = new_pos
 
 def distance_to_go(self):
     """returns the remaining distance the motor should run"""
-    return 0
+    return self._target_pos - self._current_pos
+
+def compute_new_speed(self):
+    """returns the calculated current speed depending on the acceleration
+    this code is based on:
+    "Generate stepper-motor speed profiles in real time" by David Austin
+    """
+    distance_to = distance_to_go(self)
+    steps_to_stop = (self._speed * self._speed) / (2.0 * self._acceleration)
+    if distance_to == 0 and steps_to_stop <= 1:
+        # We are at the target and its time to stop
+        self._step_interval = 0
+        self._speed = 0.0
+        self._n = 0
+        return
+
+    if distance_to > 0:
+        # We are anticlockwise from the target: need to go clockwise from now on, maybe decelerate now
+        if self._n > 0:
+            # Currently accelerating, need to decel now? Or maybe going the wrong way?
+            if steps_to_stop >= distance_to or self._direction == Direction.CCW:
+                self._n = -steps_to_stop    # Start deceleration
+        elif self._n < 0:
+            # Currently decelerating, need to accel again?
+            if steps_to_stop < distance_to and self._direction == Direction.CW:
+                self._n = -self._n          # Start acceleration
+    elif distance_to < 0:
+        # We are clockwise from the target: need to go anticlockwise from now on, maybe decelerate now
+        if self._n > 0:
+            if steps_to_stop >= -distance_to or self._direction == Direction.CW:
+                self._n = -steps_to_stop
+        elif self._n < 0:
+            if steps_to_stop < -distance_to and self._direction == Direction.CCW:
+                self._n = -self._n
+
+    if self._n == 0:
+        # First step from stopped
+        self._cn = self._c0
+        self._direction = Direction.CW if distance_to > 0 else Direction.CCW
+        self._direction_pin = self._direction == Direction.CW
+    else:
+        # Subsequent step. Works for accel (n is +_ve) and decel (n is -ve).
+        self._cn = self._cn - ((2.0 * self._cn) / ((4.0 * self._n) + 1))   # Equation 13
+        self._cn = max(self._cn, self._cmin)
+    self._n += 1
+    self._step_interval = self._cn
+    self._speed = 1000000.0 / self._cn
+    if self._direction == Direction.CCW:
+        self._speed = -self._speed
+
+def run(self):
+    """calculates a new speed if a speed was made
+
+    returns true if the target position is reached
+    should not be called from outside!
+    """
+    if run_speed(self):
+        compute_new_speed(self)
+    return self._speed != 0.0 or distance_to_go(self) != 0
+
+def run_speed(self):
+    """this methods does the actual steps with the current speed
+
+    Waits (on the clock of the driver) until the next step is due and makes it.
+    """
+    if not self._step_interval:
+        return False
+    due = self._last_step_time + self._step_interval    # µs
+    remaining = due - self.clock.monotonic() * 1e6
+    if remaining > 0:
+        self.clock.sleep(remaining / 1e6)
+    if self._stop == StopMode.HARDSTOP:
+        return False
+    self._current_pos += 1 if self._direction == Direction.CW else -1
+    make_a_step(self)
+    self._last_step_time = due
+    return True
@@ -0,0 +1,15 @@
+class TMC_UART:
+    """ Mock of the TMC UART interface that keeps the register values in memory """
+    def __init__(self, tmc_logger=None, serialport=None, baudrate=None, mtr_id=0):
+        self.tmc_logger = tmc_logger
+        self.registers = {}
+
+    def read_int(self, register, tries=10):
+        return self.registers.get(register, 0)
+
+    def write_reg(self, register, val):
+        self.registers[register] = val
+        return True
+
+    def write_reg_check(self, register, val, tries=10):
+        return self.write_reg(register, val)
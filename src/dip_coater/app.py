@@ -18,14 +18,18 @@ except ModuleNotFoundError:
 
 from TMC_2209._TMC_2209_logger import Loglevel
 from dip_coater.motor.tmc2209 import TMC2209_MotorDriver
+from dip_coater.motion.planner import MotionProfile
 from dip_coater.app_state import app_state
+from dip_coater.gpio import SimulatedGPIO
+from dip_coater.utils.clock import VirtualClock
 
 from dip_coater.logging.motor_logger import MotorLoggerHandler
 from dip_coater.commands.help_command import HelpCommand
 from dip_coater.screens.help_screen import HelpScreen
 from dip_coater.constants import (
     STEP_MODES, DEFAULT_STEP_MODE, DEFAULT_CURRENT, INVERT_MOTOR_DIRECTION, USE_INTERPOLATION, USE_SPREAD_CYCLE,
-    DEFAULT_LOGGING_LEVEL
+    DEFAULT_LOGGING_LEVEL, MOTION_PROFILE, DEFAULT_JERK, USE_VACTUAL,
+    USE_STEP_PROCESS, RECORD_STEP_TIMING, STEP_TIMING_DIR, POSITION_JOURNAL_FILE, HOLD_MOTOR_ON_EXIT
 )
 
 from dip_coater.widgets.tabs.main_tab import MainTab
@@ -61,12 +65,28 @@ class DipCoaterApp(App):
                                                 spread_cycle=USE_SPREAD_CYCLE,
                                                 loglevel=log_level,
                                                 log_handlers=[motor_logger_handler],
-                                                log_formatter=logging_format)
+                                                log_formatter=logging_format,
+                                                motion_profile=MotionProfile(MOTION_PROFILE),
+                                                jerk_mm_s3=DEFAULT_JERK,
+                                                use_vactual=USE_VACTUAL,
+                                                use_step_process=USE_STEP_PROCESS,
+                                                record_step_timing=RECORD_STEP_TIMING,
+                                                step_timing_dir=STEP_TIMING_DIR,
+                                                journal_path=POSITION_JOURNAL_FILE,
+                                                hold_motor_on_exit=HOLD_MOTOR_ON_EXIT,
+                                                clock=app_state.clock)
+        if isinstance(app_state.gpio.backend, SimulatedGPIO):
+            # The simulated limit switches follow the carriage moved by the motor
+            app_state.gpio.backend.set_position_source(app_state.motor_driver.get_travelled_distance)
 
     def on_mount(self):
         # on_mount() is called after compose(), so the RichLog is known
         log = self.query_one("#logger", RichLog)
         log.write("Motor has been initialised.")
+        if app_state.motor_driver.restore_from_journal():
+            app_state.motor_controls.set_motor_state("enabled")
+            app_state.motor_controls.set_homing_found(True)
+            log.write("[green]Restored the homed position from the position journal.[/]")
 
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
@@ -110,11 +130,28 @@ def main():
     parser.add_argument('-l', '--log-level', type=str, default=DEFAULT_LOGGING_LEVEL.name,
                         choices=['NONE', 'ERROR', 'INFO', 'DEBUG', 'MOVEMENT', 'ALL'],
                         help='Set the logging level')
+    parser.add_argument('--headless', type=str, metavar='SCRIPT', default=None,
+                        help='Run a Coder script (.py) or recipe (.json, .toml) without the TUI and print its timeline')
+    parser.add_argument('--virtual-clock', action='store_true',
+                        help='Run on a virtual clock (simulated TMC library, no simulated GPIO), so moves and sleeps '
+                             'take no real time')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='With --headless: only compile the script and print its motion plan, without moving')
     args = parser.parse_args()
 
     # Convert string level to the appropriate value in your Loglevel enum
     log_level = getattr(Loglevel, args.log_level)
 
+    if args.virtual_clock:
+        app_state.clock = VirtualClock()
+    if args.headless is not None:
+        from dip_coater.headless import run_headless, dry_run_headless
+        if args.dry_run:
+            dry_run_headless(args.headless, app_state, log_level)
+        else:
+            run_headless(args.headless, app_state, log_level)
+        return
+
     app = DipCoaterApp(log_level)
     package_version = version("dip-coater")
     app.title = f"Dip Coater v{package_version}"
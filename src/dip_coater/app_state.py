@@ -1,11 +1,26 @@
-from dip_coater.gpio import get_gpio_instance
+from dip_coater.constants import (
+    GPIO_BACKEND_SELECTION, GPIO_BENCHMARK_OUT_PIN, GPIO_BENCHMARK_IN_PIN,
+    LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_UP_NC, LIMIT_SWITCH_DOWN_PIN, LIMIT_SWITCH_DOWN_NC,
+    SIMULATED_SWITCH_UP_POSITION, SIMULATED_SWITCH_DOWN_POSITION, SIMULATED_START_POSITION, VIRTUAL_CLOCK
+)
+from dip_coater.gpio import get_gpio_instance, SimulatedSwitch
+from dip_coater.utils.clock import Clock, VirtualClock
+from dip_coater.utils.threading_util import AbortSignal
+
+SIMULATED_SWITCHES = [
+    SimulatedSwitch(LIMIT_SWITCH_UP_PIN, SIMULATED_SWITCH_UP_POSITION, upper=True, nc=LIMIT_SWITCH_UP_NC),
+    SimulatedSwitch(LIMIT_SWITCH_DOWN_PIN, SIMULATED_SWITCH_DOWN_POSITION, upper=False, nc=LIMIT_SWITCH_DOWN_NC),
+]
 
 class AppState:
     """
     This class is used to store a shared state of the application.
     """
     def __init__(self):
-        self.gpio = get_gpio_instance()
+        self.gpio = get_gpio_instance(GPIO_BACKEND_SELECTION, GPIO_BENCHMARK_OUT_PIN, GPIO_BENCHMARK_IN_PIN,
+                                      SIMULATED_SWITCHES, SIMULATED_START_POSITION)
+        self.clock = VirtualClock() if VIRTUAL_CLOCK else Clock()
+        self.abort_signal = AbortSignal()   # Aborts the running Coder script or plan (STOP button)
         self.motor_driver = None
         self.motor_state = "disabled"
         self.homing_found = False
@@ -30,6 +30,22 @@ DEFAULT_ACCELERATION = 30
 MIN_ACCELERATION = 0.5
 MAX_ACCELERATION = 50
 
+# Motion profile settings
+MOTION_PROFILE = "trapezoidal"  # "trapezoidal" or "s-curve"
+DEFAULT_JERK = 500  # mm/s^3 (only used for the "s-curve" motion profile)
+
+# Run slow constant-velocity moves (withdrawal) on the internal VACTUAL step generator of the driver
+USE_VACTUAL = True
+USE_STEP_PROCESS = False     # Generate the STEP/DIR pulses in a dedicated real-time process
+
+# Run on a virtual clock (simulated TMC library only): moves and sleeps take no real time, so long recipes finish in
+# seconds while the simulated timeline stays exact. Not with the simulated GPIO, whose limit switches run in real time.
+VIRTUAL_CLOCK = False
+
+# Step timing instrumentation (jitter statistics of the STEP/DIR moves in the Logs tab)
+RECORD_STEP_TIMING = False
+STEP_TIMING_DIR = "step_timing"     # Directory to save the recorded step timing (.npy) in (None = don't save)
+
 # Step mode settings
 STEP_MODES = {
     "I1": 1,
@@ -78,6 +94,10 @@ HOMING_MAX_THRESHOLD = 255
 HOMING_SPEED_MM_S = 2
 HOMING_MIN_SPEED = 0.2
 HOMING_MAX_SPEED = 5
+HOMING_TWO_SPEED = False    # Fast approach, short back-off and slow touch-off at HOMING_SPEED_MM_S
+HOMING_FAST_SPEED_MM_S = 10
+HOMING_MIN_FAST_SPEED = 1
+HOMING_MAX_FAST_SPEED = 20  # Up to MAX_SPEED
 HOME_UP = True      # Home the motor upwards (True) or downwards (False)
 
 # Other motor settings
@@ -102,4 +122,20 @@ HIGH_SPEED_INTERPOLATION = False
 HIGH_SPEED_SPREAD_CYCLE = True
 
 # Application config file
-CONFIG_FILE = "dip_coater_config.json"
\ No newline at end of file
+CONFIG_FILE = "dip_coater_config.json"
+POSITION_JOURNAL_FILE = "dip_coater_position.jsonl"   # Journal of the motor position (None = don't keep a journal)
+HOLD_MOTOR_ON_EXIT = False  # Keep the motor enabled on exit, so the homed position is restored on the next start
+#   (only when the GPIO backend can read the enable pin back at start-up: not with gpiozero, e.g. on the Pi 5)
+
+
+# GPIO backend
+GPIO_BACKEND_SELECTION = "board"  # "board" = from the board type, "fastest" = fastest backend in the GPIO benchmark,
+                                  # "simulated" = simulated limit switches that follow the motor position
+GPIO_BENCHMARK_OUT_PIN = None     # Output pin of a loopback wire to GPIO_BENCHMARK_IN_PIN (None = no loopback)
+                                  # ("fastest" needs the loopback, it falls back to "board" without one)
+GPIO_BENCHMARK_IN_PIN = 21        # Unused input pin to benchmark on
+
+# Simulated axis (GPIO_BACKEND_SELECTION = "simulated"), positions in mm measured upwards from the bottom switch
+SIMULATED_SWITCH_DOWN_POSITION = 0
+SIMULATED_SWITCH_UP_POSITION = 100
+SIMULATED_START_POSITION = 50
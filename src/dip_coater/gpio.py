@@ -1,7 +1,16 @@
 from abc import ABC, abstractmethod
 
 from enum import Enum, IntEnum
+import heapq
 import os
+import queue
+import random
+import select
+import threading
+import time
+from typing import NamedTuple
+
+DEFAULT_DISPATCH_IDLE_S = 0.5   # How often the idle edge dispatcher checks whether it has to shut down
 
 class Board(Enum):
     """board"""
@@ -49,6 +58,23 @@ class GPIOBase(ABC):
     def input(self, pin) -> GpioState:
         pass
 
+    def inputs(self, pins) -> dict:
+        """ Read several input pins at once (backends that can read them in one call override this) """
+        return {pin: self.input(pin) for pin in pins}
+
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        """ Set up an output pin, keeping the level it is still driven at by a previous run of the app (so an enable
+        pin can stay asserted over a restart). A pin that isn't driven is set to the default level. Backends that
+        can't read the level back always set the default level.
+
+        :param pin: The GPIO pin
+        :param default: The level of a pin that isn't driven yet
+        :return: The level the pin is driven at
+        """
+        self.setup(pin, GpioMode.OUT)
+        self.output(pin, default)
+        return default
+
     @abstractmethod
     def add_event_detect(self, pin, edge: GpioEdge, callback, bouncetime=None):
         pass
@@ -84,6 +110,14 @@ class RPiGPIO(GPIOBase):
     def output(self, pin, state: GpioState):
         self.GPIO.output(pin, state)
 
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        if self.GPIO.gpio_function(pin) == self.GPIO.OUT:
+            # Still an output: setting it up without an initial level keeps the level it is driven at
+            self.GPIO.setup(pin, self.GPIO.OUT)
+            return GpioState(self.GPIO.input(pin))
+        self.GPIO.setup(pin, self.GPIO.OUT, initial=default)
+        return default
+
     def input(self, pin) -> GpioState:
         return GpioState(self.GPIO.input(pin))
 
@@ -109,15 +143,30 @@ class RPiGPIO(GPIOBase):
 
 
 class GPIOd(GPIOBase):
+    """ libgpiod (v2) backend
+
+    All configured pins share a single multi-line request, so the kernel line handles are only requested when the
+    set of pins changes (in setup()). Edge detection is switched in place with reconfigure_lines(), and the edge
+    events of all pins are read by one reader thread, which is paused while the request is replaced.
+    """
     def __init__(self):
         import gpiod
-        self.chip = gpiod.Chip('/dev/gpiochip0')
-        self.lines = {}
+        self.chip_path = '/dev/gpiochip0'
+        self.settings = {}      # The LineSettings of every configured pin
+        self.values = {}        # The last written Value of every output pin (kept when the lines are requested again)
+        self.request = None     # The single multi-line request of all configured pins
         self.callbacks = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)     # Signals a change of the request or of the reader state
+        self._replacing = False     # Whether the request is being replaced (the reader must not use it)
+        self._reader_busy = False   # Whether the reader is waiting on (or reading from) the request
+        self._wake_r, self._wake_w = os.pipe()  # Wakes the reader from its wait on the request
+        self._reader = None
+        self._running = False
 
     def setup(self, pin, mode: GpioMode, pull_up_down: GpioPUD = GpioPUD.PUD_OFF, active_state=None):
         import gpiod
-        from gpiod.line import Direction, Value, Edge, Bias
+        from gpiod.line import Direction, Bias, Value
         config = gpiod.LineSettings()
         if mode == GpioMode.OUT:
             config.direction = Direction.OUTPUT
@@ -128,59 +177,151 @@ class GPIOd(GPIOBase):
             elif pull_up_down == GpioPUD.PUD_DOWN:
                 config.bias = Bias.PULL_DOWN
 
-        self.lines[pin] = self.chip.request_lines(
-            consumer="myapp",
-            config={pin: config}
-        )
+        with self._lock:
+            new_pin = pin not in self.settings
+            self.settings[pin] = config
+            if mode == GpioMode.OUT:
+                self.values.setdefault(pin, Value.INACTIVE)
+            else:
+                self.values.pop(pin, None)
+            if new_pin or self.request is None:
+                # The set of lines changed: request all lines again, once
+                self._replace_request()
+            else:
+                self.request.reconfigure_lines(self._line_config())
+
+    def _line_config(self) -> dict:
+        """ The line config of all configured pins, with the outputs at their current value (requesting or
+        reconfiguring the lines sets the outputs to the value in their settings). Call with the lock held. """
+        for pin, value in self.values.items():
+            self.settings[pin].output_value = value
+        return dict(self.settings)
+
+    def _replace_request(self):
+        """ Release the request and request all configured lines again. The reader is woken and paused first, so it
+        never waits on a released request. Call with the lock held. """
+        import gpiod
+        self._replacing = True
+        try:
+            if self._reader_busy:
+                os.write(self._wake_w, b"\0")
+            while self._reader_busy:
+                self._changed.wait()
+            if self.request is not None:
+                self.request.release()
+                self.request = None
+            self.request = gpiod.request_lines(self.chip_path, consumer="dip-coater", config=self._line_config())
+        finally:
+            self._replacing = False
+            self._changed.notify_all()
 
     def output(self, pin, state: GpioState):
         from gpiod.line import Value
         value = Value.ACTIVE if state == GpioState.HIGH else Value.INACTIVE
-        self.lines[pin].set_values({pin: value})
+        with self._lock:
+            self.values[pin] = value
+            self.request.set_values({pin: value})
+
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        import gpiod
+        from gpiod.line import Direction, Value
+        value = Value.ACTIVE if default == GpioState.HIGH else Value.INACTIVE
+        with gpiod.Chip(self.chip_path) as chip:
+            still_output = chip.get_line_info(pin).direction == Direction.OUTPUT
+        if still_output:
+            # Read the level the line is driven at without changing it (an as-is request)
+            with gpiod.request_lines(self.chip_path, consumer="dip-coater",
+                                     config={pin: gpiod.LineSettings(direction=Direction.AS_IS)}) as request:
+                value = request.get_value(pin)
+        with self._lock:
+            self.values[pin] = value    # Requested at this value by setup()
+        self.setup(pin, GpioMode.OUT)
+        return GpioState.HIGH if value == Value.ACTIVE else GpioState.LOW
 
     def input(self, pin) -> GpioState:
         from gpiod.line import Value
-        value = self.lines[pin].get_values()[pin]
+        with self._lock:
+            value = self.request.get_value(pin)
         return GpioState.HIGH if value == Value.ACTIVE else GpioState.LOW
 
-    def add_event_detect(self, pin, edge: GpioEdge, callback, bouncetime=None):
-        import gpiod
-        from gpiod.line import Direction, Edge
-        config = gpiod.LineSettings()
-        config.direction = Direction.INPUT
-        if edge == GpioEdge.RISING:
-            config.edge_detection = Edge.RISING
-        elif edge == GpioEdge.FALLING:
-            config.edge_detection = Edge.FALLING
-        else:
-            config.edge_detection = Edge.BOTH
-
-        self.lines[pin] = self.chip.request_lines(
-            consumer="myapp",
-            config={pin: config},
-            event_handler=self._event_handler
-        )
-        self.callbacks[pin] = callback
+    def inputs(self, pins) -> dict:
+        from gpiod.line import Value
+        pins = list(pins)
+        with self._lock:
+            values = self.request.get_values(pins)
+        return {pin: GpioState.HIGH if value == Value.ACTIVE else GpioState.LOW for pin, value in zip(pins, values)}
 
-    def _event_handler(self, event):
-        if event.line_offset in self.callbacks:
-            self.callbacks[event.line_offset](event.line_offset)
+    def add_event_detect(self, pin, edge: GpioEdge, callback, bouncetime=None):
+        from gpiod.line import Edge
+        if pin not in self.settings:
+            raise ValueError(f"Pin {pin} is not set up")
+        with self._lock:
+            self.settings[pin].edge_detection = {
+                GpioEdge.RISING: Edge.RISING,
+                GpioEdge.FALLING: Edge.FALLING,
+                GpioEdge.BOTH: Edge.BOTH,
+            }[edge]
+            self.callbacks[pin] = callback
+            self.request.reconfigure_lines(self._line_config())
+        self._start_reader()
 
     def add_event_callback(self, pin, callback):
         # This method might need to be adjusted based on your specific requirements
         self.callbacks[pin] = callback
 
     def remove_event_detect(self, pin):
-        if pin in self.lines:
-            self.lines[pin].release()
-            del self.lines[pin]
-        if pin in self.callbacks:
-            del self.callbacks[pin]
+        from gpiod.line import Edge
+        with self._lock:
+            self.callbacks.pop(pin, None)
+            if pin in self.settings and self.settings[pin].edge_detection != Edge.NONE:
+                self.settings[pin].edge_detection = Edge.NONE
+                self.request.reconfigure_lines(self._line_config())
+
+    def _start_reader(self):
+        if self._reader is None:
+            self._running = True
+            self._reader = threading.Thread(target=self._read_events, name="gpiod-edge-reader", daemon=True)
+            self._reader.start()
+
+    def _read_events(self):
+        """ Read the edge events of all lines and call their callbacks """
+        while self._running:
+            with self._lock:
+                while self._running and (self.request is None or self._replacing):
+                    self._changed.wait(DEFAULT_DISPATCH_IDLE_S)
+                if not self._running:
+                    break
+                request = self.request
+                self._reader_busy = True
+            try:
+                ready, _, _ = select.select([request.fd, self._wake_r], [], [], DEFAULT_DISPATCH_IDLE_S)
+                if self._wake_r in ready:
+                    os.read(self._wake_r, 64)
+                events = request.read_edge_events() if request.fd in ready else []
+            finally:
+                with self._lock:
+                    self._reader_busy = False
+                    self._changed.notify_all()
+            for event in events:
+                callback = self.callbacks.get(event.line_offset)
+                if callback is not None:
+                    callback(event.line_offset)
 
     def cleanup(self):
-        for line in self.lines.values():
-            line.release()
-        self.chip.close()
+        self._running = False
+        if self._reader is not None:
+            os.write(self._wake_w, b"\0")
+            with self._lock:
+                self._changed.notify_all()
+            self._reader.join(timeout=2 * DEFAULT_DISPATCH_IDLE_S)
+            self._reader = None
+        with self._lock:
+            if self.request is not None:
+                self.request.release()
+                self.request = None
+            self.settings.clear()
+            self.values.clear()
+            self.callbacks.clear()
 
 
 class GPIOZero(GPIOBase):
@@ -207,6 +348,12 @@ class GPIOZero(GPIOBase):
     def output(self, pin, state: GpioState):
         self.pins[pin].on() if state == GpioState.HIGH else self.pins[pin].off()
 
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        from gpiozero import LED
+        # The lgpio pin factory drives a pin low when it claims it as an output, so the level can't be kept
+        self.pins[pin] = LED(pin, initial_value=default == GpioState.HIGH)
+        return default
+
     def input(self, pin) -> GpioState:
         return GpioState.HIGH if self.pins[pin].is_pressed else GpioState.LOW
 
@@ -265,6 +412,9 @@ class DummyGPIO(GPIOBase):
         self.pins[pin] = state
         print(f"Pin {pin} set to {state.name}")
 
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        return self.pins.setdefault(pin, default)
+
     def input(self, pin) -> GpioState:
         return self.pins.get(pin, GpioState.LOW)
 
@@ -293,25 +443,443 @@ class DummyGPIO(GPIOBase):
         print("GPIO cleaned up")
 
 
-def get_board_type():
+class SimulatedSwitch(NamedTuple):
+    """ A limit switch of the simulated axis """
+    pin: int
+    position_mm: float      # Position of the switch on the axis in mm (measured upwards)
+    upper: bool             # True if the switch is pressed at and above its position, False at and below
+    nc: bool = True         # Normally closed (the pin is HIGH when pressed) or normally open (LOW when pressed)
+
+    def pressed(self, position_mm: float) -> bool:
+        return position_mm >= self.position_mm if self.upper else position_mm <= self.position_mm
+
+    def level(self, pressed: bool) -> GpioState:
+        return GpioState.HIGH if pressed == self.nc else GpioState.LOW
+
+
+class SimulatedGPIO(GPIOBase):
+    """ GPIO backend that simulates the limit switches of the axis
+
+    The switches are positions on the axis. A simulator thread follows the carriage position (from the position
+    source, normally the simulated motor) and fires the edges of a switch when the carriage crosses it, after a
+    latency and with contact bounce. Edges can also be scripted with inject_edge(). The callbacks are called from the
+    simulator thread, like the edge threads of the hardware backends. The simulation runs in real time, so the motor
+    must run on a real-time Clock.
+    """
+    def __init__(self, switches: list = None, start_position_mm: float = 0, latency_ms: float = 0.1,
+                 bounce_ms: float = 1, bounces: int = 3, poll_interval_ms: float = 0.5, seed: int = None):
+        """ Create a simulated GPIO backend
+
+        :param switches: The SimulatedSwitches of the axis (default: None = no switches)
+        :param start_position_mm: The carriage position in mm when the position source reads 0
+        :param latency_ms: The delay between crossing a switch and its first edge in ms
+        :param bounce_ms: The time in which the contact bounces settle in ms
+        :param bounces: The number of contact bounces on every switch transition (0 = clean edges)
+        :param poll_interval_ms: The interval at which the carriage position is sampled in ms
+        :param seed: The seed of the random bounce timing (default: None = random)
+        """
+        self.switches = {switch.pin: switch for switch in (switches or [])}
+        self.start_position_mm = start_position_mm
+        self.latency_ns = int(latency_ms * 1_000_000)
+        self.bounce_ns = int(bounce_ms * 1_000_000)
+        self.bounces = bounces
+        self.poll_interval_s = poll_interval_ms / 1000
+        self.trigger_positions = {}     # Carriage position in mm at which each switch was last pressed
+        self.pins = {}
+        self.callbacks = {}
+        self._edges = {}
+        self._position_source = None
+        self._pressed = {}
+        self._scheduled = []            # Heap of (time_ns, sequence, pin, state) edges to fire
+        self._sequence = 0
+        self._random = random.Random(seed)
+        self._condition = threading.Condition()
+        self._simulator = None
+        self._running = False
+
+    def set_position_source(self, position_mm):
+        """ Follow the carriage with the given position source
+
+        :param position_mm: Function that returns the distance the carriage travelled from its start position in mm
+            (positive for up)
+        """
+        self._position_source = position_mm
+        for switch in self.switches.values():
+            self._pressed[switch.pin] = switch.pressed(self.carriage_position_mm())
+        self._start_simulator()
+
+    def carriage_position_mm(self) -> float:
+        """ The simulated carriage position on the axis in mm """
+        source = self._position_source
+        return self.start_position_mm + (source() if source is not None else 0)
+
+    def inject_edge(self, pin, state: GpioState, delay_s: float = 0):
+        """ Schedule a level change of a pin (fires its callbacks like a real edge)
+
+        :param pin: The GPIO pin
+        :param state: The level of the pin after the edge
+        :param delay_s: The delay before the edge in s
+        """
+        self._schedule(time.perf_counter_ns() + int(delay_s * 1e9), pin, state)
+        self._start_simulator()
+
+    def setup(self, pin, mode: GpioMode, pull_up_down: GpioPUD = GpioPUD.PUD_OFF, active_state=None):
+        switch = self.switches.get(pin)
+        if switch is not None:
+            self.pins[pin] = switch.level(switch.pressed(self.carriage_position_mm()))
+        else:
+            self.pins.setdefault(pin, GpioState.LOW)
+
+    def output(self, pin, state: GpioState):
+        self.pins[pin] = state
+
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        return self.pins.setdefault(pin, default)
+
+    def input(self, pin) -> GpioState:
+        return self.pins.get(pin, GpioState.LOW)
+
+    def add_event_detect(self, pin, edge: GpioEdge, callback, bouncetime=None):
+        self._edges[pin] = edge
+        self.callbacks[pin] = [callback] if callback else []
+
+    def add_event_callback(self, pin, callback):
+        self.callbacks.setdefault(pin, []).append(callback)
+
+    def remove_event_detect(self, pin):
+        self._edges.pop(pin, None)
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify()
+        if self._simulator is not None:
+            self._simulator.join(timeout=1)
+            self._simulator = None
+        self.pins.clear()
+        self.callbacks.clear()
+        self._edges.clear()
+
+    def _schedule(self, time_ns: int, pin, state: GpioState):
+        with self._condition:
+            heapq.heappush(self._scheduled, (time_ns, self._sequence, pin, state))
+            self._sequence += 1
+            self._condition.notify()
+
+    def _schedule_transition(self, switch: SimulatedSwitch, pressed: bool, now_ns: int):
+        """ Schedule the edges of a switch transition: the new level after the latency, then the contact bounces """
+        start_ns = now_ns + self.latency_ns
+        new, old = switch.level(pressed), switch.level(not pressed)
+        self._schedule(start_ns, switch.pin, new)
+        if self.bounces and self.bounce_ns:
+            times = sorted(self._random.uniform(0, self.bounce_ns) for _ in range(2 * self.bounces))
+            for i, offset in enumerate(times):
+                self._schedule(start_ns + int(offset), switch.pin, old if i % 2 == 0 else new)
+
+    def _start_simulator(self):
+        if self._simulator is None:
+            self._running = True
+            self._simulator = threading.Thread(target=self._simulate, name="simulated-gpio", daemon=True)
+            self._simulator.start()
+
+    def _simulate(self):
+        while self._running:
+            now_ns = time.perf_counter_ns()
+            if self._position_source is not None:
+                position_mm = self.carriage_position_mm()
+                for switch in self.switches.values():
+                    pressed = switch.pressed(position_mm)
+                    if pressed != self._pressed.get(switch.pin):
+                        self._pressed[switch.pin] = pressed
+                        if pressed:
+                            self.trigger_positions[switch.pin] = position_mm
+                        self._schedule_transition(switch, pressed, now_ns)
+
+            due = []
+            with self._condition:
+                while self._scheduled and self._scheduled[0][0] <= now_ns:
+                    due.append(heapq.heappop(self._scheduled))
+                if not due:
+                    timeout = self.poll_interval_s if self._position_source is not None else DEFAULT_DISPATCH_IDLE_S
+                    if self._scheduled:
+                        timeout = min(timeout, (self._scheduled[0][0] - now_ns) / 1e9)
+                    self._condition.wait(timeout)
+            for _, _, pin, state in due:
+                self._fire(pin, state)
+
+    def _fire(self, pin, state: GpioState):
+        """ Change the level of a pin and call its callbacks if the edge matches the event detection """
+        if self.pins.get(pin) == state:
+            return
+        self.pins[pin] = state
+        edge = self._edges.get(pin)
+        if edge is None or (edge == GpioEdge.RISING and state != GpioState.HIGH) or \
+                (edge == GpioEdge.FALLING and state != GpioState.LOW):
+            return
+        for callback in list(self.callbacks.get(pin, [])):
+            try:
+                callback(pin)
+            except Exception as err:
+                print(f"Error in the simulated edge callback of pin {pin}: {err}")
+
+
+class EdgeEvent(NamedTuple):
+    """ A single edge on an input pin """
+    pin: int
+    timestamp_ns: int       # time.perf_counter_ns() at which the edge arrived
+    state: GpioState        # The level of the pin right after the edge
+
+
+class PinDebouncer:
+    """ Debounce state machine of a single input pin
+
+    An edge to a new level starts a stability window; every further edge restarts it, and an edge back to the
+    confirmed level cancels it. When the window expires with the pin still at the new level, the level change is
+    confirmed. No sleeping is involved: the dispatcher just checks the deadline.
+    """
+    def __init__(self, pin, edge: GpioEdge, callback, stable_ms: float, state: GpioState):
+        """ Create a debouncer
+
+        :param pin: The GPIO pin
+        :param edge: The confirmed edges to report (RISING, FALLING, BOTH)
+        :param callback: The function to call with the pin number for every confirmed edge (None = no callback yet)
+        :param stable_ms: The time the new level must be stable in ms (None or 0 = report every edge right away)
+        :param state: The current level of the pin
+        """
+        self.pin = pin
+        self.edge = edge
+        self.callbacks = [callback] if callback else []
+        self.stable_ns = int((stable_ms or 0) * 1_000_000)
+        self.confirmed = state
+        self.pending = None
+        self.deadline_ns = None
+        self.last_event = None
+
+    def on_edge(self, event: EdgeEvent) -> bool:
+        """ Feed an edge into the state machine
+
+        :return: True if the edge is confirmed right away (no debouncing) and must be reported
+        """
+        self.last_event = event
+        if self.stable_ns == 0:
+            self.confirmed = event.state
+            return self._reports(event.state)
+        if event.state == self.confirmed:
+            self.pending, self.deadline_ns = None, None    # Bounced back before the window expired
+        else:
+            self.pending, self.deadline_ns = event.state, event.timestamp_ns + self.stable_ns
+        return False
+
+    def on_deadline(self, now_ns: int, state: GpioState) -> bool:
+        """ Check the stability window
+
+        :param now_ns: The current time.perf_counter_ns()
+        :param state: The current level of the pin
+
+        :return: True if a level change is confirmed and must be reported
+        """
+        if self.deadline_ns is None or now_ns < self.deadline_ns:
+            return False
+        if state != self.pending:
+            # An edge got lost: the level changed again without an event
+            self.pending, self.deadline_ns = (None, None) if state == self.confirmed else (state, now_ns + self.stable_ns)
+            return False
+        self.confirmed, self.pending, self.deadline_ns = state, None, None
+        return self._reports(state)
+
+    def _reports(self, state: GpioState) -> bool:
+        if self.edge == GpioEdge.RISING:
+            return state == GpioState.HIGH
+        if self.edge == GpioEdge.FALLING:
+            return state == GpioState.LOW
+        return True
+
+
+class EdgeEventGPIO(GPIOBase):
+    """ GPIO event layer on top of a GPIO backend
+
+    The edge callback of the backend only timestamps the edge and puts it on a queue, so it never blocks the
+    backend's callback thread. A dispatcher thread feeds the edges into a debounce state machine per pin and calls
+    the registered callbacks as soon as an edge is confirmed. The bouncetime of add_event_detect() is the time the
+    new level must be stable (None = report every edge).
+    """
+    def __init__(self, backend: GPIOBase):
+        self.backend = backend
+        self._events = queue.SimpleQueue()
+        self._debouncers = {}
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._running = False
+
+    def setup(self, pin, mode: GpioMode, pull_up_down: GpioPUD = GpioPUD.PUD_OFF, active_state=None):
+        self.backend.setup(pin, mode, pull_up_down, active_state)
+
+    def output(self, pin, state: GpioState):
+        self.backend.output(pin, state)
+
+    def input(self, pin) -> GpioState:
+        return self.backend.input(pin)
+
+    def inputs(self, pins) -> dict:
+        return self.backend.inputs(pins)
+
+    def claim_output(self, pin, default: GpioState) -> GpioState:
+        return self.backend.claim_output(pin, default)
+
+    def add_event_detect(self, pin, edge: GpioEdge, callback, bouncetime=None):
+        debouncer = PinDebouncer(pin, edge, callback, bouncetime, self.backend.input(pin))
+        with self._lock:
+            self._debouncers[pin] = debouncer
+        self.backend.add_event_detect(pin, GpioEdge.BOTH, callback=self._on_edge)
+        self._start_dispatcher()
+
+    def add_event_callback(self, pin, callback):
+        with self._lock:
+            self._debouncers[pin].callbacks.append(callback)
+
+    def remove_event_detect(self, pin):
+        self.backend.remove_event_detect(pin)
+        with self._lock:
+            self._debouncers.pop(pin, None)
+
+    def last_event(self, pin) -> EdgeEvent:
+        """ The last (raw) edge of an input pin with event detection, or None """
+        debouncer = self._debouncers.get(pin)
+        return debouncer.last_event if debouncer is not None else None
+
+    def cleanup(self):
+        self._running = False
+        if self._dispatcher is not None:
+            self._events.put(None)
+            self._dispatcher.join(timeout=1)
+            self._dispatcher = None
+        with self._lock:
+            self._debouncers.clear()
+        self.backend.cleanup()
+
+    def _on_edge(self, pin):
+        """ Edge callback of the backend: timestamp and enqueue only """
+        self._events.put(EdgeEvent(pin, time.perf_counter_ns(), self.backend.input(pin)))
+
+    def _start_dispatcher(self):
+        if self._dispatcher is None:
+            self._running = True
+            self._dispatcher = threading.Thread(target=self._dispatch, name="gpio-edge-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while self._running:
+            with self._lock:
+                deadlines = [d.deadline_ns for d in self._debouncers.values() if d.deadline_ns is not None]
+            timeout = DEFAULT_DISPATCH_IDLE_S
+            if deadlines:
+                timeout = max(min(deadlines) - time.perf_counter_ns(), 0) / 1e9
+            try:
+                event = self._events.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+
+            confirmed = []
+            with self._lock:
+                if event is not None:
+                    debouncer = self._debouncers.get(event.pin)
+                    if debouncer is not None and debouncer.on_edge(event):
+                        confirmed.append(debouncer)
+                now_ns = time.perf_counter_ns()
+                expired = [d for d in self._debouncers.values() if d.deadline_ns is not None and now_ns >= d.deadline_ns]
+                if expired:
+                    states = self.backend.inputs([debouncer.pin for debouncer in expired])
+                    for debouncer in expired:
+                        if debouncer.on_deadline(now_ns, states[debouncer.pin]):
+                            confirmed.append(debouncer)
+            for debouncer in confirmed:
+                for callback in list(debouncer.callbacks):
+                    try:
+                        callback(debouncer.pin)
+                    except Exception as err:
+                        print(f"Error in the edge callback of pin {debouncer.pin}: {err}")
+
+
+def get_board_model():
+    """ The model string of the board (e.g. 'Raspberry Pi 4 Model B Rev 1.4'), or None if it is unknown """
     if not os.path.exists('/proc/device-tree/model'):
-        return Board.UNKNOWN
+        return None
 
     with open('/proc/device-tree/model', encoding="utf-8") as f:
-        model = f.readline().lower()
-        if "raspberry pi 5" in model:
-            return Board.RASPBERRY_PI5
-        elif "raspberry" in model:
-            return Board.RASPBERRY_PI
-        else:
-            return Board.UNKNOWN
+        return f.readline().strip().strip("\x00")
+
+
+def get_board_type():
+    model = get_board_model()
+    if model is None:
+        return Board.UNKNOWN
 
+    model = model.lower()
+    if "raspberry pi 5" in model:
+        return Board.RASPBERRY_PI5
+    elif "raspberry" in model:
+        return Board.RASPBERRY_PI
+    else:
+        return Board.UNKNOWN
 
-def get_gpio_instance():
+
+def get_gpio_instance(backend_selection: str = "board", benchmark_out_pin: int = None, benchmark_in_pin: int = 21,
+                      simulated_switches: list = None, simulated_start_position_mm: float = 0):
     """
-    Get the GPIO instance based on the board type.
+    Get the GPIO instance, with the timestamped and debounced edge event layer on top.
     !!! This function should be called only once in the application !!!
+
+    :param backend_selection: "board" to pick the backend from the board type, "fastest" to use the fastest working
+    backend according to the GPIO benchmark (the result is cached per board model in the config file), or "simulated"
+    to simulate the limit switches of the axis
+    :param benchmark_out_pin: The output pin of the benchmark loopback wire (None = no loopback, which "fastest"
+    needs to measure the callback latency)
+    :param benchmark_in_pin: The (unused) input pin to benchmark on
+    :param simulated_switches: The SimulatedSwitches of the "simulated" backend
+    :param simulated_start_position_mm: The start position of the carriage on the simulated axis in mm
     """
+    if backend_selection == "simulated":
+        print("Using the simulated GPIO backend")
+        return EdgeEventGPIO(SimulatedGPIO(simulated_switches, simulated_start_position_mm))
+    if backend_selection == "fastest":
+        backend = _get_fastest_gpio_backend(benchmark_out_pin, benchmark_in_pin)
+        if backend is not None:
+            return EdgeEventGPIO(backend)
+    return EdgeEventGPIO(_get_gpio_backend())
+
+
+def _get_fastest_gpio_backend(out_pin: int, in_pin: int):
+    from dip_coater.gpio_benchmark import benchmark_all, create_backend, select_fastest
+    from dip_coater.utils.helpers import config_load_gpio_backend, config_save_gpio_backend
+
+    model = get_board_model()
+    if model is None:
+        return None
+    if out_pin is None:
+        # Without a loopback wire the callback latency can't be measured, so there is nothing to pick the backend on
+        print("Selecting the fastest GPIO backend needs a loopback pin (GPIO_BENCHMARK_OUT_PIN), "
+              "falling back to the board type.")
+        return None
+    name = config_load_gpio_backend(model)
+    if name is None:
+        results = benchmark_all(out_pin, in_pin)
+        for result in results:
+            print(result.format())
+        name = select_fastest(results)
+        if name is None:
+            print("No working GPIO backend found by the benchmark, falling back to the board type.")
+            return None
+        config_save_gpio_backend(model, name)
+    print(f"Using the fastest GPIO backend for {model}: {name}")
+    try:
+        return create_backend(name)
+    except (ImportError, OSError, RuntimeError) as err:
+        print(f"Cached GPIO backend {name} is no longer available ({err}), falling back to the board type.")
+        return None
+
+
+def _get_gpio_backend():
     board = get_board_type()
     print(f"Detected board type: {board}")
 
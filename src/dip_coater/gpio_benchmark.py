@@ -0,0 +1,207 @@
+""" Benchmark of the GPIO backends
+
+Measures, for every backend that is available on this machine:
+ - the callback dispatch latency: time from driving an output pin to the edge callback of the input pin it is wired
+   to (a loopback wire on a Raspberry Pi, or a simulated loopback for the dummy backend),
+ - the input() throughput,
+ - the cost of an add_event_detect()/remove_event_detect() pair (done before every move).
+
+Run `dip-coater-gpio-benchmark [OUT_PIN IN_PIN]` (or `python -m dip_coater.gpio_benchmark`) to print the results.
+"""
+import statistics
+import sys
+import threading
+import time
+from typing import NamedTuple
+
+from dip_coater.gpio import (
+    GPIOBase, RPiGPIO, GPIOd, GPIOZero, DummyGPIO, GpioMode, GpioPUD, GpioEdge, GpioState
+)
+
+LATENCY_SAMPLES = 200
+INPUT_SAMPLES = 10_000
+EVENT_DETECT_SAMPLES = 50
+CALLBACK_TIMEOUT_S = 0.1
+
+
+class LoopbackDummyGPIO(DummyGPIO):
+    """ Dummy backend with a simulated loopback wire: driving the output pin drives the input pin and fires its edge
+    callbacks """
+    def __init__(self, out_pin: int, in_pin: int):
+        super().__init__()
+        self.out_pin = out_pin
+        self.in_pin = in_pin
+
+    def output(self, pin, state: GpioState):
+        self.pins[pin] = state
+        if pin == self.out_pin and self.pins.get(self.in_pin) != state:
+            self.pins[self.in_pin] = state
+            for callback in self.callbacks.get(self.in_pin, []):
+                callback(self.in_pin)
+
+    def add_event_detect(self, pin, edge: GpioEdge, callback, bouncetime=None):
+        self.events[pin] = edge
+        if callback:
+            self.callbacks[pin] = [callback]
+
+    def remove_event_detect(self, pin):
+        self.events.pop(pin, None)
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+BACKENDS = {
+    "RPi.GPIO": RPiGPIO,
+    "gpiozero": GPIOZero,
+    "gpiod": GPIOd,
+    "dummy": LoopbackDummyGPIO,
+}
+
+
+class BenchmarkResult(NamedTuple):
+    """ Benchmark results of a single GPIO backend """
+    backend: str
+    available: bool
+    error: str = None
+    latency_median_us: float = None     # Median output-to-callback latency (None = no loopback)
+    latency_p99_us: float = None
+    missed_callbacks: int = 0
+    input_rate_khz: float = None        # input() calls per ms
+    event_detect_us: float = None       # Cost of one add_event_detect() + remove_event_detect() pair
+
+    def format(self) -> str:
+        if not self.available:
+            return f"{self.backend:<10} unavailable ({self.error})"
+        latency = "n/a (no loopback)"
+        if self.latency_median_us is not None:
+            latency = (f"{self.latency_median_us:.1f} µs median, {self.latency_p99_us:.1f} µs p99, "
+                       f"{self.missed_callbacks} missed")
+        return (f"{self.backend:<10} callback latency {latency} | input() {self.input_rate_khz:.0f} kHz | "
+                f"event detect {self.event_detect_us:.0f} µs")
+
+
+def create_backend(name: str, out_pin: int = None, in_pin: int = None) -> GPIOBase:
+    """ Create a GPIO backend by name (raises ImportError/OSError/RuntimeError when it isn't available here) """
+    if name == "dummy":
+        return LoopbackDummyGPIO(out_pin, in_pin)
+    return BACKENDS[name]()
+
+
+def benchmark_backend(name: str, out_pin: int = None, in_pin: int = None) -> BenchmarkResult:
+    """ Benchmark a single GPIO backend
+
+    :param name: The name of the backend (a key of BACKENDS)
+    :param out_pin: The output pin of the loopback wire (default: None = don't measure the callback latency)
+    :param in_pin: The input pin of the loopback wire, also used for the input() and event detect measurements
+
+    :return: The BenchmarkResult
+    """
+    try:
+        backend = create_backend(name, out_pin, in_pin)
+    except (ImportError, OSError, RuntimeError) as err:
+        return BenchmarkResult(name, False, error=str(err) or type(err).__name__)
+
+    try:
+        probe_pin = in_pin if in_pin is not None else out_pin
+        backend.setup(probe_pin, GpioMode.IN, pull_up_down=GpioPUD.PUD_DOWN)
+        latencies, missed = [], 0
+        if out_pin is not None and in_pin is not None:
+            backend.setup(out_pin, GpioMode.OUT)
+            latencies, missed = _measure_latency(backend, out_pin, in_pin)
+        input_rate_khz = _measure_input_rate(backend, probe_pin)
+        event_detect_us = _measure_event_detect(backend, probe_pin)
+    except Exception as err:
+        return BenchmarkResult(name, False, error=f"{type(err).__name__}: {err}")
+    finally:
+        backend.cleanup()
+
+    latency_median_us = latency_p99_us = None
+    if latencies:
+        latencies.sort()
+        latency_median_us = statistics.median(latencies) / 1e3
+        latency_p99_us = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] / 1e3
+    return BenchmarkResult(name, True, None, latency_median_us, latency_p99_us, missed, input_rate_khz,
+                           event_detect_us)
+
+
+def benchmark_all(out_pin: int = None, in_pin: int = None, backends=None) -> list:
+    """ Benchmark every available GPIO backend
+
+    :return: A list of BenchmarkResults (also for the unavailable backends)
+    """
+    return [benchmark_backend(name, out_pin, in_pin) for name in (backends or BACKENDS)]
+
+
+def select_fastest(results: list, include_dummy: bool = False) -> str:
+    """ Pick the fastest working backend by its callback latency. The latency is only measured with a loopback wire;
+    the input() throughput says little about the edge callbacks that stop the moves, so it isn't used to pick one.
+
+    :return: The name of the fastest backend, or None if no backend works or the latency wasn't measured
+    """
+    with_latency = [r for r in results if r.available and (include_dummy or r.backend != "dummy")
+                    and r.latency_median_us is not None and r.missed_callbacks == 0]
+    if not with_latency:
+        return None
+    return min(with_latency, key=lambda r: r.latency_median_us).backend
+
+
+def _measure_latency(backend: GPIOBase, out_pin: int, in_pin: int) -> tuple:
+    """ Toggle the output pin and time the edge callback of the loopback input pin """
+    arrived = threading.Event()
+    arrival = [0]
+
+    def callback(pin):
+        arrival[0] = time.perf_counter_ns()
+        arrived.set()
+
+    backend.output(out_pin, GpioState.LOW)
+    backend.add_event_detect(in_pin, GpioEdge.BOTH, callback=callback)
+    latencies, missed = [], 0
+    state = GpioState.LOW
+    try:
+        for _ in range(LATENCY_SAMPLES):
+            state = GpioState.HIGH if state == GpioState.LOW else GpioState.LOW
+            arrived.clear()
+            start = time.perf_counter_ns()
+            backend.output(out_pin, state)
+            if arrived.wait(CALLBACK_TIMEOUT_S):
+                latencies.append(arrival[0] - start)
+            else:
+                missed += 1
+    finally:
+        backend.remove_event_detect(in_pin)
+    return latencies, missed
+
+
+def _measure_input_rate(backend: GPIOBase, pin: int) -> float:
+    read = backend.input
+    start = time.perf_counter_ns()
+    for _ in range(INPUT_SAMPLES):
+        read(pin)
+    elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+    return INPUT_SAMPLES / elapsed_ms if elapsed_ms > 0 else float("inf")
+
+
+def _measure_event_detect(backend: GPIOBase, pin: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(EVENT_DETECT_SAMPLES):
+        backend.add_event_detect(pin, GpioEdge.BOTH, callback=lambda p: None)
+        backend.remove_event_detect(pin)
+    return (time.perf_counter_ns() - start) / EVENT_DETECT_SAMPLES / 1e3
+
+
+def main():
+    out_pin, in_pin = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) == 3 else (None, 21)
+    results = benchmark_all(out_pin, in_pin)
+    for result in results:
+        print(result.format())
+    if out_pin is None:
+        print("Fastest backend: n/a (picking one needs the callback latency over a loopback wire)")
+    else:
+        print(f"Fastest backend: {select_fastest(results)}")
+
+
+if __name__ == "__main__":
+    main()
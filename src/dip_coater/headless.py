@@ -0,0 +1,164 @@
+""" Run Coder scripts and recipes without the TUI
+
+The HeadlessCoder offers the Coder API directly on the motor driver, so a script can run from the command line. With
+the virtual clock, a recipe with hours of dwell and drying times finishes in seconds and the timeline of the script
+reports the simulated time of every step and the total cycle time. A dry run only compiles the script into its
+motion program (see dip_coater.motor.program) and prints the estimated timing and soft-limit violations. Recipes
+(see dip_coater.recipe) are compiled completely and run as one batch.
+
+Run `dip-coater --headless SCRIPT.py|RECIPE.toml|RECIPE.json [--virtual-clock] [--dry-run]`, Ctrl+C aborts the run.
+"""
+import logging
+
+from TMC_2209._TMC_2209_logger import Loglevel
+from TMC_2209._TMC_2209_move import StopMode
+
+from dip_coater.constants import (
+    STEP_MODES, DEFAULT_STEP_MODE, DEFAULT_CURRENT, INVERT_MOTOR_DIRECTION, USE_INTERPOLATION, USE_SPREAD_CYCLE,
+    MOTION_PROFILE, DEFAULT_JERK, USE_VACTUAL, LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_DOWN_PIN,
+    HOME_UP, HOMING_TWO_SPEED, HOMING_FAST_SPEED_MM_S
+)
+from dip_coater.gpio import GpioMode, GpioPUD, SimulatedGPIO
+from dip_coater.motion.planner import MotionProfile
+from dip_coater.motor.program import MotionProgram, ProgramBuilder, StepKind
+from dip_coater.motor.program_executor import ProgramExecutor
+from dip_coater.motor.tmc2209 import TMC2209_MotorDriver
+from dip_coater.recipe import compile_recipe, is_recipe_file, load_recipe
+from dip_coater.utils.timeline import Timeline
+
+
+class HeadlessCoder(ProgramBuilder):
+    """ The Coder API on the motor driver, without the TUI: the script is first compiled completely and only runs if
+    its program has no violations, then every API call is compiled into a program step and run right away """
+    def __init__(self, motor_driver: TMC2209_MotorDriver, gpio, log=print):
+        """ Create a headless Coder
+
+        :param motor_driver: The motor driver to run the scripts on
+        :param gpio: The GPIO instance of the limit switches
+        :param log: Function to log the progress messages with (default: print)
+        """
+        super().__init__(motor_driver.conversion.microsteps, motor_driver.motion_profile, motor_driver.jerk_mm_s3,
+                         homing_fast_speed_mm_s=HOMING_FAST_SPEED_MM_S if HOMING_TWO_SPEED else None,
+                         position_mm=motor_driver.get_current_position(HOME_UP),
+                         motor_enabled=motor_driver.motor_enabled, use_vactual=motor_driver.use_vactual)
+        self.motor_driver = motor_driver
+        self.gpio = gpio
+        self.log = log
+        self.executor = ProgramExecutor(motor_driver, log)
+        setup_limit_switches(gpio)
+        self.executor.bind_limit_switches()
+
+    @property
+    def timeline(self) -> Timeline:
+        return self.executor.timeline
+
+    def run(self, code: str) -> Timeline:
+        """ Execute a Coder script
+
+        :param code: The Python code of the script (uses the API through `self`)
+
+        :return: The Timeline of the script
+        """
+        # Dry run the whole script first, like 'RUN plan' in the TUI: a script with violations doesn't move at all
+        builder = ProgramBuilder.for_driver(self.motor_driver, homing_fast_speed_mm_s=self.homing_fast_speed_mm_s)
+        program = builder.compile(code)
+        if not program.valid:
+            self.log(program.format())
+            raise ValueError(f"The script has {len(program.violations)} violations, it does not run.")
+        self.timeline.start()
+        exec(code, {"self": self})
+        return self.timeline
+
+    def _add(self, kind: StepKind, args: tuple, duration_s: float, description: str):
+        """ Compile the API call into a program step and run it, unless the step violates the limits """
+        if self.program.violations:
+            raise ValueError(f"{self.program.violations[0].message} The script stops.")
+        super()._add(kind, args, duration_s, description)
+        self.executor.run_step(self.program.steps[-1])
+
+
+def run_headless(script_path: str, app_state, log_level: Loglevel = Loglevel.INFO) -> Timeline:
+    """ Run a Coder script or recipe file without the TUI and print its timeline. A script or recipe is compiled
+    completely before it runs, and only runs if its program has no violations.
+
+    :param script_path: The path of the Python file with the Coder script, or of the .json/.toml recipe
+    :param app_state: The application state (provides the GPIO instance and the clock)
+    :param log_level: The log level of the motor driver
+
+    :return: The Timeline of the script
+    """
+    motor_driver = _create_motor_driver(app_state, log_level)
+    try:
+        if is_recipe_file(script_path):
+            program = _compile(script_path, motor_driver)
+            if not program.valid:
+                print(program.format())
+                raise ValueError(f"The recipe has {len(program.violations)} violations, it does not run.")
+            setup_limit_switches(app_state.gpio)
+            executor = ProgramExecutor(motor_driver)
+            executor.bind_limit_switches()
+            executor.run(program)
+            timeline = executor.timeline
+        else:
+            with open(script_path) as file:
+                code = file.read()
+            timeline = HeadlessCoder(motor_driver, app_state.gpio).run(code)
+    except KeyboardInterrupt:
+        # Ctrl+C aborts the script: stop the move that still runs in the movement thread before cleaning up, so the
+        # position journal records where it stopped
+        motor_driver.stop_motor(StopMode.HARDSTOP)
+        if motor_driver.is_moving():
+            motor_driver.wait_for_move_result()
+        print("Aborted")
+        raise
+    finally:
+        motor_driver.cleanup()
+    print(timeline.format())
+    return timeline
+
+
+def dry_run_headless(script_path: str, app_state, log_level: Loglevel = Loglevel.INFO) -> MotionProgram:
+    """ Compile a Coder script or recipe file without moving the motor and print its motion program
+
+    :param script_path: The path of the Python file with the Coder script, or of the .json/.toml recipe
+    :param app_state: The application state (provides the GPIO instance and the clock)
+    :param log_level: The log level of the motor driver
+
+    :return: The compiled MotionProgram
+    """
+    motor_driver = _create_motor_driver(app_state, log_level)
+    try:
+        program = _compile(script_path, motor_driver)
+    finally:
+        motor_driver.cleanup()
+    print(program.format())
+    return program
+
+
+def setup_limit_switches(gpio):
+    """ Set up the input pins of the limit switches """
+    for pin in (LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_DOWN_PIN):
+        gpio.setup(pin, GpioMode.IN, pull_up_down=GpioPUD.PUD_UP)
+
+
+def _compile(script_path: str, motor_driver: TMC2209_MotorDriver) -> MotionProgram:
+    """ Compile a Coder script or recipe file into a motion program that starts from the state of the motor driver """
+    builder = ProgramBuilder.for_driver(motor_driver,
+                                        homing_fast_speed_mm_s=HOMING_FAST_SPEED_MM_S if HOMING_TWO_SPEED else None)
+    if is_recipe_file(script_path):
+        return compile_recipe(load_recipe(script_path), builder)
+    with open(script_path) as file:
+        return builder.compile(file.read())
+
+
+def _create_motor_driver(app_state, log_level: Loglevel) -> TMC2209_MotorDriver:
+    """ Create the motor driver of a headless run with the default settings of the app """
+    handler = logging.StreamHandler()
+    motor_driver = TMC2209_MotorDriver(app_state, step_mode=STEP_MODES[DEFAULT_STEP_MODE], current=DEFAULT_CURRENT,
+                                       invert_direction=INVERT_MOTOR_DIRECTION, interpolation=USE_INTERPOLATION,
+                                       spread_cycle=USE_SPREAD_CYCLE, loglevel=log_level, log_handlers=[handler],
+                                       motion_profile=MotionProfile(MOTION_PROFILE), jerk_mm_s3=DEFAULT_JERK,
+                                       use_vactual=USE_VACTUAL, clock=app_state.clock)
+    if isinstance(app_state.gpio.backend, SimulatedGPIO):
+        app_state.gpio.backend.set_position_source(motor_driver.get_travelled_distance)
+    return motor_driver
@@ -0,0 +1,112 @@
+""" Step executor that walks a precomputed step timing table """
+from TMC_2209._TMC_2209_move import StopMode
+
+from dip_coater.motion.planner import StepProfile, plan_stop
+from dip_coater.utils.clock import Clock
+
+SLEEP_MARGIN_NS = 500_000   # Busy-wait the last 0.5 ms before a step deadline instead of sleeping
+
+
+class StepExecutor:
+    """ Emits the step pulses of a StepProfile at its precomputed deadlines
+
+    The hot loop only compares the clock with the next deadline and toggles the step pin; all floating-point motion
+    math is done beforehand by the planner.
+    """
+    def __init__(self, step, set_direction, clock: Clock = None, poll=None):
+        """ Create a step executor
+
+        :param step: Function that emits a single step pulse
+        :param set_direction: Function that sets the direction pin (True for positive steps, False for negative steps)
+        :param clock: The Clock to time the steps with (default: None = real time)
+        :param poll: Function called before every step, e.g. to handle the stop requests of a step process without
+            a separate listener thread (default: None)
+        """
+        self._step = step
+        self._set_direction = set_direction
+        self._clock = clock or Clock()
+        self._poll = poll
+        self._stop_mode = StopMode.NO
+        self._last_step_ns = 0
+        self._prev_step_ns = 0
+        self.direction = 1
+        self.steps_done = 0
+        self.recorder = None    # Optional StepRecorder that records the timing of every step
+
+    def stop(self, stop_mode: StopMode = StopMode.HARDSTOP):
+        """ Request the running profile to stop
+
+        :param stop_mode: The stop mode to use (SOFTSTOP decelerates with the profile acceleration, HARDSTOP stops
+            at the next step)
+        """
+        if self._stop_mode != StopMode.HARDSTOP:
+            self._stop_mode = stop_mode
+
+    def prepare(self, profile: StepProfile):
+        """ Reset the step counter and stop request for the given profile before it is run
+
+        :param profile: The StepProfile that will be executed next
+        """
+        self._stop_mode = StopMode.NO
+        self.direction = profile.direction
+        self.steps_done = 0
+        if self.recorder is not None:
+            self.recorder.start(profile.steps)
+
+    def run(self, profile: StepProfile) -> StopMode:
+        """ Walk the step deadlines of the profile (blocking). Call prepare() with the profile first.
+
+        :param profile: The StepProfile to execute
+
+        :return: The StopMode of the movement (StopMode.NO for normal stop, other StopMode for early stop)
+        """
+        self._set_direction(profile.direction > 0)
+
+        start_ns = self._clock.perf_counter_ns()
+        self._last_step_ns = self._prev_step_ns = start_ns
+        for chunk in profile.chunks():
+            if not self._walk(chunk, start_ns):
+                break
+
+        stop_mode = self._stop_mode
+        if stop_mode == StopMode.SOFTSTOP:
+            interval_ns = self._last_step_ns - self._prev_step_ns
+            speed = 1e9 / interval_ns if self.steps_done > 1 and interval_ns > 0 else 0
+            tail = plan_stop(speed, profile.acceleration, profile.direction)
+            self._stop_mode = StopMode.NO
+            self._walk(tail.deadlines_ns, self._last_step_ns)
+            if self._stop_mode == StopMode.HARDSTOP:
+                stop_mode = StopMode.HARDSTOP
+        return stop_mode
+
+    def _walk(self, deadlines_ns, start_ns: int) -> bool:
+        """ Emit one step per deadline
+
+        :return: True if all steps were emitted, False if the walk was interrupted by a stop request
+        """
+        step = self._step
+        clock = self._clock.perf_counter_ns
+        sleep = self._clock.sleep
+        busy_wait = not self._clock.virtual     # Virtual time doesn't pass while busy-waiting
+        margin_ns = SLEEP_MARGIN_NS if busy_wait else 0
+        recorder = self.recorder
+        poll = self._poll
+        last = self._last_step_ns
+        for deadline in deadlines_ns.tolist():
+            target = start_ns + deadline
+            remaining = target - clock()
+            if remaining > margin_ns:
+                sleep((remaining - margin_ns) / 1e9)
+            while busy_wait and clock() < target:
+                pass
+            if poll is not None:
+                poll()
+            if self._stop_mode != StopMode.NO:
+                return False
+            step()
+            if recorder is not None:
+                recorder.record(target, clock())
+            self.steps_done += 1
+            self._prev_step_ns, last = last, target
+            self._last_step_ns = last
+        return True
@@ -0,0 +1,86 @@
+""" Step timing instrumentation: records when each step was emitted and reports how far it was off the plan """
+from datetime import datetime
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+JITTER_PERCENTILES = (50, 95, 99)
+
+
+class JitterReport(NamedTuple):
+    """ Timing statistics of a single executed move """
+    steps: int                  # The number of recorded steps
+    duration_s: float           # Time between the first and the last step
+    mean_speed: float           # Achieved mean speed in µsteps/s
+    jitter_us: tuple            # Lateness of the steps w.r.t. their deadlines at JITTER_PERCENTILES in µs
+    max_jitter_us: float        # Largest lateness of a step w.r.t. its deadline in µs
+    max_gap_us: float           # Largest interval between two consecutive steps in µs
+
+    def format(self) -> str:
+        percentiles = ", ".join(f"p{p} {j:.0f} µs" for p, j in zip(JITTER_PERCENTILES, self.jitter_us))
+        return (f"{self.steps} steps in {self.duration_s:.3f} s ({self.mean_speed:.1f} µsteps/s), "
+                f"jitter {percentiles}, max {self.max_jitter_us:.0f} µs, max gap {self.max_gap_us:.0f} µs")
+
+
+class StepRecorder:
+    """ Records the deadline and the actual time of every step of a move in preallocated arrays, so recording
+    doesn't allocate in the step loop """
+    def __init__(self):
+        self.deadlines_ns = np.zeros(0, dtype=np.int64)
+        self.timestamps_ns = np.zeros(0, dtype=np.int64)
+        self.count = 0
+
+    def start(self, max_steps: int):
+        """ Prepare the recording of a move
+
+        :param max_steps: The maximum number of steps to record (later steps are not recorded)
+        """
+        if len(self.timestamps_ns) < max_steps:
+            self.deadlines_ns = np.zeros(max_steps, dtype=np.int64)
+            self.timestamps_ns = np.zeros(max_steps, dtype=np.int64)
+        self.count = 0
+
+    def record(self, deadline_ns: int, timestamp_ns: int):
+        """ Record a single step
+
+        :param deadline_ns: The absolute time (perf_counter_ns) at which the step was planned
+        :param timestamp_ns: The absolute time (perf_counter_ns) at which the step was emitted
+        """
+        i = self.count
+        if i < len(self.timestamps_ns):
+            self.deadlines_ns[i] = deadline_ns
+            self.timestamps_ns[i] = timestamp_ns
+            self.count = i + 1
+
+    def report(self) -> JitterReport:
+        """ Compute the timing statistics of the recorded move
+
+        :return: The JitterReport, or None if less than two steps were recorded
+        """
+        n = self.count
+        if n < 2:
+            return None
+        timestamps = self.timestamps_ns[:n]
+        lateness_us = (timestamps - self.deadlines_ns[:n]) / 1e3
+        duration_s = (timestamps[-1] - timestamps[0]) / 1e9
+        return JitterReport(
+            steps=n,
+            duration_s=duration_s,
+            mean_speed=(n - 1) / duration_s if duration_s > 0 else 0.0,
+            jitter_us=tuple(float(j) for j in np.percentile(lateness_us, JITTER_PERCENTILES)),
+            max_jitter_us=float(lateness_us.max()),
+            max_gap_us=float(np.diff(timestamps).max() / 1e3),
+        )
+
+    def save(self, directory: str) -> str:
+        """ Save the recorded move as an (n, 2) array of [deadline, timestamp] in ns for offline analysis
+
+        :param directory: The directory to save the .npy file in (created if it doesn't exist)
+
+        :return: The path of the saved file
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"steps_{datetime.now():%Y%m%d_%H%M%S_%f}.npy")
+        np.save(path, np.column_stack((self.deadlines_ns[:self.count], self.timestamps_ns[:self.count])))
+        return path
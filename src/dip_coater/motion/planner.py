@@ -0,0 +1,287 @@
+""" Host-side motion planner
+
+Builds the complete step timing table of a move in one vectorized NumPy pass, so the step loop only has to walk an
+array of deadlines instead of computing every step interval on the fly. All quantities are expressed in (micro)steps:
+speed in steps/s, acceleration in steps/s^2 and jerk in steps/s^3.
+"""
+from enum import Enum
+import math
+
+import numpy as np
+
+CHUNK_STEPS = 4096  # Number of steps per chunk of a streamed step profile
+
+
+class MotionProfile(Enum):
+    """ Velocity profile shape of a move """
+    TRAPEZOIDAL = "trapezoidal"     # Constant acceleration ramps
+    S_CURVE = "s-curve"             # Jerk-limited acceleration ramps
+
+
+class StepProfile:
+    """ Precomputed step timing of a single move """
+    def __init__(self, deadlines_ns: np.ndarray, direction: int, acceleration: float = 0):
+        """ Create a step profile
+
+        :param deadlines_ns: The time of each step relative to the start of the move in ns (int64, increasing)
+        :param direction: The direction of the move (1 for positive steps, -1 for negative steps)
+        :param acceleration: The deceleration to use when the move is stopped with a soft stop in steps/s^2
+        """
+        self.deadlines_ns = deadlines_ns
+        self.direction = direction
+        self.acceleration = acceleration
+
+    @property
+    def steps(self) -> int:
+        return len(self.deadlines_ns)
+
+    @property
+    def duration_s(self) -> float:
+        return self.deadlines_ns[-1] / 1e9 if self.steps else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        return self.deadlines_ns.nbytes
+
+    def chunks(self):
+        """ Iterate over the step deadlines in chunks (a precomputed profile is a single chunk) """
+        yield self.deadlines_ns
+
+    def intervals_s(self) -> np.ndarray:
+        """ The time between consecutive steps in s (the first interval is measured from the start of the move) """
+        return np.diff(self.deadlines_ns, prepend=0) / 1e9
+
+
+class StreamedStepProfile:
+    """ Step timing of a variable-speed move that is computed chunk by chunk while it is executed, so long profiles
+    never sit in memory all at once """
+    def __init__(self, steps: int, speed_at, acceleration: float = 0, chunk_steps: int = CHUNK_STEPS):
+        """ Create a streamed step profile
+
+        :param steps: The number of steps to move (positive or negative for the direction)
+        :param speed_at: Function that maps an array of step numbers (1..n, counted from the start of the move) to
+            the speed in steps/s at which each step is reached (always positive)
+        :param acceleration: The acceleration limit in steps/s^2, used to ramp up from and down to standstill and for
+            soft stops (0 = no ramps)
+        :param chunk_steps: The number of steps per chunk
+        """
+        self.direction = 1 if steps >= 0 else -1
+        self._steps = abs(int(steps))
+        self._speed_at = speed_at
+        self.acceleration = acceleration or 0
+        self.chunk_steps = chunk_steps
+
+    @property
+    def steps(self) -> int:
+        return self._steps
+
+    @property
+    def duration_s(self) -> float:
+        duration_s = 0.0
+        for chunk in self.chunks():
+            duration_s = chunk[-1] / 1e9
+        return duration_s
+
+    @property
+    def nbytes(self) -> int:
+        return min(self.chunk_steps, self._steps) * np.dtype(np.int64).itemsize
+
+    def chunks(self):
+        """ Iterate over the step deadlines (relative to the start of the move, in ns) in chunks of chunk_steps """
+        n = self._steps
+        elapsed = 0.0
+        for first in range(1, n + 1, self.chunk_steps):
+            k = np.arange(first, min(first + self.chunk_steps, n + 1), dtype=np.float64)
+            speed = np.broadcast_to(np.asarray(self._speed_at(k), dtype=np.float64), k.shape)
+            if self.acceleration > 0:
+                # Never faster than the speed reachable from standstill at the start and to standstill at the end
+                speed = np.minimum(speed, np.sqrt(2 * self.acceleration * np.minimum(k, n - k + 1)))
+            if np.any(speed <= 0) or not np.all(np.isfinite(speed)):
+                raise ValueError("The speed of a speed profile must be positive and finite.")
+            times = elapsed + np.cumsum(1 / speed)
+            elapsed = times[-1]
+            yield _to_deadlines_ns(times)
+
+    def intervals_s(self) -> np.ndarray:
+        """ The time between consecutive steps in s (computes the complete profile) """
+        return np.diff(np.concatenate([np.empty(0, dtype=np.int64), *self.chunks()]), prepend=0) / 1e9
+
+
+def plan_move(steps: int, max_speed: float, acceleration: float = 0, jerk: float = None,
+              profile: MotionProfile = MotionProfile.TRAPEZOIDAL) -> StepProfile:
+    """ Plan the step timing of a point-to-point move that starts and ends at standstill
+
+    :param steps: The number of steps to move (positive or negative for the direction)
+    :param max_speed: The maximum speed of the move in steps/s (always positive)
+    :param acceleration: The acceleration/deceleration in steps/s^2 (0 = no ramps, move at constant speed)
+    :param jerk: The jerk limit in steps/s^3 for S-curve profiles (None = trapezoidal ramps)
+    :param profile: The velocity profile shape of the move
+
+    :return: The StepProfile of the move
+    """
+    if max_speed <= 0:
+        raise ValueError(f"The speed must be positive, got {max_speed} steps/s.")
+    direction = 1 if steps >= 0 else -1
+    n = abs(int(steps))
+    if n == 0:
+        times = np.empty(0)
+    elif acceleration is None or acceleration <= 0:
+        times = np.arange(1, n + 1, dtype=np.float64) / max_speed
+    elif profile == MotionProfile.S_CURVE and jerk:
+        times = _s_curve_times(n, max_speed, acceleration, jerk)
+    else:
+        times = _trapezoidal_times(n, max_speed, acceleration)
+    return StepProfile(_to_deadlines_ns(times), direction, acceleration or 0)
+
+
+def plan_segment(steps: int, max_speed: float, acceleration: float = 0, start_speed: float = 0,
+                 end_speed: float = 0) -> StepProfile:
+    """ Plan the step timing of a trapezoidal segment that enters and leaves at the given speeds, so consecutive
+    segments can be joined without stopping in between
+
+    :param steps: The number of steps to move (positive or negative for the direction)
+    :param max_speed: The maximum speed of the segment in steps/s (always positive)
+    :param acceleration: The acceleration/deceleration in steps/s^2 (0 = no ramps, move at constant speed)
+    :param start_speed: The speed at the start of the segment in steps/s (at most max_speed)
+    :param end_speed: The speed at the end of the segment in steps/s (at most max_speed, and reachable from
+        start_speed within the segment)
+
+    :return: The StepProfile of the segment
+    """
+    if max_speed <= 0:
+        raise ValueError(f"The speed must be positive, got {max_speed} steps/s.")
+    direction = 1 if steps >= 0 else -1
+    n = abs(int(steps))
+    if n == 0:
+        times = np.empty(0)
+    elif acceleration is None or acceleration <= 0:
+        times = np.arange(1, n + 1, dtype=np.float64) / max_speed
+    else:
+        times = _ramped_times(n, max_speed, acceleration, min(start_speed, max_speed), min(end_speed, max_speed))
+    return StepProfile(_to_deadlines_ns(times), direction, acceleration or 0)
+
+
+def plan_stop(speed: float, acceleration: float, direction: int = 1) -> StepProfile:
+    """ Plan the steps needed to decelerate from the given speed to standstill (used for soft stops)
+
+    :param speed: The current speed in steps/s
+    :param acceleration: The deceleration in steps/s^2
+    :param direction: The direction of the move (1 or -1)
+
+    :return: The StepProfile of the deceleration, starting at the current step
+    """
+    if speed <= 0 or acceleration <= 0:
+        return StepProfile(np.empty(0, dtype=np.int64), direction, acceleration)
+    n = int(speed * speed / (2 * acceleration))
+    k = np.arange(1, n + 1, dtype=np.float64)
+    times = (speed - np.sqrt(np.maximum(speed * speed - 2 * acceleration * k, 0))) / acceleration
+    return StepProfile(_to_deadlines_ns(times), direction, acceleration)
+
+
+def _to_deadlines_ns(times: np.ndarray) -> np.ndarray:
+    return np.rint(times * 1e9).astype(np.int64)
+
+
+def _trapezoidal_times(n: int, v: float, a: float) -> np.ndarray:
+    """ Time at which each step 1..n is reached for a trapezoidal (or triangular) velocity profile """
+    ramp_steps = v * v / (2 * a)
+    if 2 * ramp_steps > n:
+        # Triangular profile: the maximum speed is never reached
+        ramp_steps = n / 2
+        v = math.sqrt(a * n)
+    t_ramp = v / a
+    t_total = 2 * t_ramp + (n - 2 * ramp_steps) / v
+
+    k = np.arange(1, n + 1, dtype=np.float64)
+    accelerating = k <= ramp_steps
+    decelerating = k >= n - ramp_steps
+    cruising = ~(accelerating | decelerating)
+
+    times = np.empty(n)
+    times[accelerating] = np.sqrt(2 * k[accelerating] / a)
+    times[cruising] = t_ramp + (k[cruising] - ramp_steps) / v
+    times[decelerating & ~accelerating] = t_total - np.sqrt(2 * (n - k[decelerating & ~accelerating]) / a)
+    return times
+
+
+def _ramped_times(n: int, v: float, a: float, v0: float, v1: float) -> np.ndarray:
+    """ Time at which each step 1..n is reached when ramping from v0 up to v, cruising, and ramping down to v1 """
+    accel_steps = (v * v - v0 * v0) / (2 * a)
+    decel_steps = (v * v - v1 * v1) / (2 * a)
+    if accel_steps + decel_steps > n:
+        # The maximum speed is never reached: accelerate until the deceleration to v1 has to start
+        v = max(math.sqrt((2 * a * n + v0 * v0 + v1 * v1) / 2), v0, v1)
+        accel_steps = max((v * v - v0 * v0) / (2 * a), 0)
+        decel_steps = max(n - accel_steps, 0)
+    t_accel = (v - v0) / a
+    t_decel_start = t_accel + (n - accel_steps - decel_steps) / v
+
+    k = np.arange(1, n + 1, dtype=np.float64)
+    accelerating = k <= accel_steps
+    decelerating = (k > n - decel_steps) & ~accelerating
+    cruising = ~(accelerating | decelerating)
+
+    times = np.empty(n)
+    times[accelerating] = (np.sqrt(v0 * v0 + 2 * a * k[accelerating]) - v0) / a
+    times[cruising] = t_accel + (k[cruising] - accel_steps) / v
+    k_decel = k[decelerating] - (n - decel_steps)
+    times[decelerating] = t_decel_start + (v - np.sqrt(np.maximum(v * v - 2 * a * k_decel, 0))) / a
+    return times
+
+
+def _s_curve_ramp(v: float, a: float, j: float) -> tuple:
+    """ Duration and peak acceleration of a jerk-limited ramp from standstill to speed v """
+    a_peak = min(a, math.sqrt(v * j))
+    return v / a_peak + a_peak / j, a_peak
+
+
+def _s_curve_ramp_position(t: np.ndarray, v: float, a_peak: float, j: float, t_ramp: float) -> np.ndarray:
+    """ Position on a jerk-limited ramp from standstill to speed v at times 0 <= t <= t_ramp """
+    t_jerk = a_peak / j
+    t_const = t_ramp - 2 * t_jerk
+    s1 = j * t_jerk ** 3 / 6
+    v1 = j * t_jerk ** 2 / 2
+    rising = t < t_jerk
+    falling = t >= t_jerk + t_const
+    constant = ~(rising | falling)
+
+    s = np.empty_like(t)
+    s[rising] = j * t[rising] ** 3 / 6
+    dt = t[constant] - t_jerk
+    s[constant] = s1 + v1 * dt + a_peak * dt ** 2 / 2
+    tau = t_ramp - t[falling]
+    s[falling] = v * t_ramp / 2 - (v * tau - j * tau ** 3 / 6)
+    return s
+
+
+def _s_curve_times(n: int, v: float, a: float, j: float) -> np.ndarray:
+    """ Time at which each step 1..n is reached for a jerk-limited (S-curve) velocity profile """
+    t_ramp, a_peak = _s_curve_ramp(v, a, j)
+    if v * t_ramp > n:
+        # The ramps do not fit in the move: lower the peak speed until both ramps cover the full distance
+        low, high = 0.0, v
+        for _ in range(60):
+            v = (low + high) / 2
+            t_ramp, a_peak = _s_curve_ramp(v, a, j)
+            if v * t_ramp > n:
+                high = v
+            else:
+                low = v
+        v = low
+        t_ramp, a_peak = _s_curve_ramp(v, a, j)
+    ramp_steps = v * t_ramp / 2
+    t_total = 2 * t_ramp + (n - 2 * ramp_steps) / v
+
+    # Sample the position over time and invert it to get the time at which each step is reached
+    samples = int(np.clip(4 * n, 4096, 1_000_000))
+    t = np.linspace(0, t_total, samples)
+    s = np.where(
+        t < t_ramp,
+        _s_curve_ramp_position(np.minimum(t, t_ramp), v, a_peak, j, t_ramp),
+        np.where(
+            t <= t_total - t_ramp,
+            ramp_steps + v * (t - t_ramp),
+            n - _s_curve_ramp_position(np.clip(t_total - t, 0, t_ramp), v, a_peak, j, t_ramp),
+        ),
+    )
+    return np.interp(np.arange(1, n + 1, dtype=np.float64), s, t)
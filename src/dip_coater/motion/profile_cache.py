@@ -0,0 +1,111 @@
+""" Bounded LRU cache of compiled moves
+
+Dip recipes repeat the same moves many times. A compiled move holds the planned step profile together with the
+speed/acceleration configuration of the TMC library, so a repeated move can start without any planning cost.
+"""
+from collections import OrderedDict
+from typing import NamedTuple
+import threading
+
+from dip_coater.motion.planner import StepProfile
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024    # 32 MiB of step deadlines
+
+
+class CompiledMove(NamedTuple):
+    """ A planned move, ready to be executed """
+    profile: StepProfile
+    max_speed: float        # Max speed configured in the TMC library in µsteps/s
+    acceleration: float     # Acceleration configured in the TMC library in µsteps/s^2
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ProfileCache:
+    """ Least-recently-used cache of CompiledMoves, bounded by the number of entries and by memory """
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        """ Create a profile cache
+
+        :param max_entries: The maximum number of compiled moves to keep
+        :param max_bytes: The maximum memory of the cached step profiles in bytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key) -> CompiledMove:
+        """ Look up a compiled move
+
+        :param key: The move parameters the move was compiled for
+
+        :return: The CompiledMove, or None if it is not cached
+        """
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return compiled
+
+    def put(self, key, compiled: CompiledMove):
+        """ Store a compiled move, evicting the least recently used moves when the cache is full
+
+        :param key: The move parameters the move was compiled for
+        :param compiled: The CompiledMove to store
+        """
+        nbytes = compiled.profile.nbytes
+        if nbytes > self.max_bytes:
+            return
+        # Cached profiles are shared between moves, so they must never be modified
+        compiled.profile.deadlines_ns.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key).profile.nbytes
+            self._entries[key] = compiled
+            self._nbytes += nbytes
+            while len(self._entries) > self.max_entries or self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.profile.nbytes
+                self._evictions += 1
+
+    def get_or_compile(self, key, compile_move) -> CompiledMove:
+        """ Look up a compiled move, compiling and storing it on a miss
+
+        :param key: The move parameters the move was compiled for
+        :param compile_move: Function without arguments that compiles the move
+
+        :return: The CompiledMove
+        """
+        compiled = self.get(key)
+        if compiled is None:
+            compiled = compile_move()
+            self.put(key, compiled)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._nbytes)
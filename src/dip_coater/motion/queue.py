@@ -0,0 +1,96 @@
+""" Motion command queue with lookahead blending
+
+Consecutive segments that move in the same direction are joined without stopping in between: the speed at each
+junction is the highest speed both segments allow, limited by how fast the motor can accelerate or decelerate over the
+segments around it (a backward and a forward lookahead pass). Only a change of direction brings the motor to a stop.
+"""
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from dip_coater.motion.planner import StepProfile, plan_segment
+
+
+class MotionSegment(NamedTuple):
+    """ A single queued move, in (micro)steps """
+    steps: int              # The number of steps to move (positive or negative for the direction)
+    speed: float            # The maximum speed in steps/s
+    acceleration: float     # The acceleration/deceleration in steps/s^2 (0 = no ramps)
+
+    @property
+    def direction(self) -> int:
+        return 1 if self.steps >= 0 else -1
+
+
+class MotionQueue:
+    """ Collects motion segments and plans them as blended, continuous step profiles """
+    def __init__(self):
+        self.segments = []
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def add(self, steps: int, speed: float, acceleration: float = 0):
+        """ Append a segment to the queue (segments without steps are ignored)
+
+        :param steps: The number of steps to move (positive or negative for the direction)
+        :param speed: The maximum speed in steps/s (always positive)
+        :param acceleration: The acceleration/deceleration in steps/s^2 (0 = no ramps)
+        """
+        if speed <= 0:
+            raise ValueError(f"The speed must be positive, got {speed} steps/s.")
+        if steps != 0:
+            self.segments.append(MotionSegment(int(steps), speed, acceleration or 0))
+
+    def clear(self):
+        self.segments = []
+
+    def junction_speeds(self) -> list:
+        """ The speed at the start and end of every segment after the lookahead passes
+
+        :return: A list with len(segments) + 1 speeds in steps/s (the first and last are always 0)
+        """
+        segments = self.segments
+        speeds = [0.0]
+        for current, following in zip(segments, segments[1:]):
+            speeds.append(min(current.speed, following.speed) if current.direction == following.direction else 0.0)
+        speeds.append(0.0)
+
+        # Backward pass: every segment must be able to decelerate to the speed at its end
+        for i in range(len(segments) - 1, -1, -1):
+            speeds[i] = min(speeds[i], _reachable_speed(speeds[i + 1], segments[i]))
+        # Forward pass: every segment must be able to accelerate to the speed at its end
+        for i, segment in enumerate(segments):
+            speeds[i + 1] = min(speeds[i + 1], _reachable_speed(speeds[i], segment))
+        return speeds
+
+    def plan(self) -> list:
+        """ Plan the queued segments
+
+        :return: A list of StepProfiles, one per run of segments in the same direction
+        """
+        speeds = self.junction_speeds()
+        profiles = []
+        run = []
+        for i, segment in enumerate(self.segments):
+            run.append(plan_segment(segment.steps, segment.speed, segment.acceleration, speeds[i], speeds[i + 1]))
+            if speeds[i + 1] == 0:
+                profiles.append(_join(run))
+                run = []
+        return profiles
+
+
+def _reachable_speed(speed: float, segment: MotionSegment) -> float:
+    """ The highest speed that can be reached from (or braked down to) the given speed over the segment """
+    if segment.acceleration <= 0:
+        return segment.speed
+    return min(segment.speed, math.sqrt(speed * speed + 2 * segment.acceleration * abs(segment.steps)))
+
+
+def _join(profiles: list) -> StepProfile:
+    """ Join the step profiles of consecutive segments in the same direction into one continuous profile """
+    offsets = np.cumsum([0] + [profile.deadlines_ns[-1] for profile in profiles[:-1]])
+    deadlines_ns = np.concatenate([profile.deadlines_ns + offset for profile, offset in zip(profiles, offsets)])
+    accelerations = [profile.acceleration for profile in profiles if profile.acceleration > 0]
+    return StepProfile(deadlines_ns, profiles[0].direction, min(accelerations, default=0))
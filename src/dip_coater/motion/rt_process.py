@@ -0,0 +1,280 @@
+""" Step generation in a dedicated real-time process
+
+The step loop runs in its own process, so it doesn't compete with the Textual UI for the GIL. The process pins itself
+to a CPU core and raises its scheduling priority where it is allowed to. Move commands are passed in and position and
+status are published back through lock-free shared-memory rings. Every record is announced with a semaphore, so the
+idle sides block instead of polling. The step process itself is single-threaded: while moving, it handles the
+commands between the steps. If the step process dies, the running move ends with a RuntimeError at the last published
+position.
+"""
+from collections import deque
+import gc
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+
+from TMC_2209._TMC_2209_move import StopMode
+
+from dip_coater.gpio import GpioMode, GpioState
+from dip_coater.motion.executor import StepExecutor
+from dip_coater.motion.planner import MotionProfile, plan_move
+from dip_coater.motion.profile_cache import CompiledMove, ProfileCache
+from dip_coater.motion.shm_ring import SharedRing
+
+RT_CPU = 3                  # CPU core to pin the step process to (the last core of a Raspberry Pi)
+RT_PRIORITY = 50            # SCHED_FIFO priority of the step process (needs CAP_SYS_NICE)
+RING_CAPACITY = 64
+RING_FULL_RETRY_S = 0.0002  # Retry interval of a push to a full ring
+PROGRESS_INTERVAL_S = 0.05  # Interval of the position updates while moving
+ALIVE_CHECK_S = 0.1         # Interval at which a waiting move checks that the step process is still alive
+
+# Command ring records: command, move id, steps, speed (µsteps/s), acceleration (µsteps/s^2), jerk (µsteps/s^3),
+# motion profile
+COMMAND_FORMAT = "<BIqdddB"
+CMD_MOVE = 1
+CMD_STOP = 2
+CMD_SHUTDOWN = 3
+
+# Status ring records: event, move id, steps done, stop mode
+STATUS_FORMAT = "<BIqB"
+EVT_PROGRESS = 1
+EVT_DONE = 2
+
+_PROFILES = list(MotionProfile)
+
+
+class ProcessMove:
+    """ A move to be planned and executed by the step process """
+    def __init__(self, steps: int, speed: float, acceleration: float = 0, jerk: float = None,
+                 profile: MotionProfile = MotionProfile.TRAPEZOIDAL):
+        self.direction = 1 if steps >= 0 else -1
+        self.steps = int(steps)
+        self.speed = speed
+        self.acceleration = acceleration or 0
+        self.jerk = jerk or 0
+        self.profile = profile
+
+
+class StepGeneratorProcess:
+    """ Parent-side handle of the step process, with the same interface as StepExecutor """
+    def __init__(self, step_pin: int, dir_pin: int, gpio_backend: type, cpu: int = RT_CPU,
+                 priority: int = RT_PRIORITY):
+        """ Create the handle (the process is started with start())
+
+        :param step_pin: The GPIO pin of the STEP input of the driver
+        :param dir_pin: The GPIO pin of the DIR input of the driver
+        :param gpio_backend: The GPIOBase class the step process drives the pins with (created in the step process)
+        :param cpu: The CPU core to pin the step process to (None = don't pin)
+        :param priority: The SCHED_FIFO priority of the step process (None = keep the default scheduling)
+        """
+        self.step_pin = step_pin
+        self.dir_pin = dir_pin
+        self.gpio_backend = gpio_backend
+        self.cpu = cpu
+        self.priority = priority
+        self.direction = 1
+        self.steps_done = 0
+        self._commands = None
+        self._status = None
+        self._commands_ready = None     # Released for every command record, wakes up the idle step process
+        self._status_ready = None       # Released for every status record, wakes up the status reader
+        self._process = None
+        self._reader = None
+        self._running = False
+        self._move_id = 0
+        self._done = threading.Event()
+        self._push_lock = threading.Lock()   # run() and stop() are called from different threads
+        self._stop_mode = StopMode.NO
+
+    def start(self):
+        self._commands = SharedRing(COMMAND_FORMAT, RING_CAPACITY, create=True)
+        self._status = SharedRing(STATUS_FORMAT, RING_CAPACITY, create=True)
+        context = multiprocessing.get_context("spawn")
+        self._commands_ready = context.Semaphore(0)
+        self._status_ready = context.Semaphore(0)
+        self._process = context.Process(
+            target=_step_process_main,
+            args=(self._commands.name, self._status.name, self._commands_ready, self._status_ready, self.step_pin,
+                  self.dir_pin, self.gpio_backend, self.cpu, self.priority),
+            name="dip-coater-steps",
+            daemon=True,
+        )
+        # A spawned process imports the main module of the parent again, and with it the app state, which sets up
+        # the GPIO a second time. Hide the main module while starting: the step process only needs its arguments.
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            self._process.start()
+        finally:
+            sys.modules["__main__"] = main
+        self._running = True
+        self._reader = threading.Thread(target=self._read_status, name="dip-coater-steps-status", daemon=True)
+        self._reader.start()
+
+    def close(self):
+        if not self._running:
+            return
+        self._push(CMD_SHUTDOWN)
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._running = False
+        self._status_ready.release()    # Wake up the status reader to let it exit
+        self._reader.join(timeout=1)
+        for ring in (self._commands, self._status):
+            ring.close()
+            ring.unlink()
+
+    def prepare(self, move: ProcessMove):
+        self._move_id += 1
+        self._done.clear()
+        self._stop_mode = StopMode.NO
+        self.direction = move.direction
+        self.steps_done = 0
+
+    def run(self, move: ProcessMove) -> StopMode:
+        """ Send the move to the step process and wait until it is finished (blocking)
+
+        :param move: The ProcessMove to execute
+
+        :return: The StopMode of the movement (StopMode.NO for normal stop, other StopMode for early stop)
+
+        :raises RuntimeError: If the step process is not running (steps_done keeps the last published position)
+        """
+        self._push(CMD_MOVE, self._move_id, move.steps, move.speed, move.acceleration, move.jerk,
+                   _PROFILES.index(move.profile))
+        while not self._done.wait(ALIVE_CHECK_S):
+            if not self._process.is_alive():
+                raise RuntimeError(f"The step process exited (exit code {self._process.exitcode}) during the move, "
+                                   f"after {self.steps_done} steps.")
+        return self._stop_mode
+
+    def stop(self, stop_mode: StopMode = StopMode.HARDSTOP):
+        self._push(CMD_STOP, self._move_id, 0, 0, 0, 0, stop_mode.value)
+
+    def _push(self, command: int, move_id: int = 0, steps: int = 0, speed: float = 0, acceleration: float = 0,
+              jerk: float = 0, arg: int = 0):
+        with self._push_lock:
+            while not self._commands.push(command, move_id, steps, speed, acceleration, jerk, arg):
+                if not self._process.is_alive():
+                    return      # Nobody empties the ring any more
+                time.sleep(RING_FULL_RETRY_S)
+            self._commands_ready.release()
+
+    def _read_status(self):
+        """ Handle the status records of the step process (blocks while there are none) """
+        while True:
+            self._status_ready.acquire()
+            if not self._running:
+                return
+            record = self._status.pop()
+            while record is not None:
+                event, move_id, steps_done, stop_mode = record
+                if move_id == self._move_id:
+                    self.steps_done = steps_done
+                    if event == EVT_DONE:
+                        self._stop_mode = StopMode(stop_mode)
+                        self._done.set()
+                record = self._status.pop()
+
+
+def _set_realtime(cpu: int, priority: int):
+    """ Pin the current process to a CPU core and raise its scheduling priority, where allowed """
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except (OSError, ValueError) as err:
+            print(f"Step process: cannot pin to CPU {cpu}: {err}")
+    if priority is not None and hasattr(os, "sched_setscheduler"):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except (OSError, PermissionError) as err:
+            print(f"Step process: cannot switch to SCHED_FIFO: {err}")
+
+
+def _step_process_main(commands_name: str, status_name: str, commands_ready, status_ready, step_pin: int,
+                       dir_pin: int, gpio_backend: type, cpu: int, priority: int):
+    """ Entry point of the step process """
+    _set_realtime(cpu, priority)
+    commands = SharedRing(COMMAND_FORMAT, RING_CAPACITY, name=commands_name)
+    status = SharedRing(STATUS_FORMAT, RING_CAPACITY, name=status_name)
+
+    # Only drive the STEP and DIR outputs with the plain backend: the pins stay owned by the TMC library of the UI
+    # process, so the step process never runs a (global) GPIO cleanup
+    gpio = gpio_backend()
+    gpio.setup(step_pin, GpioMode.OUT)
+    gpio.setup(dir_pin, GpioMode.OUT)
+
+    def step():
+        gpio.output(step_pin, GpioState.HIGH)
+        gpio.output(step_pin, GpioState.LOW)
+
+    def set_direction(positive: bool):
+        gpio.output(dir_pin, GpioState.HIGH if positive else GpioState.LOW)
+
+    moves = deque()
+    stops = {}      # Stop requests per move id that came in before their move started (latched until it starts)
+    current = {"id": 0, "moving": False, "shutdown": False, "progress_s": 0.0}
+
+    def publish(*record):
+        while not status.push(*record):
+            time.sleep(RING_FULL_RETRY_S)
+        status_ready.release()
+
+    def poll():
+        """ Handle the received commands, including stop requests while a move is running, and publish the progress
+        (called before every step, and when woken up while idle) """
+        record = commands.pop()
+        while record is not None:
+            command, move_id, *args = record
+            if command == CMD_MOVE:
+                moves.append((move_id, *args))
+            elif command == CMD_STOP:
+                if move_id == current["id"] and current["moving"]:
+                    executor.stop(StopMode(args[-1]))
+                elif move_id > current["id"]:
+                    # The move is still queued or being planned
+                    stops[move_id] = StopMode(args[-1])
+            elif command == CMD_SHUTDOWN:
+                executor.stop(StopMode.HARDSTOP)
+                current["shutdown"] = True
+            record = commands.pop()
+        if current["moving"]:
+            now = time.monotonic()
+            if now - current["progress_s"] >= PROGRESS_INTERVAL_S:
+                publish(EVT_PROGRESS, current["id"], executor.steps_done, 0)
+                current["progress_s"] = now
+
+    executor = StepExecutor(step, set_direction, poll=poll)
+    cache = ProfileCache()
+    try:
+        while not current["shutdown"]:
+            if not moves:
+                commands_ready.acquire()    # Sleep until the UI process sends a command
+                poll()
+                continue
+            move_id, steps, speed, acceleration, jerk, profile_index = moves.popleft()
+            profile = _PROFILES[profile_index]
+            key = (steps, speed, acceleration, jerk, profile)
+            compiled = cache.get_or_compile(key, lambda: CompiledMove(
+                plan_move(steps, speed, acceleration, jerk or None, profile), speed, acceleration))
+            executor.prepare(compiled.profile)
+            current["id"], current["moving"] = move_id, True
+            poll()      # Stop requests that came in while planning
+            for stopped_id in [stopped_id for stopped_id in stops if stopped_id <= move_id]:
+                latched = stops.pop(stopped_id)
+                if stopped_id == move_id:
+                    executor.stop(latched)
+            gc.disable()    # No garbage collection pauses while stepping
+            try:
+                stop_mode = executor.run(compiled.profile)
+            finally:
+                gc.enable()
+                current["moving"] = False
+            publish(EVT_DONE, move_id, executor.steps_done, stop_mode.value)
+    finally:
+        commands.close()
+        status.close()
@@ -0,0 +1,72 @@
+""" Lock-free single-producer/single-consumer ring buffer in shared memory
+
+Used to pass fixed-size records between the UI process and the step generation process without locks or pipes. The
+producer only writes the head index and the consumer only writes the tail index, so neither side ever blocks the
+other. Head and tail live on separate cache lines to avoid false sharing.
+"""
+from multiprocessing import shared_memory
+import struct
+
+_INDEX = struct.Struct("<Q")
+_HEAD_OFFSET = 0
+_TAIL_OFFSET = 64
+_HEADER_SIZE = 128
+
+
+class SharedRing:
+    """ Fixed-capacity ring of struct records in a named shared memory block """
+    def __init__(self, record_format: str, capacity: int, name: str = None, create: bool = False):
+        """ Create or attach to a shared ring
+
+        :param record_format: The struct format of one record (e.g. "<Bqd")
+        :param capacity: The number of records the ring can hold
+        :param name: The name of the shared memory block (default: None = generate a name, only when creating)
+        :param create: Whether to create the shared memory block (producer/owner side) or attach to it
+        """
+        self._record = struct.Struct(record_format)
+        self.record_format = record_format
+        self.capacity = capacity
+        size = _HEADER_SIZE + capacity * self._record.size
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._buf = self._shm.buf
+        if create:
+            _INDEX.pack_into(self._buf, _HEAD_OFFSET, 0)
+            _INDEX.pack_into(self._buf, _TAIL_OFFSET, 0)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def push(self, *values) -> bool:
+        """ Append a record (producer side only)
+
+        :return: True if the record was written, False if the ring is full
+        """
+        head = _INDEX.unpack_from(self._buf, _HEAD_OFFSET)[0]
+        tail = _INDEX.unpack_from(self._buf, _TAIL_OFFSET)[0]
+        if head - tail >= self.capacity:
+            return False
+        self._record.pack_into(self._buf, _HEADER_SIZE + (head % self.capacity) * self._record.size, *values)
+        # Publish the record only after it is completely written
+        _INDEX.pack_into(self._buf, _HEAD_OFFSET, head + 1)
+        return True
+
+    def pop(self):
+        """ Take the oldest record (consumer side only)
+
+        :return: The record values as a tuple, or None if the ring is empty
+        """
+        tail = _INDEX.unpack_from(self._buf, _TAIL_OFFSET)[0]
+        head = _INDEX.unpack_from(self._buf, _HEAD_OFFSET)[0]
+        if tail == head:
+            return None
+        values = self._record.unpack_from(self._buf, _HEADER_SIZE + (tail % self.capacity) * self._record.size)
+        _INDEX.pack_into(self._buf, _TAIL_OFFSET, tail + 1)
+        return values
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
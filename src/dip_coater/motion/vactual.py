@@ -0,0 +1,115 @@
+""" Constant-velocity execution through the internal step generator (VACTUAL register) of the TMC2209
+
+With VACTUAL the driver generates the steps itself, so the velocity is free of host scheduling jitter. The distance is
+controlled by time: the velocity is set, the executor waits for the segment duration and then sets the velocity back
+to zero. VACTUAL has a resolution of VACTUAL_UNIT_HZ, so the duration and the steps done are computed from the
+quantized velocity the driver really runs at, not from the requested speed.
+"""
+import threading
+
+from TMC_2209._TMC_2209_move import StopMode
+
+from dip_coater.utils.clock import Clock
+
+VACTUAL_UNIT_HZ = 12e6 / 2 ** 24    # One VACTUAL unit in µsteps/s (internal 12 MHz clock)
+VACTUAL_MAX = 2 ** 23 - 1           # VACTUAL is a 24-bit signed register
+BUSY_WAIT_S = 0.002                 # Busy-wait the last 2 ms of a segment for an accurate end time
+
+
+class VelocitySegment:
+    """ A constant-velocity move """
+    def __init__(self, steps: int, speed: float):
+        """ Create a velocity segment
+
+        :param steps: The number of µsteps to move (positive or negative for the direction)
+        :param speed: The requested speed in µsteps/s (always positive)
+        """
+        self.direction = 1 if steps >= 0 else -1
+        self.steps = abs(int(steps))
+        self.requested_speed = speed
+        self.speed = quantize_speed(speed)  # The speed the driver really runs at in µsteps/s
+
+    @property
+    def duration_s(self) -> float:
+        return self.steps / self.speed if self.speed > 0 else 0.0
+
+    @property
+    def quantization_error(self) -> float:
+        """ The relative difference between the real and the requested speed """
+        return abs(self.speed - self.requested_speed) / self.requested_speed if self.requested_speed > 0 else 0.0
+
+
+def vactual_units(speed: float) -> int:
+    """ The signed number of VACTUAL units closest to a speed in µsteps/s """
+    return max(-VACTUAL_MAX, min(VACTUAL_MAX, round(speed / VACTUAL_UNIT_HZ)))
+
+
+def quantize_speed(speed: float) -> float:
+    """ The speed in µsteps/s the driver runs at when VACTUAL is set for the given speed """
+    return vactual_units(speed) * VACTUAL_UNIT_HZ
+
+
+def vactual_from_speed(speed: float) -> int:
+    """ Convert a signed speed in µsteps/s to the 24-bit two's complement VACTUAL register value """
+    return vactual_units(speed) & 0xFFFFFF
+
+
+class VactualExecutor:
+    """ Runs VelocitySegments on the VACTUAL step generator of the driver, with the same interface as StepExecutor """
+    def __init__(self, set_vactual, clock: Clock = None):
+        """ Create a VACTUAL executor
+
+        :param set_vactual: Function that writes the VACTUAL register of the driver
+        :param clock: The Clock to time the segments with (default: None = real time)
+        """
+        self._set_vactual = set_vactual
+        self._clock = clock or Clock()
+        self._stop_event = threading.Event()
+        self._stop_mode = StopMode.NO
+        self._start = None
+        self._end = None
+        self._segment = None
+        self.direction = 1
+
+    @property
+    def steps_done(self) -> int:
+        """ The number of µsteps moved, estimated from the elapsed time of the segment """
+        if self._segment is None or self._start is None:
+            return 0
+        elapsed = (self._end or self._clock.monotonic()) - self._start
+        return min(self._segment.steps, round(elapsed * self._segment.speed))
+
+    def stop(self, stop_mode: StopMode = StopMode.HARDSTOP):
+        """ Request the running segment to stop (VACTUAL stops immediately for both stop modes) """
+        if self._stop_mode != StopMode.HARDSTOP:
+            self._stop_mode = stop_mode
+        self._stop_event.set()
+
+    def prepare(self, segment: VelocitySegment):
+        self._stop_event.clear()
+        self._stop_mode = StopMode.NO
+        self._segment = segment
+        self._start = self._end = None
+        self.direction = segment.direction
+
+    def run(self, segment: VelocitySegment) -> StopMode:
+        """ Run the segment (blocking). Call prepare() with the segment first.
+
+        :param segment: The VelocitySegment to execute
+
+        :return: The StopMode of the movement (StopMode.NO for normal stop, other StopMode for early stop)
+        """
+        clock = self._clock
+        busy_wait_s = 0 if clock.virtual else BUSY_WAIT_S   # Virtual time doesn't pass while busy-waiting
+        duration = segment.duration_s
+        self._start = clock.monotonic()
+        end = self._start + duration
+        self._set_vactual(vactual_from_speed(segment.direction * segment.speed))
+        try:
+            if not clock.wait(self._stop_event, max(duration - busy_wait_s, 0)) and busy_wait_s:
+                while clock.monotonic() < end and not self._stop_event.is_set():
+                    pass
+        finally:
+            self._set_vactual(0)
+            self._end = min(clock.monotonic(), end)
+        return self._stop_mode
@@ -0,0 +1,38 @@
+""" Unit conversions between the linear axis of the dip coater (mm) and the stepper motor (µsteps) """
+
+# ======== CONSTANTS ========
+TRANS_PER_REV = 4  # The vertical translation in mm of the coater for one revolution of the motor
+FULLSTEPS_PER_REV = 200     # Full steps per revolution of the motor (1.8° per step)
+
+
+class UnitConversion:
+    """ Conversion factors for one microstep resolution, computed once so unit conversions never need the driver """
+    def __init__(self, microsteps: int, fullsteps_per_rev: int = FULLSTEPS_PER_REV,
+                 trans_per_rev: float = TRANS_PER_REV):
+        """ Create the conversion context
+
+        :param microsteps: The microstep resolution (1, 2, 4, 8, 16, 32, 64, 128, 256)
+        :param fullsteps_per_rev: The number of full steps per revolution of the motor
+        :param trans_per_rev: The vertical translation in mm for one revolution of the motor
+        """
+        self.microsteps = microsteps
+        self.steps_per_rev = fullsteps_per_rev * microsteps
+        self.steps_per_mm = self.steps_per_rev / trans_per_rev    # µsteps per mm
+        self.steps_s_per_mm_s = self.steps_per_mm                   # µsteps/s per mm/s
+        self.steps_s2_per_mm_s2 = self.steps_per_mm                 # µsteps/s^2 per mm/s^2
+        self.steps_s3_per_mm_s3 = self.steps_per_mm                 # µsteps/s^3 per mm/s^3
+
+    def steps_from_distance(self, distance_mm: float) -> int:
+        return round(distance_mm * self.steps_per_mm)
+
+    def distance_from_steps(self, steps: int) -> float:
+        return steps / self.steps_per_mm
+
+    def steps_from_speed(self, speed_mm_s: float) -> float:
+        return speed_mm_s * self.steps_s_per_mm_s
+
+    def steps_from_acceleration(self, acceleration_mm_s2: float) -> float:
+        return acceleration_mm_s2 * self.steps_s2_per_mm_s2
+
+    def steps_from_jerk(self, jerk_mm_s3: float) -> float:
+        return jerk_mm_s3 * self.steps_s3_per_mm_s3
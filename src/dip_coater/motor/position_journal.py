@@ -0,0 +1,120 @@
+""" Append-only journal of the motor position, so the homed state can survive a restart
+
+Every record is a single JSON line. Lines are flushed right away but only fsync'ed in batches (at most once per
+FSYNC_INTERVAL_S), except for the shutdown record, which is always fsync'ed. After a crash or power loss the journal
+therefore never ends with a shutdown record, and the homed state is not restored.
+"""
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+FSYNC_INTERVAL_S = 1.0
+MAX_RECORDS = 1000      # The journal is compacted to its last record when it grows beyond this many records
+
+EVENT_STATE = "state"
+EVENT_SHUTDOWN = "shutdown"
+
+
+class JournalState(NamedTuple):
+    """ Last known state of the motor according to the journal """
+    position: int           # The motor position in base units (1/256 full steps)
+    step_mode: int          # The microstep resolution
+    motor_enabled: bool     # Whether the motor was enabled (holding its position)
+    homed: bool             # Whether the position was referenced by a homing
+    clean_shutdown: bool    # Whether the last record is a shutdown record
+
+
+class PositionJournal:
+    """ Append-only, fsync-batched journal of the motor position """
+    def __init__(self, path: str, fsync_interval_s: float = FSYNC_INTERVAL_S, max_records: int = MAX_RECORDS):
+        """ Open the journal (the last state is read before new records are appended)
+
+        :param path: The path of the journal file (created if it doesn't exist)
+        :param fsync_interval_s: The minimal interval between two fsyncs in s
+        :param max_records: The number of records after which the journal is compacted on open
+        """
+        self.path = path
+        self.fsync_interval_s = fsync_interval_s
+        self._lock = threading.Lock()
+        self.last_state, records = self._read()
+        if records > max_records and self.last_state is not None:
+            self._compact()
+        self._file = open(path, "a", encoding="utf-8")
+        self._last_fsync = time.monotonic()
+
+    def record(self, position: int, step_mode: int, motor_enabled: bool, homed: bool):
+        """ Append the current state of the motor
+
+        :param position: The motor position in base units (1/256 full steps)
+        :param step_mode: The microstep resolution
+        :param motor_enabled: Whether the motor is enabled
+        :param homed: Whether the position is referenced by a homing
+        """
+        self._append(EVENT_STATE, position, step_mode, motor_enabled, homed, force_sync=False)
+
+    def close(self, position: int, step_mode: int, motor_enabled: bool, homed: bool):
+        """ Append the shutdown record with the final state of the motor, fsync and close the journal """
+        self._append(EVENT_SHUTDOWN, position, step_mode, motor_enabled, homed, force_sync=True)
+        with self._lock:
+            self._file.close()
+
+    def _append(self, event: str, position: int, step_mode: int, motor_enabled: bool, homed: bool,
+                force_sync: bool):
+        line = json.dumps({
+            "time": round(time.time(), 3),
+            "event": event,
+            "position": int(position),
+            "step_mode": int(step_mode),
+            "motor_enabled": bool(motor_enabled),
+            "homed": bool(homed),
+        })
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            if force_sync or time.monotonic() - self._last_fsync >= self.fsync_interval_s:
+                self._fsync()
+
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def _read(self) -> tuple:
+        """ Read the last valid record of the journal
+
+        :return: The JournalState of the last record (None if there is none) and the number of records
+        """
+        last, records = None, 0
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                        state = JournalState(int(record["position"]), int(record["step_mode"]),
+                                             bool(record["motor_enabled"]), bool(record["homed"]),
+                                             record["event"] == EVENT_SHUTDOWN)
+                    except (ValueError, KeyError, TypeError):
+                        continue    # Torn or corrupted line (e.g. power loss during a write)
+                    last = state
+                    records += 1
+        except FileNotFoundError:
+            pass
+        return last, records
+
+    def _compact(self):
+        """ Atomically replace the journal by its last record """
+        state = self.last_state
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({
+                "time": round(time.time(), 3),
+                "event": EVENT_SHUTDOWN if state.clean_shutdown else EVENT_STATE,
+                "position": state.position,
+                "step_mode": state.step_mode,
+                "motor_enabled": state.motor_enabled,
+                "homed": state.homed,
+            }) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
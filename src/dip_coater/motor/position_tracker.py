@@ -0,0 +1,44 @@
+""" Resolution-independent tracking of the motor position """
+import threading
+
+BASE_MICROSTEPS = 256   # The position is kept in 1/256 full steps, the finest µstep resolution of the TMC2209
+
+
+class PositionTracker:
+    """ Keeps the absolute motor position in base units (1/256 full steps), so the position stays correct when the
+    microstep resolution changes between moves """
+    def __init__(self, microsteps: int, position: int = 0):
+        """ Create a position tracker
+
+        :param microsteps: The current microstep resolution (1, 2, 4, 8, 16, 32, 64, 128, 256)
+        :param position: The initial position in base units
+        """
+        self._lock = threading.Lock()
+        self.microsteps = microsteps
+        self.position = position
+
+    @property
+    def factor(self) -> int:
+        """ The number of base units per µstep at the current resolution """
+        return BASE_MICROSTEPS // self.microsteps
+
+    @property
+    def steps(self) -> int:
+        """ The position in µsteps at the current resolution """
+        return round(self.position / self.factor)
+
+    def set_position(self, position: int):
+        """ Overwrite the position in base units """
+        with self._lock:
+            self.position = position
+
+    def set_resolution(self, microsteps: int) -> int:
+        """ Change the microstep resolution; the position in base units is unaffected
+
+        :param microsteps: The new microstep resolution
+
+        :return: The position in µsteps at the new resolution
+        """
+        with self._lock:
+            self.microsteps = microsteps
+        return self.steps
@@ -0,0 +1,352 @@
+""" Ahead-of-time compilation of Coder scripts into motion programs
+
+A Coder script runs once against the ProgramBuilder, a recording stand-in for the Coder API that moves nothing. Every
+API call becomes a ProgramStep with its estimated duration (from the same motion planner that times the real moves)
+and the position it ends at, and calls that would leave the soft limits or that the app would refuse are collected as
+violations. The resulting MotionProgram can be checked before anything moves, and run as one batch by the
+ProgramExecutor.
+"""
+from enum import Enum
+from typing import NamedTuple
+
+from dip_coater.constants import (
+    MIN_POSITION, MAX_POSITION, MIN_SPEED, MAX_SPEED, MAX_ACCELERATION, DEFAULT_SPEED, DEFAULT_ACCELERATION,
+    HOME_UP, HOMING_MAX_DISTANCE, HOMING_SPEED_MM_S
+)
+from dip_coater.motion.planner import MotionProfile, StreamedStepProfile, plan_move
+from dip_coater.motion.queue import MotionQueue
+from dip_coater.motor.conversions import UnitConversion
+from dip_coater.motion.vactual import VelocitySegment
+from dip_coater.motor.tmc2209 import (
+    TMC2209_MotorDriver, ExecutionEngine, HOMING_BACK_OFF_MM, HOMING_TOUCH_OFF_MM, ENABLE_SETTLE_S
+)
+
+
+class StepKind(Enum):
+    """ The kind of action of a program step """
+    ENABLE = "enable motor"
+    DISABLE = "disable motor"
+    MOVE = "move"                       # args: (distance_mm, speed_mm_s, acceleration_mm_s2), distance > 0 is up
+    MOVE_PROFILE = "speed profile"      # args: (distance_mm, speed_profile, acceleration_mm_s2), distance > 0 is up
+    MOVE_TO = "move to position"        # args: (position_mm, speed_mm_s, acceleration_mm_s2, home_up)
+    QUEUE = "queued moves"              # args: ((distance_mm, speed_mm_s, acceleration_mm_s2), ...)
+    HOME = "homing"                     # args: (home_up, speed_mm_s, fast_speed_mm_s)
+    SLEEP = "sleep"                     # args: (seconds,)
+
+
+class ProgramStep(NamedTuple):
+    """ A single action of a motion program """
+    kind: StepKind
+    args: tuple
+    duration_s: float       # Estimated duration in s
+    position_mm: float      # Estimated position at the end of the step in mm (None = unknown, not homed)
+    description: str
+
+    @property
+    def planned_duration_s(self) -> float:
+        """ The duration to schedule the step with in s (None = unplanned: homing takes as long as it takes to find
+        the switch, so the schedule follows its actual duration) """
+        return None if self.kind == StepKind.HOME else self.duration_s
+
+
+class LimitViolation(NamedTuple):
+    """ A step of a program that would leave the soft limits or that the app would refuse """
+    step: int               # Index of the step in the program
+    message: str
+
+
+class MotionProgram:
+    """ A flat list of program steps with their estimated timing, compiled from a Coder script """
+    def __init__(self):
+        self.steps = []
+        self.violations = []
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    @property
+    def total_s(self) -> float:
+        """ The estimated total duration of the program in s """
+        return sum(step.duration_s for step in self.steps)
+
+    @property
+    def valid(self) -> bool:
+        return not self.violations
+
+    def format(self) -> str:
+        """ The program as text: one line per step with its estimated start, duration and end position """
+        lines = []
+        start_s = 0.0
+        for i, step in enumerate(self.steps):
+            position = "?" if step.position_mm is None else f"{step.position_mm:.2f}"
+            lines.append(f"{i:4d}  {start_s:10.3f} s  {step.duration_s:+9.3f} s  {position:>8} mm  {step.description}")
+            start_s += step.duration_s
+        for violation in self.violations:
+            lines.append(f"Step {violation.step}: {violation.message}")
+        lines.append(f"Estimated cycle time: {self.total_s:.3f} s ({len(self.steps)} steps, "
+                     f"{len(self.violations)} violations)")
+        return "\n".join(lines)
+
+
+class ProgramBuilder:
+    """ Recording stand-in for the Coder API: compiles the API calls of a script into a MotionProgram
+
+    Positions follow get_current_position() of the motor driver: measured from the home switch, away from it. Before
+    the first homing the absolute position is unknown, so only the span of the relative moves is checked.
+    """
+    def __init__(self, microsteps: int, motion_profile: MotionProfile = MotionProfile.TRAPEZOIDAL,
+                 jerk_mm_s3: float = None, speed_mm_s: float = DEFAULT_SPEED,
+                 acceleration_mm_s2: float = DEFAULT_ACCELERATION, homing_speed_mm_s: float = HOMING_SPEED_MM_S,
+                 homing_fast_speed_mm_s: float = None, position_mm: float = None, homed_up: bool = HOME_UP,
+                 motor_enabled: bool = False, use_vactual: bool = True):
+        """ Create a program builder
+
+        :param microsteps: The microstep resolution the moves will run at
+        :param motion_profile: The velocity profile shape the moves are planned with
+        :param jerk_mm_s3: The jerk limit in mm/s^3 for S-curve profiles (default: None = trapezoidal ramps)
+        :param speed_mm_s: The speed of move_to_position() without a speed in mm/s
+        :param acceleration_mm_s2: The acceleration of the moves without an acceleration in mm/s^2
+        :param homing_speed_mm_s: The (slow) homing speed in mm/s
+        :param homing_fast_speed_mm_s: The speed of the fast homing approach in mm/s (default: None = single speed)
+        :param position_mm: The position at the start of the script in mm (default: None = not homed)
+        :param homed_up: Whether that position is measured from the top (True) or bottom (False) switch
+        :param motor_enabled: Whether the motor is enabled at the start of the script
+        :param use_vactual: Whether slow constant-velocity moves will run on the VACTUAL engine (like the motor driver)
+        """
+        self.conversion = UnitConversion(microsteps)
+        self.motion_profile = motion_profile
+        self.jerk_mm_s3 = jerk_mm_s3
+        self.speed_mm_s = speed_mm_s
+        self.acceleration_mm_s2 = acceleration_mm_s2
+        self.homing_speed_mm_s = homing_speed_mm_s
+        self.homing_fast_speed_mm_s = homing_fast_speed_mm_s
+        self.motor_enabled = motor_enabled
+        self.use_vactual = use_vactual
+        self.label = None       # Label to prefix the descriptions of the next steps with (e.g. the layer of a recipe)
+        self.program = MotionProgram()
+        self._queued_moves = []
+        # Travel upwards since the start of the script, or since the last homing, in mm
+        self._travel_mm = 0.0
+        self._travel_range = (0.0, 0.0)
+        self._homed = position_mm is not None
+        self._homed_up = homed_up
+        if self._homed:
+            self._travel_mm = -position_mm if homed_up else position_mm
+
+    @classmethod
+    def for_driver(cls, motor_driver: TMC2209_MotorDriver, **kwargs) -> "ProgramBuilder":
+        """ Create a program builder that starts from the current state of the motor driver
+
+        :param motor_driver: The motor driver the program will run on
+        :param kwargs: The other parameters of the ProgramBuilder
+        """
+        kwargs.setdefault("homed_up", HOME_UP)
+        return cls(motor_driver.conversion.microsteps, motor_driver.motion_profile, motor_driver.jerk_mm_s3,
+                   position_mm=motor_driver.get_current_position(kwargs["homed_up"]),
+                   motor_enabled=motor_driver.motor_enabled, use_vactual=motor_driver.use_vactual, **kwargs)
+
+    def compile(self, code: str) -> MotionProgram:
+        """ Run a Coder script against the recording API
+
+        :param code: The Python code of the script (uses the API through `self`)
+
+        :return: The compiled MotionProgram
+        """
+        exec(code, {"self": self})
+        if self._queued_moves:
+            self._violation(f"{len(self._queued_moves)} queued moves are never run (missing run_queue()).")
+        return self.program
+
+    @property
+    def position_mm(self) -> float:
+        """ The position at the end of the recorded steps in mm (None = not homed) """
+        if not self._homed:
+            return None
+        return -self._travel_mm if self._homed_up else self._travel_mm
+
+    def _add(self, kind: StepKind, args: tuple, duration_s: float, description: str):
+        """ Append a step to the program """
+        if self.label:
+            description = f"{self.label}: {description}"
+        self.program.steps.append(ProgramStep(kind, args, duration_s, self.position_mm, description))
+
+    def _violation(self, message: str, step: int = None):
+        """ Record a violation of the step with the given index (default: None = the next step) """
+        self.program.violations.append(LimitViolation(len(self.program) if step is None else step, message))
+
+    def _check_motor(self, action: str = "the move"):
+        """ Record a violation if the motor is disabled for the next step """
+        if not self.motor_enabled:
+            self._violation(f"The motor is disabled, {action} would be refused.")
+
+    def _check_settings(self, speed_mm_s: float, acceleration_mm_s2: float):
+        """ Record the violations of the speed and acceleration of the next step """
+        if speed_mm_s is None or not MIN_SPEED <= speed_mm_s <= MAX_SPEED:
+            self._violation(f"Speed {speed_mm_s} mm/s is outside [{MIN_SPEED}, {MAX_SPEED}] mm/s.")
+        if acceleration_mm_s2 is not None and not 0 <= acceleration_mm_s2 <= MAX_ACCELERATION:
+            self._violation(f"Acceleration {acceleration_mm_s2} mm/s² is outside [0, {MAX_ACCELERATION}] mm/s².")
+
+    def _travel(self, distance_mm: float):
+        """ Move the recorded position upwards by the given distance and check the soft limits """
+        self._travel_mm += distance_mm
+        low, high = self._travel_range
+        self._travel_range = (min(low, self._travel_mm), max(high, self._travel_mm))
+        position_mm = self.position_mm
+        if position_mm is not None:
+            if not MIN_POSITION <= position_mm <= MAX_POSITION:
+                self._violation(f"Ends at {position_mm:.2f} mm, outside the soft limits "
+                                f"[{MIN_POSITION}, {MAX_POSITION}] mm.")
+        elif self._travel_range[1] - self._travel_range[0] > MAX_POSITION - MIN_POSITION:
+            self._violation(f"The moves before homing span {self._travel_range[1] - self._travel_range[0]:.2f} mm, "
+                            f"more than the travel of the axis ({MAX_POSITION - MIN_POSITION} mm).")
+
+    def _move_duration(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float) -> float:
+        """ The planned duration of a point-to-point move in s (0 if the settings are invalid), on the engine the
+        motor driver will run it on """
+        conversion = self.conversion
+        steps = conversion.steps_from_distance(distance_mm)
+        if steps == 0 or speed_mm_s is None or speed_mm_s <= 0:
+            return 0.0
+        engine = TMC2209_MotorDriver.engine_for_move(steps, speed_mm_s, acceleration_mm_s2, conversion,
+                                                     self.use_vactual)
+        if engine == ExecutionEngine.VACTUAL:
+            # VACTUAL runs at the quantized speed, without ramps
+            return VelocitySegment(steps, conversion.steps_from_speed(speed_mm_s)).duration_s
+        jerk = conversion.steps_from_jerk(self.jerk_mm_s3) if self.jerk_mm_s3 else None
+        profile = plan_move(steps, conversion.steps_from_speed(speed_mm_s),
+                            conversion.steps_from_acceleration(acceleration_mm_s2 or 0), jerk, self.motion_profile)
+        return profile.duration_s
+
+    def _acceleration(self, acceleration_mm_s2: float = None) -> float:
+        return self.acceleration_mm_s2 if acceleration_mm_s2 is None else acceleration_mm_s2
+
+    def _move(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float, description: str):
+        acceleration_mm_s2 = self._acceleration(acceleration_mm_s2)
+        self._check_motor()
+        self._check_settings(speed_mm_s, acceleration_mm_s2)
+        duration_s = self._move_duration(distance_mm, speed_mm_s, acceleration_mm_s2)
+        self._travel(distance_mm)
+        self._add(StepKind.MOVE, (distance_mm, speed_mm_s, acceleration_mm_s2), duration_s, description)
+
+    def _move_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float, description: str):
+        acceleration_mm_s2 = self._acceleration(acceleration_mm_s2)
+        self._check_motor()
+        conversion = self.conversion
+        speed_mm_s_at = TMC2209_MotorDriver._speed_profile_function(speed_profile)
+
+        def speed_at(step_numbers):
+            return conversion.steps_from_speed(speed_mm_s_at(conversion.distance_from_steps(step_numbers)))
+
+        steps = conversion.steps_from_distance(distance_mm)
+        profile = StreamedStepProfile(steps, speed_at, conversion.steps_from_acceleration(acceleration_mm_s2))
+        try:
+            TMC2209_MotorDriver.check_speed_profile(speed_mm_s_at, conversion.distance_from_steps(abs(steps)),
+                                                    abs(steps))
+            duration_s = profile.duration_s
+        except ValueError as e:
+            self._violation(str(e))
+            duration_s = 0.0
+        self._travel(distance_mm)
+        self._add(StepKind.MOVE_PROFILE, (distance_mm, speed_profile, acceleration_mm_s2), duration_s, description)
+
+    def _queue(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float):
+        if speed_mm_s is None or speed_mm_s <= 0:
+            raise ValueError(f"The speed must be positive, got {speed_mm_s} mm/s.")
+        self._queued_moves.append((distance_mm, speed_mm_s, self._acceleration(acceleration_mm_s2)))
+
+    ''' ========== API for the code editor ========== '''
+
+    def enable_motor(self):
+        self.motor_enabled = True
+        self._add(StepKind.ENABLE, (), ENABLE_SETTLE_S, "enable_motor()")
+
+    def disable_motor(self):
+        self.motor_enabled = False
+        self._add(StepKind.DISABLE, (), 0.0, "disable_motor()")
+
+    def move_up(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        self._move(distance_mm, speed_mm_s, acceleration_mm_s2,
+                   f"move_up({distance_mm}, {speed_mm_s}, {acceleration_mm_s2})")
+
+    def move_down(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        self._move(-distance_mm, speed_mm_s, acceleration_mm_s2,
+                   f"move_down({distance_mm}, {speed_mm_s}, {acceleration_mm_s2})")
+
+    def move_up_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float = None):
+        self._move_profile(distance_mm, speed_profile, acceleration_mm_s2,
+                           f"move_up_profile({distance_mm}, ..., {acceleration_mm_s2})")
+
+    def move_down_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float = None):
+        self._move_profile(-distance_mm, speed_profile, acceleration_mm_s2,
+                           f"move_down_profile({distance_mm}, ..., {acceleration_mm_s2})")
+
+    def queue_move_up(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        self._queue(distance_mm, speed_mm_s, acceleration_mm_s2)
+
+    def queue_move_down(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        self._queue(-distance_mm, speed_mm_s, acceleration_mm_s2)
+
+    def run_queue(self):
+        moves, self._queued_moves = tuple(self._queued_moves), []
+        queue = MotionQueue()
+        conversion = self.conversion
+        self._check_motor("running the queue")
+        for distance_mm, speed_mm_s, acceleration_mm_s2 in moves:
+            self._check_settings(speed_mm_s, acceleration_mm_s2)
+            queue.add(conversion.steps_from_distance(distance_mm), conversion.steps_from_speed(speed_mm_s),
+                      conversion.steps_from_acceleration(acceleration_mm_s2))
+        duration_s = sum(profile.duration_s for profile in queue.plan())
+        for distance_mm, *_ in moves:
+            self._travel(distance_mm)
+        self._add(StepKind.QUEUE, moves, duration_s, f"run_queue() ({len(moves)} moves)")
+
+    def home_motor(self, home_up: bool = HOME_UP):
+        self._check_motor("homing")
+        # Approach the switch from the known position, or from the far end of the axis in the worst case
+        if self._homed:
+            approach_mm = self.position_mm
+            if self._homed_up != home_up:
+                approach_mm = MAX_POSITION - MIN_POSITION - approach_mm
+            approach_mm = max(approach_mm, 0.0)
+        else:
+            approach_mm = HOMING_MAX_DISTANCE
+        slow = self.homing_speed_mm_s
+        fast = self.homing_fast_speed_mm_s
+        if fast:
+            duration_s = approach_mm / fast + 2 * HOMING_TOUCH_OFF_MM / slow + HOMING_BACK_OFF_MM / slow
+        else:
+            duration_s = approach_mm / slow + HOMING_BACK_OFF_MM / slow
+        description = f"home_motor(home_up={home_up})"
+        if not self._homed:
+            description += " (worst case, start position unknown)"
+        self._homed = True
+        self._homed_up = home_up
+        self._travel_mm = -HOMING_BACK_OFF_MM if home_up else HOMING_BACK_OFF_MM
+        self._travel_range = (self._travel_mm, self._travel_mm)
+        self._add(StepKind.HOME, (home_up, slow, fast), duration_s, description)
+
+    def move_to_position(self, position_mm: float, speed_mm_s: float = None, acceleration_mm_s2: float = None,
+                         home_up: bool = HOME_UP):
+        description = f"move_to_position({position_mm}, {speed_mm_s}, {acceleration_mm_s2})"
+        speed_mm_s = self.speed_mm_s if speed_mm_s is None else speed_mm_s
+        acceleration_mm_s2 = self._acceleration(acceleration_mm_s2)
+        self._check_motor()
+        self._check_settings(speed_mm_s, acceleration_mm_s2)
+        if not MIN_POSITION <= position_mm <= MAX_POSITION:
+            self._violation(f"Position {position_mm} mm is outside the soft limits [{MIN_POSITION}, {MAX_POSITION}] mm.")
+        if not self._homed:
+            self._violation("The motor is not homed, the move would be refused.")
+            self._add(StepKind.MOVE_TO, (position_mm, speed_mm_s, acceleration_mm_s2, home_up), 0.0, description)
+            return
+        if home_up != self._homed_up:
+            self._violation(f"Position measured from the {'top' if home_up else 'bottom'} switch, but the motor is "
+                            f"homed {'up' if self._homed_up else 'down'}.")
+        distance_mm = (-position_mm if home_up else position_mm) - self._travel_mm
+        duration_s = self._move_duration(distance_mm, speed_mm_s, acceleration_mm_s2)
+        self._travel(distance_mm)
+        self._add(StepKind.MOVE_TO, (position_mm, speed_mm_s, acceleration_mm_s2, home_up), duration_s, description)
+
+    def sleep(self, seconds: float):
+        if seconds < 0:
+            self._violation(f"Negative sleep of {seconds} s.")
+        self._add(StepKind.SLEEP, (seconds,), max(seconds, 0.0), f"sleep({seconds})")
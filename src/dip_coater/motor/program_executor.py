@@ -0,0 +1,140 @@
+""" Batch execution of compiled motion programs
+
+The ProgramExecutor runs the steps of a MotionProgram back to back on the motor driver, in the calling thread: every
+move is started and awaited directly on the driver, without going back into the script or the event loop of the app
+in between. Every step is scheduled in a Timeline against the absolute deadline that follows from the estimated
+durations of the steps before it: a sleep ends at its deadline, so the overruns of the earlier moves are taken out of
+the dwell and drying times instead of adding up over the layers. The achieved and planned time of every step are
+reported in the Timeline.
+
+A program is aborted through its AbortSignal: the executor checks it before and after every step, a sleep wakes up as
+soon as it is set, and a move that started right after the abort is stopped before it is awaited.
+"""
+from TMC_2209._TMC_2209_move import StopMode
+
+from dip_coater.constants import (
+    LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_UP_NC, LIMIT_SWITCH_DOWN_PIN, LIMIT_SWITCH_DOWN_NC, HOMING_MAX_DISTANCE
+)
+from dip_coater.motor.program import MotionProgram, ProgramStep, StepKind
+from dip_coater.motor.tmc2209 import TMC2209_MotorDriver
+from dip_coater.utils.threading_util import AbortSignal
+from dip_coater.utils.timeline import Timeline
+
+
+class ProgramExecutor:
+    """ Runs motion programs on the motor driver """
+    def __init__(self, motor_driver: TMC2209_MotorDriver, log=print, abort_signal: AbortSignal = None):
+        """ Create a program executor
+
+        :param motor_driver: The motor driver to run the programs on
+        :param log: Function to log the progress messages with (default: print)
+        :param abort_signal: The AbortSignal that aborts the running program (default: None = a new one)
+        """
+        self.motor_driver = motor_driver
+        self.log = log
+        self.abort_signal = abort_signal or AbortSignal()
+        self.timeline = Timeline(motor_driver.clock)
+
+    def run(self, program: MotionProgram) -> bool:
+        """ Run all steps of a program, until one of them ends early (blocking)
+
+        :param program: The MotionProgram to run
+
+        :return: True if all steps completed, False if the program was aborted
+        """
+        self.abort_signal.start()
+        self.timeline.start()
+        try:
+            for i, step in enumerate(program.steps):
+                if not self.run_step(step):
+                    self.log(f"Program aborted at step {i}: {step.description}")
+                    return False
+        finally:
+            self.abort_signal.finish()
+        return True
+
+    def run_step(self, step: ProgramStep) -> bool:
+        """ Run a single program step and record its timing (blocking)
+
+        :param step: The ProgramStep to run
+
+        :return: True if the step completed, False if it ended early (stopped move, failed homing or abort)
+        """
+        if self.abort_signal.aborted:
+            return False
+        with self.timeline.record(step.description, step.planned_duration_s):
+            completed = self._run(step)
+        return completed and not self.abort_signal.aborted
+
+    def abort(self, stop_mode: StopMode = StopMode.HARDSTOP):
+        """ Abort the running program and stop the motor (from another thread)
+
+        :param stop_mode: The stop mode of the running move (SOFTSTOP, HARDSTOP)
+        """
+        self.abort_signal.abort()
+        self.motor_driver.stop_motor(stop_mode)
+
+    def bind_limit_switches(self):
+        """ Bind the limit switches to stop the motor driver """
+        self.motor_driver.bind_limit_switch(LIMIT_SWITCH_UP_PIN, NC=LIMIT_SWITCH_UP_NC)
+        self.motor_driver.bind_limit_switch(LIMIT_SWITCH_DOWN_PIN, NC=LIMIT_SWITCH_DOWN_NC)
+
+    def _run(self, step: ProgramStep) -> bool:
+        motor_driver = self.motor_driver
+        kind, args = step.kind, step.args
+        if kind == StepKind.ENABLE:
+            motor_driver.enable_motor()
+        elif kind == StepKind.DISABLE:
+            motor_driver.disable_motor()
+        elif kind == StepKind.MOVE:
+            distance_mm, speed_mm_s, acceleration_mm_s2 = args
+            motor_driver.drive_motor(distance_mm, speed_mm_s, acceleration_mm_s2, self._limit_switch_pins(distance_mm))
+            return self._wait(step)
+        elif kind == StepKind.MOVE_PROFILE:
+            distance_mm, speed_profile, acceleration_mm_s2 = args
+            motor_driver.run_speed_profile(distance_mm, speed_profile, acceleration_mm_s2,
+                                           self._limit_switch_pins(distance_mm))
+            return self._wait(step)
+        elif kind == StepKind.MOVE_TO:
+            motor_driver.run_to_position(*args)
+            return self._wait(step)
+        elif kind == StepKind.QUEUE:
+            for move in args:
+                motor_driver.queue_move(*move)
+            motor_driver.run_queue(self._limit_switch_pins(*[distance_mm for distance_mm, *_ in args]))
+            return self._wait(step)
+        elif kind == StepKind.HOME:
+            home_up, speed_mm_s, fast_speed_mm_s = args
+            distance = HOMING_MAX_DISTANCE if home_up else -HOMING_MAX_DISTANCE
+            try:
+                if not motor_driver.do_limit_switch_homing(LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_DOWN_PIN, distance,
+                                                           speed_mm_s, LIMIT_SWITCH_UP_NC, LIMIT_SWITCH_DOWN_NC,
+                                                           fast_speed_mm_s=fast_speed_mm_s):
+                    self.log("Homing failed")
+                    return False
+            finally:
+                self.bind_limit_switches()
+        elif kind == StepKind.SLEEP:
+            self.timeline.wait_for_deadline(self.abort_signal)
+        return True
+
+    def _wait(self, step: ProgramStep) -> bool:
+        """ Wait for the running move and log how it ended """
+        if self.abort_signal.aborted:
+            # Aborted while the move started: starting it cleared the stop request of the driver
+            self.motor_driver.stop_motor(StopMode.HARDSTOP)
+        result = self.motor_driver.wait_for_move_result()
+        if result.stop_mode != StopMode.NO:
+            self.log(f"-> Stopped {step.description} {result.stop_mode} (at {result.position} µsteps).")
+            return False
+        return True
+
+    @staticmethod
+    def _limit_switch_pins(*distances_mm: float) -> list:
+        """ The limit switches that guard moves over the given distances (positive for up) """
+        pins = []
+        if any(distance_mm > 0 for distance_mm in distances_mm):
+            pins.append(LIMIT_SWITCH_UP_PIN)
+        if any(distance_mm < 0 for distance_mm in distances_mm):
+            pins.append(LIMIT_SWITCH_DOWN_PIN)
+        return pins
@@ -0,0 +1,136 @@
+""" Shadow copy of the TMC2209 configuration registers
+
+Every setter of the TMC library does a read-modify-write of a whole register over UART. The RegisterShadow keeps the
+last known value of the GCONF, CHOPCONF and IHOLD_IRUN registers, so field changes are applied to the shadow value,
+writes that don't change anything are skipped and several field changes to the same register are merged into one
+UART write.
+"""
+from contextlib import contextmanager
+from typing import NamedTuple
+import threading
+
+# ======== REGISTER ADDRESSES ========
+GCONF = 0x00
+IHOLD_IRUN = 0x10   # Write-only
+CHOPCONF = 0x6C
+
+
+class Field(NamedTuple):
+    register: int
+    shift: int
+    width: int
+
+    @property
+    def mask(self) -> int:
+        return ((1 << self.width) - 1) << self.shift
+
+
+FIELDS = {
+    # GCONF
+    "i_scale_analog": Field(GCONF, 0, 1),
+    "internal_rsense": Field(GCONF, 1, 1),
+    "en_spreadcycle": Field(GCONF, 2, 1),
+    "shaft": Field(GCONF, 3, 1),
+    "pdn_disable": Field(GCONF, 6, 1),
+    "mstep_reg_select": Field(GCONF, 7, 1),
+    # IHOLD_IRUN
+    "ihold": Field(IHOLD_IRUN, 0, 5),
+    "irun": Field(IHOLD_IRUN, 8, 5),
+    "iholddelay": Field(IHOLD_IRUN, 16, 4),
+    # CHOPCONF
+    "vsense": Field(CHOPCONF, 17, 1),
+    "mres": Field(CHOPCONF, 24, 4),
+    "intpol": Field(CHOPCONF, 28, 1),
+}
+
+
+class RegisterShadow:
+    """ Write-through cache of the TMC2209 configuration registers with dirty tracking """
+    def __init__(self, uart):
+        """ Create a register shadow
+
+        :param uart: The UART interface of the TMC library (provides read_int and write_reg_check)
+        """
+        self._uart = uart
+        self._lock = threading.RLock()
+        self._values = {}       # Last value known to be in the driver, per register (None = unknown)
+        self._pending = {}      # Staged value to write, per register
+        self._batch_depth = 0
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def read(self, *registers):
+        """ (Re)load the shadow values of the given registers from the driver
+
+        :param registers: The register addresses to read (write-only registers can't be read)
+        """
+        with self._lock:
+            for register in registers:
+                value = self._uart.read_int(register)
+                self._values[register] = value if value is not None and value >= 0 else None
+                self._pending.pop(register, None)
+
+    def get_field(self, name: str):
+        """ Get the value of a register field from the shadow
+
+        :param name: The name of the field
+
+        :return: The field value, or None if the register value is unknown
+        """
+        field = FIELDS[name]
+        with self._lock:
+            value = self._pending.get(field.register, self._values.get(field.register))
+        if value is None:
+            return None
+        return (value & field.mask) >> field.shift
+
+    def set_fields(self, **fields) -> bool:
+        """ Stage new values for register fields and write the changed registers (unless a batch is open)
+
+        :param fields: The field names and their new values
+
+        :return: True if any field value changed, False otherwise
+        """
+        changed = False
+        with self._lock:
+            for name, value in fields.items():
+                field = FIELDS[name]
+                current = self._pending.get(field.register, self._values.get(field.register))
+                new = ((current or 0) & ~field.mask) | ((int(value) << field.shift) & field.mask)
+                if current is None or new != current:
+                    self._pending[field.register] = new
+                    changed = True
+            if self._batch_depth == 0:
+                self.flush()
+        return changed
+
+    def flush(self) -> int:
+        """ Write all staged registers whose value differs from the value in the driver
+
+        :return: The number of UART register writes
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            writes = 0
+            for register, value in pending.items():
+                if self._values.get(register) == value:
+                    self.skipped_writes += 1
+                    continue
+                self._uart.write_reg_check(register, value)
+                self._values[register] = value
+                writes += 1
+            self.writes += writes
+            return writes
+
+    @contextmanager
+    def batch(self):
+        """ Merge all field changes made inside the context into one write per register """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
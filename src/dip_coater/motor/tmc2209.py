@@ -1,15 +1,78 @@
 from TMC_2209.TMC_2209_StepperDriver import *
 from TMC_2209._TMC_2209_logger import Loglevel
 from TMC_2209._TMC_2209_move import MovementAbsRel, StopMode
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+import asyncio
+import inspect
+import math
 import time
 import logging
-import asyncio
-
-from dip_coater.gpio import get_gpio_instance, GPIOBase, GpioEdge, GpioState
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from dip_coater.constants import MIN_SPEED, MAX_SPEED, DEFAULT_ACCELERATION
+from dip_coater.gpio import get_gpio_instance, GPIOBase, GpioEdge, GpioState, SimulatedGPIO
+from dip_coater.motion.executor import StepExecutor
+from dip_coater.motion.jitter import StepRecorder
+from dip_coater.motion.planner import MotionProfile, StreamedStepProfile, plan_move
+from dip_coater.motion.queue import MotionQueue
+from dip_coater.motion.profile_cache import CompiledMove, ProfileCache
+from dip_coater.motion.rt_process import ProcessMove, StepGeneratorProcess
+from dip_coater.motion.vactual import VactualExecutor, VelocitySegment
+from dip_coater.motor.registers import RegisterShadow, GCONF, CHOPCONF
+from dip_coater.motor.conversions import UnitConversion, TRANS_PER_REV
+from dip_coater.motor.position_tracker import PositionTracker, BASE_MICROSTEPS
+from dip_coater.motor.position_journal import PositionJournal
+from dip_coater.utils.clock import Clock
+from dip_coater.utils.threading_util import CompletionSignal
 
 # ======== CONSTANTS ========
-TRANS_PER_REV = 4  # The vertical translation in mm of the coater for one revolution of the motor
-
+RSENSE = 0.11       # The sense resistor of the TMC2209 board in Ohm
+HOLD_CURRENT_MULTIPLIER = 0.5   # Hold current as a fraction of the run current
+HOLD_CURRENT_DELAY = 10         # Delay before switching to the hold current (IHOLDDELAY)
+VACTUAL_MAX_SPEED_MM_S = 2      # Only constant-velocity segments up to this speed run on the VACTUAL engine
+VACTUAL_MIN_DURATION_S = 2      # Only segments that take at least this long run on the VACTUAL engine
+VACTUAL_MAX_RAMP_FRACTION = 0.05    # Max fraction of the segment that may be spent on acceleration ramps
+VACTUAL_MAX_SPEED_ERROR = 0.005     # Max relative error of the VACTUAL speed (resolution 0.715 µsteps/s)
+HOMING_BACK_OFF_MM = 10         # Distance to move away from the home switch before and after homing
+HOMING_PROGRESS_INTERVAL_S = 0.1    # Interval of the homing progress reports
+HOMING_TOUCH_OFF_MM = 2         # Back-off distance between the fast approach and the slow touch-off of two-speed homing
+                                # (assumes the switch has this much overtravel: the fast approach hard-stops on the
+                                # switch, so the carriage ends up past its trigger point by the stopping distance)
+ENABLE_SETTLE_S = 0.3           # Time the motor gets to settle after it is enabled
+SPEED_PROFILE_CHECK_SAMPLES = 10000     # Max number of positions a speed profile is checked at before the move
+
+
+class ExecutionEngine(Enum):
+    """ How the steps of a move are generated """
+    STEP_DIR = "step/dir"   # Host-generated STEP/DIR pulses from the precomputed step timing table
+    VACTUAL = "vactual"     # Internal step generator of the TMC2209, velocity set over UART
+
+
+class HomingPhase(Enum):
+    """ Phases of the limit switch homing routine """
+    BACK_OFF = "back-off"       # Moving away from the home switch (already pressed, or before the touch-off)
+    FAST_APPROACH = "fast approach"     # Moving towards the home switch at high speed until it triggers (two-speed)
+    APPROACH = "approach"       # Moving towards the home switch until it triggers (the touch-off for two-speed)
+    RELEASE = "release"         # Moving away from the home switch after it triggered
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class HomingRecord(NamedTuple):
+    """ Repeatability measurement of a single homing """
+    touch_off_offset_mm: float  # Position of the slow touch-off w.r.t. the fast approach trigger (two-speed only)
+    zero_shift_mm: float        # Shift of the zero point w.r.t. the previous homing (None if not homed before)
+
+
+class MoveResult(NamedTuple):
+    """ Outcome of a single motor movement """
+    stop_mode: StopMode     # StopMode.NO for a normal stop, other StopMode for an early stop
+    position: int           # The motor position in µsteps after the movement
 
 class TMC2209_MotorDriver:
     homing_found = False
@@ -18,7 +81,10 @@ class TMC2209_MotorDriver:
     """ Class to control the TMC2209 motor driver for the dip coater"""
     def __init__(self, app_state, step_mode: int = 8, current: int = 1000, invert_direction: bool = False, interpolation: bool = True,
                  spread_cycle: bool = False, loglevel: Loglevel = Loglevel.ERROR, log_handlers: list = None,
-                 log_formatter: logging.Formatter = None):
+                 log_formatter: logging.Formatter = None, motion_profile: MotionProfile = MotionProfile.TRAPEZOIDAL,
+                 jerk_mm_s3: float = None, use_vactual: bool = True, use_step_process: bool = False,
+                 record_step_timing: bool = False, step_timing_dir: str = None, journal_path: str = None,
+                 hold_motor_on_exit: bool = False, clock: Clock = None):
         """ Initialize the motor driver
 
         :param app_state: The application state to use for the motor driver
@@ -30,9 +96,22 @@ class TMC2209_MotorDriver:
         :param loglevel: The log level to set for the motor driver (NONE, ERROR, INFO, DEBUG, MOVEMENT, ALL)
         :param log_handlers: The log handlers to use for the motor driver (default: None = log to console)
         :param log_formatter: The log formatter log the motor driver messages with (default: None = use default formatter)
+        :param motion_profile: The velocity profile shape to plan the moves with (TRAPEZOIDAL, S_CURVE)
+        :param jerk_mm_s3: The jerk limit in mm/s^3 for S-curve profiles (default: None = trapezoidal ramps)
+        :param use_vactual: Whether slow constant-velocity moves may run on the VACTUAL engine (default: True)
+        :param use_step_process: Whether STEP/DIR moves are generated in a dedicated real-time process (default: False)
+        :param record_step_timing: Whether to record and report the timing of every STEP/DIR step (default: False)
+        :param step_timing_dir: The directory to save the recorded step timing in (default: None = don't save)
+        :param journal_path: The path of the position journal (default: None = don't keep a journal)
+        :param hold_motor_on_exit: Whether to keep the motor enabled (holding its position) on shutdown, so the homed
+            state can be restored from the journal on the next start. Only possible when the GPIO backend can read
+            the enable pin back at start-up (default: False)
+        :param clock: The Clock to time the moves and delays with (default: None = real time). A virtual clock needs
+            the simulated TMC library (MyTMC_2209), and can't be used with the simulated GPIO.
         """
         # Get the appropriate GPIO instance
         self.GPIO = app_state.gpio
+        self.clock = clock or Clock()
 
         # GPIO pins
         self.en_pin = 11
@@ -41,20 +120,97 @@ class TMC2209_MotorDriver:
         self.diag_pin = 5
 
         # Motor driver
-        self.tmc = TMC_2209(self.en_pin, self.step_pin, self.dir_pin, loglevel=loglevel, log_handlers=log_handlers,
-                            log_formatter=log_formatter)
+        simulator_options = {}
+        if self.clock.virtual:
+            if "clock" not in inspect.signature(TMC_2209).parameters:
+                raise ValueError("The virtual clock can only be used with the simulated TMC library.")
+            if isinstance(getattr(self.GPIO, "backend", None), SimulatedGPIO):
+                # The simulated limit switches and the edge debouncing run in real time, while the carriage moves in
+                # virtual time: the switches would fire far past their position
+                raise ValueError("The virtual clock can't be used with the simulated GPIO.")
+            simulator_options["clock"] = self.clock
+        # The enable pin is driven here instead of by the TMC library (no pin = -1): the library sets the pin up
+        # inactive and disables the motor when it is deleted, which releases a motor that is held over a restart
+        self.tmc = TMC_2209(-1, self.step_pin, self.dir_pin, loglevel=loglevel, log_handlers=log_handlers,
+                            log_formatter=log_formatter, **simulator_options)
+        # The enable pin is active low. Whether it was still asserted at this start-up (held by the previous run).
+        self._enable_kept_on_start = self.GPIO.claim_output(self.en_pin, GpioState.HIGH) == GpioState.LOW
+
+        # Unit conversion factors for the current microstep resolution (replaced when the resolution changes)
+        self.conversion = UnitConversion(step_mode)
+        self._base_conversion = UnitConversion(BASE_MICROSTEPS)
+
+        # Absolute position in 1/256 full steps, independent of the microstep resolution
+        self.position = PositionTracker(step_mode)
+
+        # Shadow copy of the configuration registers, so unchanged settings don't cause UART traffic
+        self._registers = RegisterShadow(self.tmc.tmc_uart)
+        self._registers.read(GCONF, CHOPCONF)
 
         # Set motor driver settings
         self.tmc.set_vactual(False)      # Motor is not controlled by UART
-        self.tmc.set_direction_reg(invert_direction)
-        self.tmc.set_current(current, pdn_disable=False)    # mA
-        self.tmc.set_interpolation(interpolation)
-        self.tmc.set_spreadcycle(spread_cycle)  # True: spreadcycle, False: stealthchop
-        self.tmc.set_microstepping_resolution(step_mode)  # 1, 2, 4, 8, 16, 32, 64, 128, 256
-        self.tmc.set_internal_rsense(False)
+        with self.batch_register_writes():
+            self.set_direction(invert_direction)
+            self.set_current(current)   # mA
+            self.set_interpolation(interpolation)
+            self.set_spread_cycle(spread_cycle)  # True: spreadcycle, False: stealthchop
+            self.set_step_mode(step_mode)  # 1, 2, 4, 8, 16, 32, 64, 128, 256
+            self._registers.set_fields(internal_rsense=False)
 
         self.tmc.set_movement_abs_rel(MovementAbsRel.RELATIVE)
 
+        # Motion planning settings
+        self.speed_mm_s = None
+        self.acceleration_mm_s2 = None
+        self.motion_profile = motion_profile
+        self.jerk_mm_s3 = jerk_mm_s3
+        self.profile_cache = ProfileCache()
+
+        # Speed/acceleration last configured in the TMC library (only reconfigured when they change)
+        self._library_max_speed = None
+        self._library_acceleration = None
+
+        # Step executor that walks the precomputed step timing tables of the planner
+        self._executor = StepExecutor(self.tmc.make_a_step, self.tmc.set_direction_pin, self.clock)
+        self.step_timing_dir = step_timing_dir
+        self._step_timing_reporter = None   # Thread that reports (and saves) the recorded step timing
+        self.set_step_timing_recording(record_step_timing)
+        # Executor for constant-velocity segments on the internal step generator of the driver
+        self.use_vactual = use_vactual
+        self._vactual_executor = VactualExecutor(self.tmc.set_vactual, self.clock)
+        # Optional dedicated process that generates the STEP/DIR pulses, away from the GIL of the UI (real time only)
+        self._step_process = None
+        if use_step_process and not self.clock.virtual:
+            # The step process drives the pins with the same (plain) backend as the app, without the event layer
+            gpio_backend = type(getattr(self.GPIO, "backend", self.GPIO))
+            self._step_process = StepGeneratorProcess(self.step_pin, self.dir_pin, gpio_backend)
+            self._step_process.start()
+        self._active_executor = self._executor
+        self._move_start_position = 0   # Position at the start of the running move in base units
+        self._move_factor = self.position.factor
+        self._travel_offset = 0         # Offset of the position w.r.t. the start-up position (changed by homing)
+
+        # Repeatability of the homings since start-up, and the position at which the home switch last triggered
+        self.homing_records = []
+        self._homing_trigger_position = None
+
+        # Moves queued with queue_move() as (distance_mm, speed_mm_s, acceleration_mm_s2), run with run_queue()
+        self.queued_moves = []
+
+        # Journal of the position after every move, to restore the homed state after a restart
+        self.motor_enabled = self._enable_kept_on_start
+        self.tmc.set_motor_enabled(self.motor_enabled)
+        self.hold_motor_on_exit = hold_motor_on_exit
+        self.journal = PositionJournal(journal_path) if journal_path is not None else None
+        if self._enable_kept_on_start and not self._can_restore():
+            # The held position can't be trusted: release the motor until it is enabled again
+            self.disable_motor()
+
+        # Movement thread and its completion signal (resolved by the movement thread when the move ends)
+        self._move_thread = None
+        self._move_completion = CompletionSignal()
+        self._move_completion.set_result(MoveResult(StopMode.NO, self.position.steps))
+
     def read_back_config(self):
         self.tmc.read_ioin()
         self.tmc.read_chopconf()
@@ -65,36 +221,65 @@ class TMC2209_MotorDriver:
         """ Set the step mode of the motor driver
 
         :param _step_mode: The step mode to set (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+        :raises ValueError: If the step mode changes while the motor is moving (the running move counts its steps at
+            the resolution it started with)
         """
-        self.tmc.set_microstepping_resolution(_step_mode)
+        if _step_mode != self.conversion.microsteps and self.is_moving():
+            raise ValueError("The step mode can't be changed while the motor is moving.")
+        self._registers.set_fields(mres=8 - int(math.log2(_step_mode)), mstep_reg_select=True)
+        if _step_mode != self.conversion.microsteps:
+            self.conversion = UnitConversion(_step_mode)
+            # Rescale the µstep counter of the TMC library to the new resolution
+            self.tmc.set_current_position(self.position.set_resolution(_step_mode))
 
     def set_current(self, current: int = 1000):
         """ Set the current of the motor driver
 
         :param current: The current to set for the motor driver in mA
         """
-        self.tmc.set_current(current, pdn_disable=False)
+        # Same current scaling as the TMC library: use the high sensitivity range (vsense) for low currents
+        vsense = False
+        cs_irun = 32.0 * 1.41421 * current / 1000.0 * (RSENSE + 0.02) / 0.325 - 1
+        if cs_irun < 16:
+            vsense = True
+            cs_irun = 32.0 * 1.41421 * current / 1000.0 * (RSENSE + 0.02) / 0.180 - 1
+        cs_ihold = HOLD_CURRENT_MULTIPLIER * cs_irun
+        with self.batch_register_writes():
+            self._registers.set_fields(i_scale_analog=False, pdn_disable=False, vsense=vsense)
+            self._registers.set_fields(ihold=min(max(round(cs_ihold), 0), 31), irun=min(max(round(cs_irun), 0), 31),
+                                       iholddelay=HOLD_CURRENT_DELAY)
 
     def set_direction(self, invert_direction: bool = False):
         """ Set the direction of the motor driver
 
         :param invert_direction: Whether to invert the direction of the motor (default: False)
         """
-        self.tmc.set_direction_reg(invert_direction)
+        self._registers.set_fields(shaft=invert_direction)
 
     def set_interpolation(self, interpolation: bool = True):
         """ Set the interpolation setting of the motor driver
 
         :param interpolation: Whether to use interpolation for the motor driver
         """
-        self.tmc.set_interpolation(interpolation)
+        self._registers.set_fields(intpol=interpolation)
 
     def set_spread_cycle(self, spread_cycle: bool = False):
         """ Set the spread cycle/stealth chop setting of the motor driver
 
         :param spread_cycle: Whether to use spread_cycle for the motor driver (true) or stealth chop (false)
         """
-        self.tmc.set_spreadcycle(spread_cycle)
+        self._registers.set_fields(en_spreadcycle=spread_cycle)
+
+    def batch_register_writes(self):
+        """ Context manager that merges all configuration changes made inside it into one UART write per register
+
+        Usage:
+            with motor_driver.batch_register_writes():
+                motor_driver.set_step_mode(8)
+                motor_driver.set_interpolation(True)
+        """
+        return self._registers.batch()
 
     def set_loglevel(self, loglevel: Loglevel = Loglevel.INFO):
         """ Set the log level for the motor driver
@@ -105,12 +290,52 @@ class TMC2209_MotorDriver:
 
     def enable_motor(self):
         """ Arm the motor"""
+        self.GPIO.output(self.en_pin, GpioState.LOW)
         self.tmc.set_motor_enabled(True)
-        time.sleep(0.3)
+        self.motor_enabled = True
+        self._record_journal()
+        self.clock.sleep(ENABLE_SETTLE_S)
 
     def disable_motor(self):
         """ Disarm the motor """
+        self.GPIO.output(self.en_pin, GpioState.HIGH)
         self.tmc.set_motor_enabled(False)
+        self.motor_enabled = False
+        self._record_journal()
+
+    def restore_from_journal(self) -> bool:
+        """ Restore the position and the homed state from the position journal. This is only done when the journal
+        shows a clean shutdown with the homed motor held in position, and the enable pin was still asserted at this
+        start-up; otherwise the motor needs to be homed again.
+
+        :return: True if the homed state was restored, False otherwise
+        """
+        state = self.journal.last_state if self.journal is not None else None
+        if state is None:
+            return False
+        if not self._can_restore():
+            self.tmc.tmc_logger.log("Position journal: no clean shutdown with the homed motor held, homing needed",
+                                    Loglevel.INFO)
+            return False
+        self._set_position(state.position)
+        self.homing_found = True
+        self._record_journal()
+        self.tmc.tmc_logger.log(f"Position journal: restored the homed position "
+                                f"({self.get_current_position()} mm, step mode {state.step_mode})", Loglevel.INFO)
+        return True
+
+    def _can_restore(self) -> bool:
+        """ Whether the journal ends with a clean shutdown with the homed motor held, and the enable pin was still
+        asserted at this start-up (the motor kept holding the position in the journal) """
+        state = self.journal.last_state if self.journal is not None else None
+        return (state is not None and state.clean_shutdown and state.motor_enabled and state.homed
+                and self._enable_kept_on_start)
+
+    def _record_journal(self):
+        """ Append the current position, step mode, motor enable and homed state to the position journal """
+        if self.journal is not None:
+            self.journal.record(self.position.position, self.conversion.microsteps, self.motor_enabled,
+                                self.homing_found)
 
     def drive_motor(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = 0, limit_switch_pins: list = None):
         """ Drive the motor to move the coater up or down by the given distance at the given speed
@@ -124,10 +349,216 @@ class TMC2209_MotorDriver:
             for pin in limit_switch_pins:
                 if self._is_limit_switch_triggered(pin):
                     raise ValueError(f"Limit switch on pin {pin} is triggered. Please check the limit switches.")
-        revs = self.calculate_revs_from_distance(distance_mm)
-        self.set_speed(speed_mm_s)
-        self.set_acceleration(acceleration_mm_s2)
-        self.tmc.run_to_position_revolutions_threaded(revs)
+        self._update_move_settings(speed_mm_s, acceleration_mm_s2)
+        self._move_steps(self.conversion.steps_from_distance(distance_mm))
+
+    def select_engine(self, steps: int) -> ExecutionEngine:
+        """ Choose the execution engine for a move with the current speed and acceleration settings (see
+        engine_for_move())
+
+        :param steps: The number of µsteps to move (positive for up, negative for down)
+
+        :return: The ExecutionEngine to use
+        """
+        return self.engine_for_move(steps, self.speed_mm_s, self.acceleration_mm_s2, self.conversion, self.use_vactual)
+
+    @staticmethod
+    def engine_for_move(steps: int, speed_mm_s: float, acceleration_mm_s2: float, conversion: UnitConversion,
+                        use_vactual: bool = True) -> ExecutionEngine:
+        """ Choose the execution engine for a move. Long, slow moves with (nearly) constant velocity run on VACTUAL,
+        unless VACTUAL can't resolve their speed accurately enough. All other moves run on STEP/DIR.
+
+        :param steps: The number of µsteps to move (positive for up, negative for down)
+        :param speed_mm_s: The speed of the move in mm/s
+        :param acceleration_mm_s2: The acceleration of the move in mm/s^2 (0 or None = no ramps)
+        :param conversion: The unit conversion of the microstep resolution the move runs at
+        :param use_vactual: Whether the move may run on VACTUAL at all
+
+        :return: The ExecutionEngine to use
+        """
+        if not use_vactual or steps == 0 or speed_mm_s > VACTUAL_MAX_SPEED_MM_S:
+            return ExecutionEngine.STEP_DIR
+        distance_mm = abs(conversion.distance_from_steps(steps))
+        if distance_mm / speed_mm_s < VACTUAL_MIN_DURATION_S:
+            return ExecutionEngine.STEP_DIR
+        if acceleration_mm_s2:
+            ramps_mm = speed_mm_s ** 2 / acceleration_mm_s2
+            if ramps_mm > VACTUAL_MAX_RAMP_FRACTION * distance_mm:
+                return ExecutionEngine.STEP_DIR
+        if VelocitySegment(steps, conversion.steps_from_speed(speed_mm_s)).quantization_error > \
+                VACTUAL_MAX_SPEED_ERROR:
+            return ExecutionEngine.STEP_DIR
+        return ExecutionEngine.VACTUAL
+
+    def _move_steps(self, steps: int):
+        """ Start a relative move of the given µsteps on the execution engine that suits it best """
+        if self.speed_mm_s is None:
+            raise ValueError("No speed is set for the movement.")
+        if self.select_engine(steps) == ExecutionEngine.VACTUAL:
+            segment = VelocitySegment(steps, self.conversion.steps_from_speed(self.speed_mm_s))
+            self.tmc.tmc_logger.log(f"Running {segment.steps} µsteps in {segment.duration_s:.2f} s on VACTUAL",
+                                    Loglevel.DEBUG)
+            self._start_profile(segment, self._vactual_executor)
+        elif self._step_process is not None:
+            self._start_process_move(steps)
+        else:
+            self._start_compiled_move(self.compile_move(steps))
+
+    def _start_process_move(self, steps: int):
+        """ Start a relative move of the given µsteps on the step generation process (planned by the process) """
+        conversion = self.conversion
+        speed = conversion.steps_from_speed(self.speed_mm_s)
+        acceleration = conversion.steps_from_acceleration(self.acceleration_mm_s2 or 0)
+        jerk = conversion.steps_from_jerk(self.jerk_mm_s3) if self.jerk_mm_s3 else None
+        self._configure_library(speed, acceleration)
+        self._start_profile(ProcessMove(steps, speed, acceleration, jerk, self.motion_profile), self._step_process)
+
+    def set_motion_profile(self, motion_profile: MotionProfile, jerk_mm_s3: float = None):
+        """ Set the velocity profile shape to plan the moves with
+
+        :param motion_profile: The velocity profile shape (TRAPEZOIDAL, S_CURVE)
+        :param jerk_mm_s3: The jerk limit in mm/s^3 for S-curve profiles (default: None = keep the current jerk limit)
+        """
+        self.motion_profile = motion_profile
+        if jerk_mm_s3 is not None:
+            self.jerk_mm_s3 = jerk_mm_s3
+
+    def compile_move(self, steps: int) -> CompiledMove:
+        """ Get the compiled move for the current speed, acceleration and profile settings. Moves are cached by their
+        parameters, so repeated moves are only planned once.
+
+        :param steps: The number of µsteps to move (positive for up, negative for down)
+
+        :return: The CompiledMove (step profile and TMC library configuration)
+        """
+        if self.speed_mm_s is None:
+            raise ValueError("No speed is set for the movement.")
+        conversion = self.conversion
+        key = (steps, self.speed_mm_s, self.acceleration_mm_s2, self.motion_profile, self.jerk_mm_s3,
+               conversion.microsteps)
+        compiled = self.profile_cache.get_or_compile(key, lambda: self._compile_move(steps, conversion))
+        stats = self.profile_cache.stats()
+        self.tmc.tmc_logger.log(f"Profile cache: {stats.hits} hits, {stats.misses} misses, {stats.entries} entries "
+                                f"({stats.nbytes / 1024:.0f} KiB)", Loglevel.DEBUG)
+        return compiled
+
+    def _compile_move(self, steps: int, conversion: UnitConversion) -> CompiledMove:
+        """ Plan the step timing of a move and compute the matching TMC library configuration """
+        speed = conversion.steps_from_speed(self.speed_mm_s)
+        acceleration = conversion.steps_from_acceleration(self.acceleration_mm_s2 or 0)
+        jerk = None
+        if self.jerk_mm_s3:
+            jerk = conversion.steps_from_jerk(self.jerk_mm_s3)
+        profile = plan_move(steps, speed, acceleration, jerk, self.motion_profile)
+        return CompiledMove(profile, speed, acceleration)
+
+    def _update_move_settings(self, speed_mm_s: float = None, acceleration_mm_s2: float = None):
+        """ Remember the speed and acceleration to plan the next moves with (None = keep the current value) """
+        if speed_mm_s is not None:
+            self.speed_mm_s = speed_mm_s
+        if acceleration_mm_s2 is not None:
+            self.acceleration_mm_s2 = acceleration_mm_s2
+
+    def _configure_library(self, max_speed: float = None, acceleration: float = None):
+        """ Configure the speed (µsteps/s) and acceleration (µsteps/s^2) of the TMC library, skipping unchanged values """
+        if max_speed is not None and max_speed != self._library_max_speed:
+            self.tmc.set_max_speed(max_speed)
+            self._library_max_speed = max_speed
+        if acceleration is not None and acceleration != self._library_acceleration:
+            self.tmc.set_acceleration(acceleration)
+            self._library_acceleration = acceleration
+
+    def _start_compiled_move(self, compiled: CompiledMove):
+        """ Start executing a compiled move """
+        self._configure_library(compiled.max_speed, compiled.acceleration)
+        self._start_profile(compiled.profile)
+
+    def _start_profile(self, profile, executor=None):
+        """ Start executing a planned move in the movement thread
+
+        :param profile: The StepProfile (or VelocitySegment) to execute
+        :param executor: The executor to run it with (default: None = the STEP/DIR step executor)
+        """
+        self._move_start_position = self._get_position()
+        self._move_factor = self.position.factor
+        self._active_executor = executor or self._executor
+        self._active_executor.prepare(profile)
+        self._start_move(self._run_profile, profile)
+
+    def _run_profile(self, profile) -> StopMode:
+        """ Execute a planned move in the movement thread and update the position (and the TMC library counter) """
+        executor = self._active_executor
+        try:
+            stop_mode = executor.run(profile)
+        finally:
+            # Also count the steps of a move that failed half-way
+            moved = profile.direction * executor.steps_done * self._move_factor
+            self.position.set_position(self._move_start_position + moved)
+            self.tmc.set_current_position(self.position.steps)
+        if executor is self._executor and executor.recorder is not None:
+            # Hand the recording over to the reporting thread and record the next move with a fresh recorder, so the
+            # statistics and the file I/O don't delay the completion of the move
+            recorder, executor.recorder = executor.recorder, StepRecorder()
+            self._step_timing_reporter.submit(self._report_step_timing, recorder)
+        return stop_mode
+
+    def set_step_timing_recording(self, enabled: bool):
+        """ Enable or disable recording the timing of every step of the STEP/DIR moves. The timing statistics of each
+        recorded move are logged, and saved to step_timing_dir if it is set.
+
+        :param enabled: Whether to record the step timing
+        """
+        self._executor.recorder = StepRecorder() if enabled else None
+        if enabled and self._step_timing_reporter is None:
+            self._step_timing_reporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="step-timing")
+
+    def _report_step_timing(self, recorder: StepRecorder):
+        """ Log (and save) the timing statistics of the last recorded move """
+        report = recorder.report()
+        if report is None:
+            return
+        speed_mm_s = self.conversion.distance_from_steps(report.mean_speed)
+        self.tmc.tmc_logger.log(f"Step timing: {speed_mm_s:.3f} mm/s, {report.format()}", Loglevel.INFO)
+        if self.step_timing_dir is not None:
+            path = recorder.save(self.step_timing_dir)
+            self.tmc.tmc_logger.log(f"Step timing saved to {path}", Loglevel.DEBUG)
+
+    def _get_position(self) -> int:
+        """ The current motor position in base units (1/256 full steps), including the progress of a running move """
+        if self.is_moving():
+            executor = self._active_executor
+            return self._move_start_position + executor.direction * executor.steps_done * self._move_factor
+        return self.position.position
+
+    def _set_position(self, position: int):
+        """ Overwrite the current motor position in base units (1/256 full steps), also while a move is running """
+        self._travel_offset += self._get_position() - position
+        if self.is_moving():
+            executor = self._active_executor
+            self._move_start_position = position - executor.direction * executor.steps_done * self._move_factor
+        self.position.set_position(position)
+        self.tmc.set_current_position(self.position.steps)
+
+    def _start_move(self, run, *args):
+        """ Run a blocking movement function in a movement thread. The thread completes the move completion
+        signal with a MoveResult as soon as the movement ends.
+
+        :param run: The blocking movement function to run (returns the StopMode of the movement)
+        :param args: The arguments to pass to the movement function
+        """
+        completion = CompletionSignal()
+        self._move_completion = completion
+
+        def move():
+            stop_mode = StopMode.HARDSTOP
+            try:
+                stop_mode = run(*args)
+            finally:
+                completion.set_result(MoveResult(stop_mode, self.position.steps))
+                self._record_journal()
+
+        self._move_thread = threading.Thread(target=move, name="tmc2209-move", daemon=True)
+        self._move_thread.start()
 
     def set_speed(self, speed_mm_s: float):
         """ Set the speed at which to move the coater
@@ -136,9 +567,8 @@ class TMC2209_MotorDriver:
         """
         if speed_mm_s is None:
             return
-        rps = self.calculate_rps_from_speed(speed_mm_s)
-        max_speed = rps * self.tmc.read_steps_per_rev()
-        self.tmc.set_max_speed(max_speed)
+        self.speed_mm_s = speed_mm_s
+        self._configure_library(max_speed=self.conversion.steps_from_speed(speed_mm_s))
 
     def set_acceleration(self, acceleration_mm_s2: float):
         """ Set the acceleration at which to move the coater
@@ -147,25 +577,45 @@ class TMC2209_MotorDriver:
         """
         if acceleration_mm_s2 is None:
             return
-        rpss = self.calculate_rpss_from_acceleration(acceleration_mm_s2)
-        acceleration = rpss * self.tmc.read_steps_per_rev()
-        self.tmc.set_acceleration(acceleration)
+        self.acceleration_mm_s2 = acceleration_mm_s2
+        self._configure_library(acceleration=self.conversion.steps_from_acceleration(acceleration_mm_s2))
 
     def wait_for_motor_done(self) -> StopMode:
         """ Wait for the motor to finish moving
 
         :return: The StopMode of the movement (StopMode.NO for normal stop, other StopMode for early stop)
         """
-        return self.tmc.wait_for_movement_finished_threaded()
+        return self._move_completion.wait().stop_mode
+
+    def wait_for_move_result(self) -> MoveResult:
+        """ Wait for the motor to finish moving
+
+        :return: The MoveResult of the movement (StopMode and final position in µsteps)
+        """
+        return self._move_completion.wait()
 
     async def wait_for_motor_done_async(self) -> StopMode:
         """ Wait for the motor to finish moving asynchronously
 
         :return: The StopMode of the movement (StopMode.NO for normal stop, other StopMode for early stop)
         """
-        while self.tmc.distance_to_go() > 0:
-            await asyncio.sleep(0.1)  # Check every 100ms
-        return self.tmc.wait_for_movement_finished_threaded()
+        result = await self.wait_for_move_result_async()
+        return result.stop_mode
+
+    async def wait_for_move_result_async(self) -> MoveResult:
+        """ Wait for the motor to finish moving asynchronously. The movement thread resolves the returned future
+        on the running event loop as soon as the move ends, so no polling is involved.
+
+        :return: The MoveResult of the movement (StopMode and final position in µsteps)
+        """
+        return await self._move_completion.future()
+
+    def is_moving(self) -> bool:
+        """ Check whether a movement is in progress
+
+        :return: True if the motor is moving, False otherwise
+        """
+        return not self._move_completion.done()
 
     def move_up(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = 0, limit_switch_pins: list = None):
         """ Move the coater up by the given distance at the given speed
@@ -187,11 +637,138 @@ class TMC2209_MotorDriver:
         """
         self.drive_motor(-distance_mm, speed_mm_s, acceleration_mm_s2, limit_switch_pins)
 
+    def run_speed_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float = None,
+                          limit_switch_pins: list = None):
+        """ Move the coater by the given distance with a speed that varies with the position, e.g. for gradient
+        coatings. The step timing is computed in chunks while the move runs, so the speed changes at step resolution.
+
+        :param distance_mm: The distance to move the coater in mm (positive for up, negative for down)
+        :param speed_profile: The speed in mm/s as a function of the distance travelled since the start of the move
+            in mm: either a table of (distance_mm, speed_mm_s) samples (linearly interpolated), or a callable
+        :param acceleration_mm_s2: The acceleration to ramp up from and down to standstill with in mm/s^2
+            (default: None = the current acceleration)
+        :param limit_switch_pins: The GPIO pins of the limit switches to use for stopping the motor (default: None)
+        """
+        if limit_switch_pins is not None:
+            for pin in limit_switch_pins:
+                if self._is_limit_switch_triggered(pin):
+                    raise ValueError(f"Limit switch on pin {pin} is triggered. Please check the limit switches.")
+        if acceleration_mm_s2 is None:
+            acceleration_mm_s2 = self.acceleration_mm_s2 or 0
+        conversion = self.conversion
+        speed_mm_s_at = self._speed_profile_function(speed_profile)
+        steps = conversion.steps_from_distance(distance_mm)
+        # Check the whole profile before the move starts: the step timing is only computed while moving
+        self.check_speed_profile(speed_mm_s_at, conversion.distance_from_steps(abs(steps)), abs(steps))
+
+        def speed_at(step_numbers):
+            return conversion.steps_from_speed(speed_mm_s_at(conversion.distance_from_steps(step_numbers)))
+
+        profile = StreamedStepProfile(steps, speed_at, conversion.steps_from_acceleration(acceleration_mm_s2))
+        self._configure_library(acceleration=profile.acceleration)
+        self._start_profile(profile)
+
+    @staticmethod
+    def check_speed_profile(speed_mm_s_at, distance_mm: float, steps: int):
+        """ Check that a speed profile stays within [MIN_SPEED, MAX_SPEED] over the whole distance of a move
+
+        :param speed_mm_s_at: The speed profile function (see _speed_profile_function())
+        :param distance_mm: The distance of the move in mm (always positive)
+        :param steps: The number of µsteps of the move (the profile is checked at every step, up to
+            SPEED_PROFILE_CHECK_SAMPLES positions)
+
+        :raises ValueError: If the profile is outside the speed limits or not finite somewhere
+        """
+        distances_mm = np.linspace(0, distance_mm, min(steps, SPEED_PROFILE_CHECK_SAMPLES) + 1)
+        speeds_mm_s = np.broadcast_to(np.asarray(speed_mm_s_at(distances_mm), dtype=np.float64), distances_mm.shape)
+        invalid = ~np.isfinite(speeds_mm_s) | (speeds_mm_s < MIN_SPEED) | (speeds_mm_s > MAX_SPEED)
+        if np.any(invalid):
+            i = int(np.argmax(invalid))
+            raise ValueError(f"The speed profile gives {speeds_mm_s[i]} mm/s at {distances_mm[i]:.3f} mm, outside "
+                             f"[{MIN_SPEED}, {MAX_SPEED}] mm/s.")
+
+    @staticmethod
+    def _speed_profile_function(speed_profile):
+        """ Turn a speed profile (table of (distance_mm, speed_mm_s) samples or callable) into a function that maps
+        an array of distances in mm to an array of speeds in mm/s """
+        if callable(speed_profile):
+            def speed_at(distances_mm):
+                try:
+                    return speed_profile(distances_mm)
+                except (TypeError, ValueError):
+                    # Not vectorized (e.g. uses math functions or if-statements): evaluate per step
+                    return np.vectorize(speed_profile, otypes=[np.float64])(distances_mm)
+            return speed_at
+        samples = np.asarray(speed_profile, dtype=np.float64)
+        if samples.ndim != 2 or samples.shape[1] != 2 or len(samples) == 0:
+            raise ValueError("A speed profile table must contain (distance_mm, speed_mm_s) samples.")
+        samples = samples[np.argsort(samples[:, 0])]
+        return lambda distances_mm: np.interp(distances_mm, samples[:, 0], samples[:, 1])
+
+    def queue_move(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        """ Append a move to the motion queue. Queued moves in the same direction are blended into one continuous
+        motion when the queue is run, instead of stopping after every move.
+
+        :param distance_mm: The distance to move the coater in mm (positive for up, negative for down)
+        :param speed_mm_s: The speed at which to move the coater in mm/s (always positive)
+        :param acceleration_mm_s2: The acceleration/deceleration to use in mm/s^2 (default: None = the current
+            acceleration)
+        """
+        if speed_mm_s is None or speed_mm_s <= 0:
+            raise ValueError(f"The speed must be positive, got {speed_mm_s} mm/s.")
+        if acceleration_mm_s2 is None:
+            acceleration_mm_s2 = self.acceleration_mm_s2 or 0
+        self.queued_moves.append((distance_mm, speed_mm_s, acceleration_mm_s2))
+
+    def clear_queue(self):
+        """ Remove all moves from the motion queue """
+        self.queued_moves = []
+
+    def run_queue(self, limit_switch_pins: list = None):
+        """ Run and empty the motion queue. Use wait_for_motor_done() or wait_for_move_result_async() to wait
+        until all queued moves are done.
+
+        :param limit_switch_pins: The GPIO pins of the limit switches to use for stopping the motor (default: None)
+        """
+        if limit_switch_pins is not None:
+            for pin in limit_switch_pins:
+                if self._is_limit_switch_triggered(pin):
+                    raise ValueError(f"Limit switch on pin {pin} is triggered. Please check the limit switches.")
+        queue = MotionQueue()
+        conversion = self.conversion
+        for distance_mm, speed_mm_s, acceleration_mm_s2 in self.queued_moves:
+            queue.add(conversion.steps_from_distance(distance_mm), conversion.steps_from_speed(speed_mm_s),
+                      conversion.steps_from_acceleration(acceleration_mm_s2))
+        self.queued_moves = []
+        profiles = queue.plan()
+        self.tmc.tmc_logger.log(f"Running {len(queue)} queued moves as {len(profiles)} blended motions",
+                                Loglevel.DEBUG)
+        if not profiles:
+            return
+        self._move_start_position = self._get_position()
+        self._move_factor = self.position.factor
+        self._active_executor = self._executor
+        self._executor.prepare(profiles[0])
+        self._start_move(self._run_profiles, profiles)
+
+    def _run_profiles(self, profiles: list) -> StopMode:
+        """ Execute a sequence of planned moves in the movement thread, until one of them is stopped early """
+        stop_mode = StopMode.NO
+        for i, profile in enumerate(profiles):
+            if i > 0:
+                self._executor.prepare(profile)
+                self._move_start_position = self.position.position
+            stop_mode = self._run_profile(profile)
+            if stop_mode != StopMode.NO:
+                break
+        return stop_mode
+
     def stop_motor(self, stop_mode: StopMode = StopMode.HARDSTOP):
         """ Stop the motor when it is moving
 
         :param stop_mode: The stop mode to use (SOFTSTOP, HARDSTOP)
         """
+        self._active_executor.stop(stop_mode)
         self.tmc.stop(stop_mode)
 
     def bind_limit_switch(self, limit_switch_pin: int, NC: bool = True):
@@ -207,19 +784,8 @@ class TMC2209_MotorDriver:
         self.GPIO.add_event_detect(limit_switch_pin, event, callback=self._stop_motor_callback, bouncetime=5)
 
     def _stop_motor_callback(self, pin_number):
-        if self._wait_for_debounce(pin_number):
-            self.stop_motor(StopMode.HARDSTOP)
-
-    def _wait_for_debounce(self, pin_number, debounce_time_ms=10) -> bool:
-        """ Wait for the debounce time of the limit switch
-
-        :param pin_number: The GPIO pin of the limit switch
-        :param debounce_time_ms: The debounce time in ms
-
-        :return: True if the limit switch is triggered, False otherwise
-        """
-        time.sleep(debounce_time_ms / 1000)
-        return self._is_limit_switch_triggered(pin_number)
+        # Called by the GPIO edge dispatcher as soon as the limit switch edge is confirmed (debounced)
+        self.stop_motor(StopMode.HARDSTOP)
 
     def _is_limit_switch_triggered(self, pin_number) -> bool:
         """ Check whether the limit switch is triggered
@@ -238,8 +804,40 @@ class TMC2209_MotorDriver:
 
     def do_limit_switch_homing(self, limit_switch_up_pin: int, limit_switch_down_pin: int,
                                distance_mm: float, speed_mm_s: float = 2,
-                               switch_up_nc: bool = True, switch_down_nc: bool = True) -> bool:
-        """ Perform the homing routine for the motor driver using limit switches
+                               switch_up_nc: bool = True, switch_down_nc: bool = True,
+                               fast_speed_mm_s: float = None) -> bool:
+        """ Perform the homing routine for the motor driver using limit switches (blocking)
+
+        !!! Removes the existing limit switch event bindings !!!
+
+        See do_limit_switch_homing_async() for the parameters.
+
+        :return: True if the homing routine was successful, False otherwise
+        """
+        homing = self.do_limit_switch_homing_async(limit_switch_up_pin, limit_switch_down_pin, distance_mm,
+                                                   speed_mm_s, switch_up_nc, switch_down_nc,
+                                                   fast_speed_mm_s=fast_speed_mm_s)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(homing)
+        # asyncio.run() can't be nested in the event loop of the calling thread: run the routine on an event loop
+        # of its own in a helper thread, and block until it is done
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="homing") as pool:
+            return pool.submit(asyncio.run, homing).result()
+
+    async def do_limit_switch_homing_async(self, limit_switch_up_pin: int, limit_switch_down_pin: int,
+                                           distance_mm: float, speed_mm_s: float = 2,
+                                           switch_up_nc: bool = True, switch_down_nc: bool = True,
+                                           progress=None, fast_speed_mm_s: float = None,
+                                           touch_off_mm: float = HOMING_TOUCH_OFF_MM) -> bool:
+        """ Perform the homing routine for the motor driver using limit switches. The routine runs through the
+        phases back-off (only when the home switch is already pressed), approach and release, and awaits the moves
+        instead of blocking. Cancelling the task stops the motor.
+
+        With a fast speed, the routine homes in two speeds: a fast approach until the home switch triggers, a short
+        back-off, and a slow touch-off at speed_mm_s that sets the final zero. Every homing is recorded in
+        homing_records to track its repeatability.
 
         !!! Removes the existing limit switch event bindings !!!
 
@@ -249,9 +847,17 @@ class TMC2209_MotorDriver:
         :param speed_mm_s: The speed to use for the homing routine in mm/s (default: 2 mm/s)
         :param switch_up_nc: Whether the top limit switch is normally closed (NC) or normally open (NO) (default: True)
         :param switch_down_nc: Whether the bottom limit switch is normally closed (NC) or normally open (NO) (default: True)
+        :param progress: Function called with the HomingPhase and the distance travelled in that phase in mm while
+            homing (default: None)
+        :param fast_speed_mm_s: The speed of the fast approach in mm/s (default: None = home at speed_mm_s only)
+        :param touch_off_mm: The back-off distance before the slow touch-off in mm (default: HOMING_TOUCH_OFF_MM)
 
         :return: True if the homing routine was successful, False otherwise
         """
+        def report(phase: HomingPhase, travelled_mm: float = 0):
+            if progress is not None:
+                progress(phase, travelled_mm)
+
         # Set up the limit switches IO
         self.GPIO.remove_event_detect(limit_switch_up_pin)
         self.GPIO.remove_event_detect(limit_switch_down_pin)
@@ -260,6 +866,7 @@ class TMC2209_MotorDriver:
         home_down = distance_mm <= 0
         home_pin = limit_switch_down_pin if home_down else limit_switch_up_pin
         other_pin = limit_switch_up_pin if home_down else limit_switch_down_pin
+        back_off_mm = HOMING_BACK_OFF_MM if home_down else -HOMING_BACK_OFF_MM
 
         # Get the condition for the limit switches (when they are triggered)
         home_switch_nc = switch_down_nc if home_down else switch_up_nc
@@ -269,55 +876,128 @@ class TMC2209_MotorDriver:
         home_trigger_event = GpioEdge.RISING if home_switch_nc else GpioEdge.FALLING
         other_trigger_event = GpioEdge.RISING if other_switch_nc else GpioEdge.FALLING
 
-        # The home switch is already pressed
-        if home_triggered:
-            if other_triggered:
-                raise ValueError("Both limit switches are triggered. Please check the limit switches.")
-
-            # Move the coater away from the home switch to start the homing routine
-            if home_down:
-                self.move_up(10, speed_mm_s)
-                self.wait_for_motor_done()
+        try:
+            # The home switch is already pressed
+            if home_triggered:
+                if other_triggered:
+                    raise ValueError("Both limit switches are triggered. Please check the limit switches.")
+
+                # Move the coater away from the home switch to start the homing routine
+                await self._homing_move(HomingPhase.BACK_OFF, back_off_mm, speed_mm_s, report)
+
+            # If the limit switch is still triggered after moving away, raise an error
+            home_triggered = self.GPIO.input(home_pin) == GpioState.HIGH if home_switch_nc else self.GPIO.input(home_pin) == GpioState.LOW
+            if home_triggered:
+                raise ValueError("The home switch is still triggered after backing off. Please check the limit switches.")
+
+            # Move the coater towards the home switch and wait for the home switch to be triggered
+            was_homed = self.homing_found
+            approach = (home_pin, home_trigger_event, other_pin, other_trigger_event, report)
+            touch_off_offset = 0
+            if fast_speed_mm_s:
+                # Ramp up to the fast speed instead of jumping to it
+                await self._approach_home_switch(HomingPhase.FAST_APPROACH, distance_mm, fast_speed_mm_s, *approach,
+                                                 acceleration_mm_s2=DEFAULT_ACCELERATION)
+                if self.homing_found:
+                    first_trigger = self._homing_trigger_position
+                    touch_off_back_off_mm = touch_off_mm if home_down else -touch_off_mm
+                    await self._homing_move(HomingPhase.BACK_OFF, touch_off_back_off_mm, speed_mm_s, report)
+                    if self.GPIO.input(home_pin) == (GpioState.HIGH if home_switch_nc else GpioState.LOW):
+                        raise ValueError("The home switch is still triggered after backing off for the touch-off. "
+                                         "Please increase the touch-off distance or lower the fast homing speed.")
+                    await self._approach_home_switch(HomingPhase.APPROACH, -2 * touch_off_back_off_mm, speed_mm_s,
+                                                     *approach)
+                    touch_off_offset = self._homing_trigger_position
             else:
-                self.move_down(10, speed_mm_s)
-                self.wait_for_motor_done()
+                await self._approach_home_switch(HomingPhase.APPROACH, distance_mm, speed_mm_s, *approach)
+                first_trigger = self._homing_trigger_position
 
-        # If the limit switch is still triggered after moving away, raise an error
-        home_triggered = self.GPIO.input(home_pin) == GpioState.HIGH if home_switch_nc else self.GPIO.input(home_pin) == GpioState.LOW
-        if home_triggered:
-            raise ValueError("The home switch is still triggered after backing off. Please check the limit switches.")
+            if self.homing_found:
+                self._record_homing(touch_off_offset if fast_speed_mm_s else None,
+                                    first_trigger + touch_off_offset if was_homed else None)
 
-        # Move the coater towards the home switch and wait for the home switch to be triggered
+            # Move the coater away from the home switch if homing was found
+            if self.homing_found:
+                await self._homing_move(HomingPhase.RELEASE, back_off_mm, speed_mm_s, report)
+        except asyncio.CancelledError:
+            self.homing_found = False
+            report(HomingPhase.CANCELLED)
+            raise
+        except ValueError:
+            report(HomingPhase.FAILED)
+            raise
+
+        report(HomingPhase.DONE if self.homing_found else HomingPhase.FAILED)
+        return self.homing_found
+
+    async def _approach_home_switch(self, phase: HomingPhase, distance_mm: float, speed_mm_s: float, home_pin: int,
+                                    home_trigger_event: GpioEdge, other_pin: int, other_trigger_event: GpioEdge, report,
+                                    acceleration_mm_s2: float = 0):
+        """ Move towards the home switch until it triggers (sets homing_found and zeroes the position) """
         self.homing_found = False
+        self._homing_trigger_position = None
         self.GPIO.add_event_detect(home_pin, home_trigger_event, callback=self._stop_homing_callback, bouncetime=5)
         self.GPIO.add_event_detect(other_pin, other_trigger_event, callback=self._stop_homing_callback_other_pin, bouncetime=5)
-        self.drive_motor(distance_mm, speed_mm_s)
-        self.wait_for_motor_done()
-        self.GPIO.remove_event_detect(home_pin)
-        self.GPIO.remove_event_detect(other_pin)
-
-        # Move the coater away from the home switch if homing was found
-        if self.homing_found:
-            if home_down:
-                self.move_up(10, speed_mm_s)
-                self.wait_for_motor_done()
-            else:
-                self.move_down(10, speed_mm_s)
-                self.wait_for_motor_done()
-
-        return self.homing_found
+        try:
+            await self._homing_move(phase, distance_mm, speed_mm_s, report, acceleration_mm_s2)
+        finally:
+            self.GPIO.remove_event_detect(home_pin)
+            self.GPIO.remove_event_detect(other_pin)
+
+    def _record_homing(self, touch_off_offset: int = None, zero_shift: int = None):
+        """ Record (and log) the repeatability of a homing, from positions in base units """
+        to_mm = self._base_conversion.distance_from_steps
+        record = HomingRecord(None if touch_off_offset is None else to_mm(touch_off_offset),
+                              None if zero_shift is None else to_mm(zero_shift))
+        self.homing_records.append(record)
+        message = f"Homing #{len(self.homing_records)}:"
+        if record.touch_off_offset_mm is not None:
+            message += f" touch-off {record.touch_off_offset_mm:+.4f} mm from the fast approach trigger,"
+        if record.zero_shift_mm is not None:
+            message += f" zero shifted {record.zero_shift_mm:+.4f} mm,"
+        repeatability_mm = self.get_homing_repeatability()
+        if repeatability_mm is not None:
+            message += f" repeatability (std) {repeatability_mm:.4f} mm"
+        self.tmc.tmc_logger.log(message.rstrip(","), Loglevel.INFO)
+
+    def get_homing_repeatability(self) -> float:
+        """ The repeatability of the homings since start-up
+
+        :return: The standard deviation of the zero shifts between consecutive homings in mm, or None if there are
+            less than two of them
+        """
+        shifts = [record.zero_shift_mm for record in self.homing_records if record.zero_shift_mm is not None]
+        if len(shifts) < 2:
+            return None
+        return float(np.std(shifts))
+
+    async def _homing_move(self, phase: HomingPhase, distance_mm: float, speed_mm_s: float, report,
+                           acceleration_mm_s2: float = 0) -> MoveResult:
+        """ Run a single homing move and report its progress until it is done. Stops the motor when cancelled. """
+        start = self._get_position()
+        self.drive_motor(distance_mm, speed_mm_s, acceleration_mm_s2)
+        result = asyncio.ensure_future(self.wait_for_move_result_async())
+        try:
+            while not result.done():
+                report(phase, self._base_conversion.distance_from_steps(abs(self._get_position() - start)))
+                await asyncio.wait({result}, timeout=HOMING_PROGRESS_INTERVAL_S)
+        except asyncio.CancelledError:
+            self.stop_motor(StopMode.HARDSTOP)
+            result.cancel()
+            raise
+        report(phase, self._base_conversion.distance_from_steps(abs(self._get_position() - start)))
+        return result.result()
 
     def _stop_homing_callback(self, home_pin):
-        if self._wait_for_debounce(home_pin):
-            self.homing_found = True
-            self.stop_motor(StopMode.HARDSTOP)
-            self.tmc.set_current_position(0)
+        self.homing_found = True
+        self.stop_motor(StopMode.HARDSTOP)
+        self._homing_trigger_position = self._get_position()
+        self._set_position(0)
 
     def _stop_homing_callback_other_pin(self, other_pin):
-        if self._wait_for_debounce(other_pin):
-            self.homing_found = False
-            self.stop_motor(StopMode.HARDSTOP)
-            raise ValueError("The other limit switch was triggered. Please check the limit switches.")
+        self.homing_found = False
+        self.stop_motor(StopMode.HARDSTOP)
+        raise ValueError("The other limit switch was triggered. Please check the limit switches.")
 
     def do_stallguard_homing(self, revolutions: int = 25, threshold: int = 100, speed_mm_s: float = 2):
         """ Perform the homing routine for the motor driver using StallGuard
@@ -328,7 +1008,8 @@ class TMC2209_MotorDriver:
         :param speed_mm_s: The speed to use for the homing routine in mm/s (default: 2 mm/s)
         """
         # Homing sets the SpreadCycle to StealthChop, so we need to store the original setting and restore it afterwards
-        spread_cycle = self.tmc.get_spreadcycle()
+        spread_cycle = self._registers.get_field("en_spreadcycle")
+        self.tmc.read_steps_per_rev()   # Let the TMC library pick up the current microstep resolution
         speed_rpm = speed_mm_s / TRANS_PER_REV * 60
         self.tmc.do_homing(
             diag_pin=self.diag_pin,
@@ -336,7 +1017,9 @@ class TMC2209_MotorDriver:
             threshold=threshold,
             speed_rpm=speed_rpm
         )
-        self.tmc.set_spreadcycle(spread_cycle)
+        # The TMC library wrote GCONF behind the back of the register shadow
+        self._registers.read(GCONF)
+        self.set_spread_cycle(spread_cycle)
 
     def is_homing_found(self) -> bool:
         """ Check whether the motor driver is homed
@@ -355,7 +1038,7 @@ class TMC2209_MotorDriver:
         """
         if steps is None:
             # Perform 2 revolutions
-            steps = 2 * self.tmc.read_steps_per_rev()
+            steps = 2 * self.conversion.steps_per_rev
         self.tmc.test_stallguard_threshold(steps)
 
     def get_current_position(self, homed_up: bool = True):
@@ -367,11 +1050,16 @@ class TMC2209_MotorDriver:
         """
         if not self.homing_found:
             return None
-        pos = (self.tmc.get_current_position() / self.tmc.read_steps_per_rev()) * TRANS_PER_REV
+        pos = self._base_conversion.distance_from_steps(self._get_position())
         if homed_up:
             pos = -pos
         return pos
 
+    def get_travelled_distance(self) -> float:
+        """ The distance the motor travelled since start-up in mm (positive for up). Unlike the position, this is not
+        reset by homing, so it follows the physical carriage (e.g. for the simulated limit switches). """
+        return self._base_conversion.distance_from_steps(self._get_position() + self._travel_offset)
+
     def run_to_position(self, position_mm: float, speed_mm_s: float = None, acceleration_mm_s2: float = None,
                         homed_up: bool = True):
         """ Set the current position of the motor in mm
@@ -383,19 +1071,28 @@ class TMC2209_MotorDriver:
         """
         if not self.homing_found:
             raise ValueError("The motor is not homed.")
-        position_steps = round((position_mm / TRANS_PER_REV) * self.tmc.read_steps_per_rev())
+        position = self._base_conversion.steps_from_distance(position_mm)
         if homed_up:
-            position_steps = -position_steps
-
-        self.set_speed(speed_mm_s)
-        self.set_acceleration(acceleration_mm_s2)
-        self.tmc.run_to_position_steps_threaded(position_steps, movement_abs_rel=MovementAbsRel.ABSOLUTE)
+            position = -position
 
+        self._update_move_settings(speed_mm_s, acceleration_mm_s2)
+        self._move_steps(round((position - self._get_position()) / self.position.factor))
 
     def cleanup(self):
         """ Clean up the motor driver for shutdown"""
-        self.disable_motor()
-        self.GPIO.cleanup()
+        held = self.hold_motor_on_exit and self.motor_enabled
+        if not held:
+            self.disable_motor()
+        if self.journal is not None:
+            self.journal.close(self.position.position, self.conversion.microsteps, held, self.homing_found)
+            self.journal = None
+        if self._step_process is not None:
+            self._step_process.close()
+        if self._step_timing_reporter is not None:
+            self._step_timing_reporter.shutdown()   # Finish saving the recorded moves
+        if not held:
+            # Leave the GPIO pins (and so the enable pin) driven when the motor keeps holding its position
+            self.GPIO.cleanup()
         del self.tmc
 
     @staticmethod
@@ -0,0 +1,141 @@
+""" Declarative dip coating recipes
+
+A recipe describes a multi-layer coating in a JSON or TOML file instead of a Coder script: the immersion depth and
+speed, the dwell time in the liquid, the withdrawal speed, the drying time and the number of layers. It is compiled
+once into a MotionProgram (see dip_coater.motor.program), which runs as one batch on the ProgramExecutor.
+
+Example (TOML):
+
+    name = "3 layers"
+    home = true
+    start_position_mm = 20
+    immersion_depth_mm = 40
+    immersion_speed_mm_s = 5
+    dwell_s = 60
+    withdrawal_speed_mm_s = 0.5
+    drying_s = 300
+    repeat = 3
+"""
+import json
+from pathlib import Path
+from typing import NamedTuple
+
+from dip_coater.constants import DEFAULT_SPEED
+from dip_coater.motor.program import MotionProgram, ProgramBuilder
+
+RECIPE_FORMATS = {".json": "json", ".toml": "toml"}   # Recipe file suffixes and their format
+
+
+class DipRecipe(NamedTuple):
+    """ A multi-layer dip coating recipe """
+    immersion_depth_mm: float           # Distance to move down into the liquid (and back up) in mm
+    immersion_speed_mm_s: float         # Speed to immerse the substrate with in mm/s
+    withdrawal_speed_mm_s: float        # Speed to withdraw the substrate with in mm/s
+    dwell_s: float = 0                  # Time in the liquid in s
+    drying_s: float = 0                 # Time to dry after every withdrawal in s
+    repeat: int = 1                     # Number of layers
+    acceleration_mm_s2: float = None    # Acceleration of the moves in mm/s^2 (None = the default acceleration)
+    withdrawal_acceleration_mm_s2: float = None     # Acceleration of the withdrawal in mm/s^2 (None = as the others)
+    home: bool = False                  # Home the motor before the first layer
+    start_position_mm: float = None     # Position to start the layers from in mm (None = the current position)
+    approach_speed_mm_s: float = DEFAULT_SPEED     # Speed to move to the start position with in mm/s
+    disable_motor: bool = True          # Disable the motor after the last layer
+    name: str = ""
+
+
+def parse_recipe(text: str, recipe_format: str = "json") -> DipRecipe:
+    """ Parse a recipe
+
+    :param text: The text of the recipe
+    :param recipe_format: The format of the text ("json" or "toml")
+
+    :return: The DipRecipe
+    """
+    if recipe_format == "json":
+        settings = json.loads(text)
+    elif recipe_format == "toml":
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError as err:
+                raise ValueError("TOML recipes need Python 3.11 or the tomli module (pip install tomli).") from err
+        settings = tomllib.loads(text)
+    else:
+        raise ValueError(f"Unknown recipe format {recipe_format!r}, use one of {sorted(RECIPE_FORMATS.values())}.")
+    if not isinstance(settings, dict):
+        raise ValueError("A recipe must be a table of settings.")
+
+    unknown = set(settings) - set(DipRecipe._fields)
+    if unknown:
+        raise ValueError(f"Unknown recipe settings: {', '.join(sorted(unknown))}.")
+    missing = [field for field in DipRecipe._fields if field not in DipRecipe._field_defaults and field not in settings]
+    if missing:
+        raise ValueError(f"Missing recipe settings: {', '.join(missing)}.")
+    recipe = DipRecipe(**settings)
+    for field, value in recipe._asdict().items():
+        default = DipRecipe._field_defaults.get(field)
+        if isinstance(default, bool) or field == "name":
+            continue
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"The recipe setting {field} must be a number, got {value!r}.")
+
+    for field in ("immersion_depth_mm", "immersion_speed_mm_s", "withdrawal_speed_mm_s", "approach_speed_mm_s"):
+        if getattr(recipe, field) <= 0:
+            raise ValueError(f"The recipe setting {field} must be positive, got {getattr(recipe, field)}.")
+    for field in ("dwell_s", "drying_s"):
+        if getattr(recipe, field) < 0:
+            raise ValueError(f"The recipe setting {field} must not be negative, got {getattr(recipe, field)}.")
+    if not isinstance(recipe.repeat, int) or recipe.repeat < 1:
+        raise ValueError(f"The recipe setting repeat must be a positive integer, got {recipe.repeat}.")
+    return recipe
+
+
+def load_recipe(path) -> DipRecipe:
+    """ Load a recipe from a .json or .toml file
+
+    :param path: The path of the recipe file
+
+    :return: The DipRecipe
+    """
+    path = Path(path)
+    recipe_format = RECIPE_FORMATS.get(path.suffix.lower())
+    if recipe_format is None:
+        raise ValueError(f"A recipe file must be one of {', '.join(RECIPE_FORMATS)}, got {path.name}.")
+    return parse_recipe(path.read_text(), recipe_format)
+
+
+def is_recipe_file(path) -> bool:
+    return path is not None and Path(path).suffix.lower() in RECIPE_FORMATS
+
+
+def compile_recipe(recipe: DipRecipe, builder: ProgramBuilder) -> MotionProgram:
+    """ Compile a recipe into a motion program
+
+    :param recipe: The DipRecipe to compile
+    :param builder: The ProgramBuilder to compile with (starts from the state of the motor driver)
+
+    :return: The compiled MotionProgram
+    """
+    withdrawal_acceleration_mm_s2 = recipe.withdrawal_acceleration_mm_s2
+    if withdrawal_acceleration_mm_s2 is None:
+        withdrawal_acceleration_mm_s2 = recipe.acceleration_mm_s2
+
+    builder.enable_motor()
+    if recipe.home:
+        builder.home_motor()
+    if recipe.start_position_mm is not None:
+        builder.move_to_position(recipe.start_position_mm, recipe.approach_speed_mm_s, recipe.acceleration_mm_s2)
+    for layer in range(recipe.repeat):
+        builder.label = f"layer {layer + 1}/{recipe.repeat}"
+        builder.move_down(recipe.immersion_depth_mm, recipe.immersion_speed_mm_s, recipe.acceleration_mm_s2)
+        if recipe.dwell_s:
+            builder.sleep(recipe.dwell_s)
+        builder.move_up(recipe.immersion_depth_mm, recipe.withdrawal_speed_mm_s, withdrawal_acceleration_mm_s2)
+        if recipe.drying_s:
+            builder.sleep(recipe.drying_s)
+    builder.label = None
+    if recipe.disable_motor:
+        builder.disable_motor()
+    return builder.program
@@ -0,0 +1,126 @@
+""" Clocks of the dip coater
+
+All timing of the motor driver, the Coder and the status timers goes through a Clock, so the real clock can be swapped
+for a VirtualClock that runs multi-hour recipes in seconds, while still reporting the exact simulated timeline.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+VIRTUAL_GRACE_S = 0.002         # Real time a thread that just woke up gets to go back to sleep before time advances
+VIRTUAL_WAIT_SLICE_S = 0.01     # Virtual time step of an interruptible wait (wait())
+
+
+class Clock:
+    """ Real time """
+    virtual = False
+
+    def monotonic(self) -> float:
+        """ The current time in s """
+        return time.monotonic()
+
+    def perf_counter_ns(self) -> int:
+        """ The current time in ns, for step timing """
+        return time.perf_counter_ns()
+
+    def sleep(self, seconds: float):
+        """ Block the calling thread for the given number of seconds """
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float):
+        """ Sleep for the given number of seconds on the running event loop """
+        await asyncio.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """ Wait until the event is set or the timeout expires
+
+        :return: True if the event is set, False if the timeout expired
+        """
+        return event.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """ Discrete-event clock: time jumps to the next deadline instead of passing
+
+    The threads that sleep() drive the time: the thread with the earliest deadline wakes up and the time jumps to its
+    deadline, so concurrent sleepers (e.g. the movement thread and a Coder dwell) stay in the right order. A thread that
+    just woke up gets a short real-time grace period to go back to sleep before the time runs past it. Coroutines
+    that sleep_async() only observe the time: they wake up when it passes their deadline, but never advance it.
+    """
+    virtual = True
+
+    def __init__(self, start_s: float = 0.0, grace_s: float = VIRTUAL_GRACE_S):
+        """ Create a virtual clock
+
+        :param start_s: The start time in s
+        :param grace_s: The real time a thread that just woke up gets to go back to sleep before time advances in s
+        """
+        self.grace_s = grace_s
+        self._condition = threading.Condition()
+        self._now_ns = round(start_s * 1e9)
+        self._sequence = itertools.count()
+        self._sleepers = []     # Heap of (deadline_ns, sequence) of the sleeping threads
+        self._observers = []    # Heap of (deadline_ns, sequence, loop, future) of the sleeping coroutines
+        self._woken = {}        # Real time at which each thread last woke up, per thread id
+
+    def monotonic(self) -> float:
+        return self._now_ns / 1e9
+
+    def perf_counter_ns(self) -> int:
+        return self._now_ns
+
+    def sleep(self, seconds: float):
+        thread = threading.get_ident()
+        with self._condition:
+            self._woken.pop(thread, None)
+            entry = (self._now_ns + max(round(seconds * 1e9), 0), next(self._sequence))
+            heapq.heappush(self._sleepers, entry)
+            self._condition.notify_all()
+            while True:
+                if self._sleepers[0] is entry:
+                    grace = self._grace_remaining()
+                    if grace is None:
+                        break
+                    self._condition.wait(grace)
+                else:
+                    self._condition.wait()
+            heapq.heappop(self._sleepers)
+            self._advance(entry[0])
+            self._woken[thread] = time.monotonic()
+            self._condition.notify_all()
+
+    async def sleep_async(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            heapq.heappush(self._observers, (self._now_ns + round(seconds * 1e9), next(self._sequence), loop, future))
+        await future
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        end_ns = self._now_ns + round(timeout * 1e9)
+        while not event.is_set() and self._now_ns < end_ns:
+            self.sleep(min(VIRTUAL_WAIT_SLICE_S, (end_ns - self._now_ns) / 1e9))
+        return event.is_set()
+
+    def _grace_remaining(self):
+        """ The real time the other threads that just woke up still get to go back to sleep (None = none left) """
+        now = time.monotonic()
+        remaining = max((woken + self.grace_s - now for woken in self._woken.values()), default=0)
+        return remaining if remaining > 0 else None
+
+    def _advance(self, deadline_ns: int):
+        """ Advance the time to the deadline and wake up the coroutines whose deadline passed """
+        self._now_ns = max(self._now_ns, deadline_ns)
+        while self._observers and self._observers[0][0] <= self._now_ns:
+            _, _, loop, future = heapq.heappop(self._observers)
+            loop.call_soon_threadsafe(self._resolve, future)
+
+    @staticmethod
+    def _resolve(future):
+        if not future.done():
+            future.set_result(None)
@@ -6,18 +6,37 @@ def clamp(value, min_value, max_value):
     """Clamp a value between a minimum and maximum value."""
     return max(min(value, max_value), min_value)
 
-def config_save_coder_filepath(filepath: str):
-    data = {'coder_filepath': filepath}
-    with open(CONFIG_FILE, "w") as file:
-        dump(data, file)
-
-
-def config_load_coder_filepath():
+def _config_load() -> dict:
     try:
         with open(CONFIG_FILE, "r") as file:
             data = load(file)
-            return data.get('coder_filepath')
+            return data if isinstance(data, dict) else {}
     except FileNotFoundError:
-        return ""
+        return {}
     except JSONDecodeError:        # JSON file is empty or corrupted
-        return ""
+        return {}
+
+
+def _config_save(key: str, value):
+    data = _config_load()
+    data[key] = value
+    with open(CONFIG_FILE, "w") as file:
+        dump(data, file)
+
+
+def config_save_coder_filepath(filepath: str):
+    _config_save('coder_filepath', filepath)
+
+
+def config_load_coder_filepath():
+    return _config_load().get('coder_filepath', "")
+
+
+def config_save_gpio_backend(board_model: str, backend: str):
+    backends = _config_load().get('gpio_backends', {})
+    backends[board_model] = backend
+    _config_save('gpio_backends', backends)
+
+
+def config_load_gpio_backend(board_model: str):
+    return _config_load().get('gpio_backends', {}).get(board_model)
@@ -25,15 +25,19 @@ class StoppableThreadTimer:
 
 
 class AsyncioStoppableTimer:
-    def __init__(self, interval, coro, loop=None):
+    def __init__(self, interval, coro, loop=None, clock=None):
         self.interval = interval  # time in seconds between calls
         self.coro = coro  # asyncio coroutine to call
         self.loop = loop or asyncio.get_event_loop()
+        self.clock = clock  # Clock to time the calls on (None = real time)
         self.task = None
 
     async def _run(self):
         while True:
-            await asyncio.sleep(self.interval)
+            if self.clock is not None:
+                await self.clock.sleep_async(self.interval)
+            else:
+                await asyncio.sleep(self.interval)
             await self.coro()  # execute the coroutine
 
     def start(self):
@@ -43,4 +47,113 @@ class AsyncioStoppableTimer:
     def stop(self):
         if self.task is not None:
             self.task.cancel()
-            self.task = None
\ No newline at end of file
+            self.task = None
+
+class CompletionSignal:
+    """ One-shot result slot that is completed from a worker thread and can be waited on from other threads
+    (blocking) or from asyncio event loops (awaitable future) """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._result = None
+        self._waiters = []  # (loop, future) pairs to resolve on completion
+
+    def set_result(self, result):
+        with self._lock:
+            self._result = result
+            self._event.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._resolve, future, result)
+
+    @staticmethod
+    def _resolve(future, result):
+        if not future.done():
+            future.set_result(result)
+
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def result(self):
+        return self._result
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+        return self._result
+
+    def future(self, loop=None) -> asyncio.Future:
+        loop = loop or asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._event.is_set():
+                future.set_result(self._result)
+            else:
+                self._waiters.append((loop, future))
+        return future
+
+
+class ScriptAborted(BaseException):
+    """ Raised in a running script at its next API call when it is aborted. Derives from BaseException (like
+    KeyboardInterrupt), so an `except Exception` in the script does not swallow the abort. """
+
+
+class AbortSignal:
+    """ Stop request for the running script or program, shared between the STOP button and the threads that run them.
+    The runners check it before and after every step, and waits on it (see Clock.wait) wake up as soon as it is set. """
+    def __init__(self):
+        self.event = threading.Event()
+        self.active = False     # Whether a script or program is running that can be aborted
+
+    def start(self):
+        """ Clear the abort request when a script or program starts """
+        self.event.clear()
+        self.active = True
+
+    def finish(self):
+        self.active = False
+
+    def abort(self) -> bool:
+        """ Request the running script or program to abort
+
+        :return: True if a script or program was running
+        """
+        self.event.set()
+        return self.active
+
+    @property
+    def aborted(self) -> bool:
+        return self.event.is_set()
+
+    def check(self):
+        """ Raise ScriptAborted if the abort was requested """
+        if self.event.is_set():
+            raise ScriptAborted("Aborted by the user")
+
+
+class LoopBridge:
+    """ Runs coroutines on a running event loop on behalf of other threads (e.g. the Coder worker thread), so those
+    threads neither need an event loop of their own nor touch the objects of the loop from the wrong thread """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def run(self, coro_func, *args):
+        """ Run a coroutine function on the loop and wait for its result. Must not be called from the loop itself.
+
+        :param coro_func: The coroutine function to run
+        :param args: The arguments to pass to the coroutine function
+
+        :return: The result of the coroutine (its exception is raised in the calling thread)
+        """
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            raise RuntimeError("LoopBridge.run() called from its own event loop, which would deadlock.")
+        return asyncio.run_coroutine_threadsafe(coro_func(*args), self.loop).result()
+
+    def call(self, func, *args):
+        """ Call a regular function on the loop thread (e.g. to update widgets) and wait for its result """
+        async def call():
+            return func(*args)
+        return self.run(call)
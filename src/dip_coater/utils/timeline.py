@@ -0,0 +1,130 @@
+""" Timeline of the steps of a Coder script, measured on the clock of the app
+
+The timeline also schedules the script: every step with a planned duration gets an absolute deadline on the clock,
+counted from the start of the script. A dwell (sleep) waits until the deadline of its step instead of for its own
+duration, so the overruns of the moves before it (completion latency, logging, ...) are taken out of the dwell and
+do not add up over the cycles of a recipe.
+"""
+from contextlib import contextmanager
+import functools
+from typing import NamedTuple
+
+
+class TimelineEntry(NamedTuple):
+    """ A single step of a script """
+    start_s: float      # Start of the step w.r.t. the start of the script in s
+    end_s: float        # End of the step w.r.t. the start of the script in s
+    action: str
+    planned_start_s: float = None   # Planned start of the step w.r.t. the start of the script in s (None = unplanned)
+    planned_end_s: float = None     # Planned end (deadline) of the step w.r.t. the start of the script in s
+
+    @property
+    def duration_s(self) -> float:
+        return self.end_s - self.start_s
+
+    @property
+    def planned_duration_s(self) -> float:
+        return self.planned_end_s - self.planned_start_s
+
+    @property
+    def lateness_s(self) -> float:
+        """ How much later than planned the step ended in s (negative if it ended early) """
+        return self.end_s - self.planned_end_s
+
+
+class Timeline:
+    """ Records the start and end time of every step of a script, and the deadlines of its plan """
+    def __init__(self, clock):
+        """ Create a timeline
+
+        :param clock: The Clock to measure the steps on
+        """
+        self.clock = clock
+        self.entries = []
+        self.planned_s = 0.0    # Planned end of the last step w.r.t. the start of the script in s
+        self._origin = clock.monotonic()
+
+    def start(self):
+        """ Clear the timeline and start counting from now """
+        self.entries = []
+        self.planned_s = 0.0
+        self._origin = self.clock.monotonic()
+
+    @property
+    def elapsed_s(self) -> float:
+        """ The time since the start of the timeline in s """
+        return self.clock.monotonic() - self._origin
+
+    @property
+    def lateness_s(self) -> float:
+        """ How much later than planned the script is at the moment in s (negative if it is early) """
+        return self.elapsed_s - self.planned_s
+
+    @contextmanager
+    def record(self, action: str, planned_duration_s: float = None):
+        """ Context manager that records the time spent inside it as one step
+
+        :param action: The description of the step
+        :param planned_duration_s: The planned duration of the step in s (default: None = unplanned, the plan follows
+            the actual duration of the step)
+        """
+        start_s = self.elapsed_s
+        planned_start_s = self.planned_s
+        if planned_duration_s is not None:
+            self.planned_s += planned_duration_s
+        try:
+            yield
+        finally:
+            end_s = self.elapsed_s
+            if planned_duration_s is None:
+                self.planned_s = max(self.planned_s, end_s)
+            self.entries.append(TimelineEntry(start_s, end_s, action, planned_start_s, self.planned_s))
+
+    def wait_for_deadline(self, abort_signal=None):
+        """ Sleep until the deadline of the current step (the planned end of the last step). Returns immediately when
+        the script runs late.
+
+        :param abort_signal: The AbortSignal that ends the sleep early when it is set (default: None = not abortable)
+        """
+        remaining_s = self.planned_s - self.elapsed_s
+        if remaining_s <= 0:
+            return
+        if abort_signal is None:
+            self.clock.sleep(remaining_s)
+        else:
+            self.clock.wait(abort_signal.event, remaining_s)
+
+    def format(self) -> str:
+        """ The timeline as text, one line per step with its achieved and planned duration and its lateness """
+        lines = [f"{entry.start_s:10.3f} s  {entry.duration_s:+9.3f} s  (planned {entry.planned_duration_s:+9.3f} s, "
+                 f"late {entry.lateness_s:+7.3f} s)  {entry.action}" for entry in self.entries]
+        lines.append(f"Total: {self.elapsed_s:.3f} s, planned {self.planned_s:.3f} s"
+                     f"{' (virtual clock)' if self.clock.virtual else ''}")
+        return "\n".join(lines)
+
+
+def recorded(api_call):
+    """ Decorator that records every call of a Coder API method in the timeline (self.timeline) of its script. If
+    the object has a planner (self.planner, a ProgramBuilder), the call is planned first and recorded with its planned
+    duration. If the object has an abort signal (self.abort_signal, an AbortSignal), the call raises ScriptAborted
+    when the script is aborted before or during the call. """
+    @functools.wraps(api_call)
+    def record(self, *args, **kwargs):
+        abort_signal = getattr(self, "abort_signal", None)
+        if abort_signal is not None:
+            abort_signal.check()
+        arguments = ", ".join([repr(arg) for arg in args] + [f"{key}={value!r}" for key, value in kwargs.items()])
+        planned_duration_s = None
+        planner = getattr(self, "planner", None)
+        if planner is not None:
+            steps = len(planner.program)
+            getattr(planner, api_call.__name__)(*args, **kwargs)
+            planned = [step.planned_duration_s for step in planner.program.steps[steps:]]
+            planned_duration_s = None if None in planned else sum(planned)
+        with self.timeline.record(f"{api_call.__name__}({arguments})", planned_duration_s):
+            result = api_call(self, *args, **kwargs)
+        if abort_signal is not None:
+            # The call was cut short by the abort (stopped move, interrupted sleep)
+            abort_signal.check()
+        return result
+    return record
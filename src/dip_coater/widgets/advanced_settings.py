@@ -12,7 +12,8 @@ from dip_coater.constants import (
        HOMING_MIN_SPEED, HOMING_MAX_SPEED, DEFAULT_STEP_MODE, STEP_MODES, STEP_MODE_LABELS,
        DEFAULT_THRESHOLD_SPEED, THRESHOLD_SPEED_ENABLED, MIN_THRESHOLD_SPEED, MAX_THRESHOLD_SPEED,
        HIGH_SPEED_STEP_MODE, HIGH_SPEED_INTERPOLATION, HIGH_SPEED_SPREAD_CYCLE,
-       LOW_SPEED_STEP_MODE, LOW_SPEED_INTERPOLATION, LOW_SPEED_SPREAD_CYCLE
+       LOW_SPEED_STEP_MODE, LOW_SPEED_INTERPOLATION, LOW_SPEED_SPREAD_CYCLE, RECORD_STEP_TIMING,
+       HOMING_TWO_SPEED, HOMING_FAST_SPEED_MM_S, HOMING_MIN_FAST_SPEED, HOMING_MAX_FAST_SPEED
 )
 from dip_coater.widgets.step_mode import StepMode
 from dip_coater.utils.helpers import clamp
@@ -26,6 +27,8 @@ class AdvancedSettings(Static):
     homing_revs = reactive(HOMING_REVOLUTIONS)
     homing_threshold = reactive(HOMING_THRESHOLD)
     homing_speed = reactive(HOMING_SPEED_MM_S)
+    homing_two_speed = reactive(HOMING_TWO_SPEED)
+    homing_fast_speed = reactive(HOMING_FAST_SPEED_MM_S)
 
     threshold_speed = reactive(DEFAULT_THRESHOLD_SPEED)
     threshold_speed_enabled = reactive(THRESHOLD_SPEED_ENABLED)
@@ -68,6 +71,8 @@ class AdvancedSettings(Static):
                                classes="checkbox")
                 yield Checkbox("Interpolation", value=self.interpolate, id="interpolation-checkbox", classes="checkbox")
                 yield Checkbox("Spread Cycle (T)/Stealth Chop (F)", value=self.spread_cycle, id="spread-cycle-checkbox", classes="checkbox")
+                yield Checkbox("Record step timing", value=RECORD_STEP_TIMING, id="record-step-timing-checkbox",
+                               classes="checkbox")
             with Horizontal(id="threshold-speed-container"):
                 yield Label("Enable Threshold Speed: ", id="threshold-speed-switch-label")
                 yield Switch(value=self.threshold_speed_enabled, id="threshold-speed-switch")
@@ -120,6 +125,20 @@ class AdvancedSettings(Static):
                         classes="input-fields",
                     )
                     yield Label("RPM", id="homing-speed-unit")
+            with Horizontal(id="homing-fast-speed-container"):
+                yield Label("Two-speed homing: ", id="homing-two-speed-switch-label")
+                yield Switch(value=self.homing_two_speed, id="homing-two-speed-switch")
+                yield Label("Fast homing speed: ", id="homing-fast-speed-label")
+                yield Input(
+                    value=f"{self.homing_fast_speed}",
+                    type="number",
+                    placeholder="Fast homing speed (mm/s)",
+                    id="homing-fast-speed-input",
+                    validate_on=["submitted"],
+                    validators=[Number(minimum=HOMING_MIN_FAST_SPEED, maximum=HOMING_MAX_FAST_SPEED)],
+                    classes="input-fields",
+                )
+                yield Label("mm/s", id="homing-fast-speed-unit")
             yield Button("Test StallGuard Threshold", id="test-stallguard-threshold-btn")
 
     def _on_mount(self, event: events.Mount) -> None:
@@ -137,6 +156,7 @@ class AdvancedSettings(Static):
         self.app_state.status_advanced.update_homing_revs(self.homing_revs)
         self.app_state.status_advanced.update_homing_threshold(self.homing_threshold)
         self.app_state.status_advanced.update_homing_speed(self.homing_speed)
+        self.app_state.status_advanced.update_homing_fast_speed(self.homing_two_speed, self.homing_fast_speed)
 
     def reset_settings_to_default(self):
         self.set_step_mode(DEFAULT_STEP_MODE)
@@ -152,6 +172,7 @@ class AdvancedSettings(Static):
         self.query_one("#interpolation-checkbox", Checkbox).value = USE_INTERPOLATION
         self.set_spread_cycle(USE_SPREAD_CYCLE)
         self.query_one("#spread-cycle-checkbox", Checkbox).value = USE_SPREAD_CYCLE
+        self.query_one("#record-step-timing-checkbox", Checkbox).value = RECORD_STEP_TIMING
 
         self.set_threshold_speed(DEFAULT_THRESHOLD_SPEED)
         self.query_one("#threshold-speed-input", Input).value = f"{DEFAULT_THRESHOLD_SPEED}"
@@ -166,6 +187,9 @@ class AdvancedSettings(Static):
         self.query_one("#homing-threshold-input", Input).value = f"{HOMING_THRESHOLD}"
         self.set_homing_speed(HOMING_SPEED_MM_S)
         self.query_one("#homing-speed-input", Input).value = f"{HOMING_SPEED_MM_S}"
+        self.set_homing_fast_speed(HOMING_TWO_SPEED, HOMING_FAST_SPEED_MM_S)
+        self.query_one("#homing-two-speed-switch", Switch).value = HOMING_TWO_SPEED
+        self.query_one("#homing-fast-speed-input", Input).value = f"{HOMING_FAST_SPEED_MM_S}"
 
     @on(Input.Submitted, "#acceleration-input")
     def submit_acceleration_input(self):
@@ -198,6 +222,10 @@ class AdvancedSettings(Static):
         spread_cycle = event.checkbox.value
         self.set_spread_cycle(spread_cycle)
 
+    @on(Checkbox.Changed, "#record-step-timing-checkbox")
+    def toggle_record_step_timing(self, event: Checkbox.Changed):
+        self.app_state.motor_driver.set_step_timing_recording(event.checkbox.value)
+
     @on(Switch.Changed, "#threshold-speed-switch")
     def toggle_threshold_speed(self, event: Switch.Changed):
         self.threshold_speed_enabled = event.switch.value
@@ -230,16 +258,18 @@ class AdvancedSettings(Static):
         spread_cycle_checkbox.value = self.spread_cycle
 
     def update_motor_configuration(self):
-        if self.threshold_speed_enabled and self.app_state.speed_controls.speed >= self.threshold_speed:
-            # High-speed configuration
-            self.set_step_mode(HIGH_SPEED_STEP_MODE)
-            self.set_interpolation(HIGH_SPEED_INTERPOLATION)
-            self.set_spread_cycle(HIGH_SPEED_SPREAD_CYCLE)
-        else:
-            # Low-speed configuration
-            self.set_step_mode(LOW_SPEED_STEP_MODE)
-            self.set_interpolation(LOW_SPEED_INTERPOLATION)
-            self.set_spread_cycle(LOW_SPEED_SPREAD_CYCLE)
+        # Merge the step mode, interpolation and spread cycle changes into one write per register
+        with self.app_state.motor_driver.batch_register_writes():
+            if self.threshold_speed_enabled and self.app_state.speed_controls.speed >= self.threshold_speed:
+                # High-speed configuration
+                self.set_step_mode(HIGH_SPEED_STEP_MODE)
+                self.set_interpolation(HIGH_SPEED_INTERPOLATION)
+                self.set_spread_cycle(HIGH_SPEED_SPREAD_CYCLE)
+            else:
+                # Low-speed configuration
+                self.set_step_mode(LOW_SPEED_STEP_MODE)
+                self.set_interpolation(LOW_SPEED_INTERPOLATION)
+                self.set_spread_cycle(LOW_SPEED_SPREAD_CYCLE)
         self.update_control_mode_widgets_value()
 
     def update_control_mode_widgets_state(self):
@@ -275,6 +305,18 @@ class AdvancedSettings(Static):
         homing_speed_input.value = f"{homing_speed_validated}"
         self.set_homing_speed(homing_speed_validated)
 
+    @on(Switch.Changed, "#homing-two-speed-switch")
+    def toggle_homing_two_speed(self, event: Switch.Changed):
+        self.set_homing_fast_speed(event.switch.value, self.homing_fast_speed)
+
+    @on(Input.Submitted, "#homing-fast-speed-input")
+    def submit_homing_fast_speed_input(self):
+        homing_fast_speed_input = self.query_one("#homing-fast-speed-input", Input)
+        homing_fast_speed = float(homing_fast_speed_input.value)
+        homing_fast_speed_validated = clamp(homing_fast_speed, HOMING_MIN_FAST_SPEED, HOMING_MAX_FAST_SPEED)
+        homing_fast_speed_input.value = f"{homing_fast_speed_validated}"
+        self.set_homing_fast_speed(self.homing_two_speed, homing_fast_speed_validated)
+
     @on(Button.Pressed, "#test-stallguard-threshold-btn")
     async def test_stallguard_threshold(self):
         log = self.app.query_one("#logger", RichLog)
@@ -321,3 +363,8 @@ class AdvancedSettings(Static):
     def set_homing_speed(self, homing_speed: float):
         self.homing_speed = homing_speed
         self.app_state.status_advanced.update_homing_speed(self.homing_speed)
+
+    def set_homing_fast_speed(self, two_speed: bool, homing_fast_speed: float):
+        self.homing_two_speed = two_speed
+        self.homing_fast_speed = homing_fast_speed
+        self.app_state.status_advanced.update_homing_fast_speed(self.homing_two_speed, self.homing_fast_speed)
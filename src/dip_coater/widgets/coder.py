@@ -6,9 +6,15 @@ from textual.app import ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.validation import Function
 from textual.widgets import Static, Label, TextArea, Button, Input, Markdown, Collapsible, TabbedContent, RichLog
+from textual.widgets.text_area import LanguageDoesNotExist
 
+from dip_coater.motor.program import ProgramBuilder
+from dip_coater.motor.program_executor import ProgramExecutor
+from dip_coater.recipe import RECIPE_FORMATS, compile_recipe, parse_recipe
 from dip_coater.widgets.position_controls import PositionControls
 from dip_coater.utils.helpers import config_load_coder_filepath, config_save_coder_filepath
+from dip_coater.utils.threading_util import LoopBridge, ScriptAborted
+from dip_coater.utils.timeline import Timeline, recorded
 from dip_coater.constants import HOME_UP
 
 
@@ -18,10 +24,19 @@ class Coder(Static):
     def __init__(self, app_state):
         super().__init__()
         self.app_state = app_state
+        self.timeline = Timeline(app_state.clock)
+        self.abort_signal = app_state.abort_signal  # Aborts the running code at its next API call (STOP button)
+        self._bridge = None     # Runs the API actions of the code thread on the event loop of the app
+        self.planner = None     # Plans the API calls of the running code, to schedule its sleeps against deadlines
+        self.program = None     # Motion program of the last valid dry run
+        self._program_start = None  # Position and motor state the program was compiled for
+        self.recipe_format = None   # Format of the recipe in the editor (None = Python code)
 
     def compose(self) -> ComposeResult:
         with Vertical():
-            yield Label("Enter your Coder API code below and press 'RUN code' to execute it.")
+            yield Label("Enter your Coder API code below and press 'RUN code' to execute it. 'DRY RUN' checks the "
+                        "code without moving, after which 'RUN plan' runs the checked moves in one go. Recipe files "
+                        "(.json, .toml) are always checked before they run.")
             with Collapsible(title="View Coder API", collapsed=True, id="coder-api-collapsible"):
                 with open(Path(__file__).parent.parent / "coder_API.md") as text:
                     md = Markdown(
@@ -42,6 +57,16 @@ class Coder(Static):
                     id="run-code-btn",
                     variant="success",
                 )
+                yield Button(
+                    "DRY RUN",
+                    id="dry-run-btn",
+                )
+                yield Button(
+                    "RUN plan",
+                    id="run-plan-btn",
+                    variant="success",
+                    disabled=True,
+                )
                 yield Button(
                     "LOAD code from file",
                     id="load-code-btn",
@@ -53,8 +78,9 @@ class Coder(Static):
                         placeholder="Input file path to python code, or empty for default code",
                         id="code-file-path-input",
                         validate_on=["changed"],
-                        validators=[Function(self.is_file_path_valid_python,
-                                             "File path does not point to valid Python (.py) file")],
+                        validators=[Function(self.is_file_path_valid_code,
+                                             "File path does not point to a Python (.py) or recipe (.json, .toml) "
+                                             "file")],
                     )
                     yield Label("", id="coder-path-invalid-reasons")
 
@@ -65,12 +91,100 @@ class Coder(Static):
 
     @on(Button.Pressed, "#run-code-btn")
     async def run_code(self):
+        if self.recipe_format is not None:
+            # Recipes always run as a checked plan
+            await self.dry_run_code()
+            if self.program is not None:
+                await self.run_plan()
+            return
         self.code = self.app.query_one("#code-editor", TextArea).text
         tabbed_content = self.app.query_one("#tabbed-content", TabbedContent)
         tabbed_content.active = "main-tab"
         await asyncio.sleep(0.1)
         await self.exec_code_async()
 
+    @on(Button.Pressed, "#dry-run-btn")
+    async def dry_run_code(self):
+        self.code = self.app.query_one("#code-editor", TextArea).text
+        log = self.app.query_one("#logger", RichLog)
+        builder = self.create_program_builder()
+        self.set_program(None)
+        log.write("[blue]Dry run >>>>>>>>>>>>[/]")
+        try:
+            program = await asyncio.get_running_loop().run_in_executor(None, self.compile_code, builder)
+        except Exception as e:
+            log.write(f"[red]Error compiling code: {e}[/]")
+            return
+        log.write(program.format())
+        if program.valid:
+            log.write("[dark_cyan]>>>>>>>>>>>> Plan is valid, press 'RUN plan' to run it.[/]")
+            self.set_program(program)
+        else:
+            log.write(f"[red]>>>>>>>>>>>> Plan has {len(program.violations)} violations.[/]")
+
+    def create_program_builder(self) -> ProgramBuilder:
+        """ Create a ProgramBuilder that starts from the current state of the motor and the settings of the app """
+        advanced_settings = self.app_state.advanced_settings
+        return ProgramBuilder.for_driver(
+            self.app_state.motor_driver, speed_mm_s=self.app_state.speed_controls.speed,
+            acceleration_mm_s2=advanced_settings.acceleration, homing_speed_mm_s=advanced_settings.homing_speed,
+            homing_fast_speed_mm_s=advanced_settings.homing_fast_speed if advanced_settings.homing_two_speed else None)
+
+    def compile_code(self, builder: ProgramBuilder):
+        """ Compile the code (or recipe) in the editor into a motion program """
+        if self.recipe_format is not None:
+            return compile_recipe(parse_recipe(self.code, self.recipe_format), builder)
+        return builder.compile(self.code)
+
+    @on(Button.Pressed, "#run-plan-btn")
+    async def run_plan(self):
+        program = self.program
+        log = self.app.query_one("#logger", RichLog)
+        if program is None:
+            return
+        if self._motor_start() != self._program_start:
+            log.write("[red]The motor moved or changed state since the dry run, please dry run the code again.[/]")
+            self.set_program(None)
+            return
+        tabbed_content = self.app.query_one("#tabbed-content", TabbedContent)
+        tabbed_content.active = "main-tab"
+        motor_controls = self.app_state.motor_controls
+        motor_driver = self.app_state.motor_driver
+        loop = asyncio.get_running_loop()
+        bridge = LoopBridge(loop)
+        executor = ProgramExecutor(motor_driver, log=lambda message: bridge.call(log.write, f"[red]{message}[/]"),
+                                   abort_signal=self.abort_signal)
+        self.set_program(None)
+        log.write(f"[blue]Running the plan ({len(program)} steps, estimated {program.total_s:.3f} s) >>>>>>>>>>>>[/]")
+        motor_controls.set_motor_state("moving")
+        try:
+            completed = await loop.run_in_executor(None, executor.run, program)
+            log.write(executor.timeline.format())
+            if completed:
+                log.write(f"[dark_cyan]>>>>>>>>>>>> Plan finished in {executor.timeline.elapsed_s:.3f} s.[/]")
+            elif self.abort_signal.aborted:
+                log.write(f"[dark_orange]>>>>>>>>>>>> Plan aborted after {executor.timeline.elapsed_s:.3f} s.[/]")
+        except ValueError as e:
+            log.write(f"[red]{e}[/]")
+        finally:
+            motor_controls.set_homing_found(motor_driver.homing_found)
+            motor_controls.set_motor_state("enabled" if motor_driver.motor_enabled else "disabled")
+
+    @on(TextArea.Changed, "#code-editor")
+    def invalidate_program(self):
+        self.set_program(None)
+
+    def set_program(self, program):
+        """ Set the motion program to run with 'RUN plan' (None = no valid program) """
+        self.program = program
+        self._program_start = self._motor_start() if program is not None else None
+        self.query_one("#run-plan-btn", Button).disabled = program is None
+
+    def _motor_start(self) -> tuple:
+        """ The position and state of the motor a program starts from """
+        motor_driver = self.app_state.motor_driver
+        return motor_driver.get_current_position(HOME_UP), motor_driver.motor_enabled
+
     def set_editor_text(self, text: str):
         self.query_one("#code-editor", TextArea).text = text
 
@@ -85,11 +199,11 @@ class Coder(Static):
                 .update("[green]Valid file path[/]"))
 
     @staticmethod
-    def is_file_path_valid_python(file_path: str) -> bool:
+    def is_file_path_valid_code(file_path: str) -> bool:
         # Default code is allowed
         if file_path is None or file_path == "":
             return True
-        return Path(file_path).suffix == ".py"
+        return Path(file_path).suffix == ".py" or Path(file_path).suffix.lower() in RECIPE_FORMATS
 
     @on(Input.Submitted, "#code-file-path-input")
     @on(Button.Pressed, "#load-code-btn")
@@ -97,7 +211,7 @@ class Coder(Static):
         file_path_input = self.query_one("#code-file-path-input", Input)
         file_path = file_path_input.value
 
-        if not self.is_file_path_valid_python(file_path):
+        if not self.is_file_path_valid_code(file_path):
             return
 
         self.load_code_from_file(file_path)
@@ -110,6 +224,12 @@ class Coder(Static):
             self.load_code_into_editor(file_path)
 
     def load_code_into_editor(self, file_path):
+        self.recipe_format = RECIPE_FORMATS.get(Path(file_path).suffix.lower())
+        editor = self.query_one("#code-editor", TextArea)
+        try:
+            editor.language = self.recipe_format or "python"
+        except LanguageDoesNotExist:
+            editor.language = None
         with open(file_path) as text:
             self.set_editor_text(text.read())
 
@@ -121,49 +241,95 @@ class Coder(Static):
         log = self.app.query_one("#logger", RichLog)
         try:
             log.write("[blue]Executing code >>>>>>>>>>>>[/]")
+            self.planner = self.create_program_builder()
+            self.timeline.start()
             loop = asyncio.get_running_loop()
+            self._bridge = LoopBridge(loop)
+            self.abort_signal.start()
             await loop.run_in_executor(None, self.exec_code)
-            log.write("[dark_cyan]>>>>>>>>>>>> Code finished.[/]")
+            log.write(self.timeline.format())
+            log.write(f"[dark_cyan]>>>>>>>>>>>> Code finished in {self.timeline.elapsed_s:.3f} s.[/]")
+        except ScriptAborted:
+            log.write(self.timeline.format())
+            log.write(f"[dark_orange]>>>>>>>>>>>> Code aborted after {self.timeline.elapsed_s:.3f} s.[/]")
         except Exception as e:
             log.write(f"[red]Error executing code: {e}[/]")
             raise e
+        finally:
+            self.abort_signal.finish()
 
     def exec_code(self):
         exec(self.code)
 
-    @staticmethod
-    def async_run(func, *args):
+    def async_run(self, func, *args):
+        """ Run an async action on the event loop of the app (from the code thread) and wait until it is done """
         async def run():
-            await func(*args)
-        asyncio.run(run())
+            # Checked on the event loop, where the STOP button runs too, so no move starts after an abort
+            self.abort_signal.check()
+            return await func(*args)
+        return self._bridge.run(run)
 
     ''' ========== API for the code editor ========== '''
 
+    @recorded
     def enable_motor(self):
         self.async_run(self.app_state.motor_controls.enable_motor_action)
 
+    @recorded
     def disable_motor(self):
         self.async_run(self.app_state.motor_controls.disable_motor_action)
 
+    @recorded
     def move_up(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
         # NOTE: We are purposely not changing the distance, speed and acceleration settings here,
         # as this may be undesirable in some cases.
         self.async_run(self.app_state.motor_controls.move_up, distance_mm, speed_mm_s, acceleration_mm_s2)
 
+    @recorded
     def move_down(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
         # NOTE: We are purposely not changing the distance, speed and acceleration settings here,
         # as this may be undesirable in some cases.
         self.async_run(self.app_state.motor_controls.move_down, distance_mm, speed_mm_s, acceleration_mm_s2)
 
+    @recorded
+    def move_up_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float = None):
+        self.async_run(self.app_state.motor_controls.move_speed_profile, distance_mm, speed_profile,
+                       acceleration_mm_s2)
+
+    @recorded
+    def move_down_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float = None):
+        self.async_run(self.app_state.motor_controls.move_speed_profile, -distance_mm, speed_profile,
+                       acceleration_mm_s2)
+
+    @recorded
+    def queue_move_up(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        if acceleration_mm_s2 is None:
+            acceleration_mm_s2 = self.app_state.advanced_settings.acceleration
+        self.app_state.motor_driver.queue_move(distance_mm, speed_mm_s, acceleration_mm_s2)
+
+    @recorded
+    def queue_move_down(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
+        if acceleration_mm_s2 is None:
+            acceleration_mm_s2 = self.app_state.advanced_settings.acceleration
+        self.app_state.motor_driver.queue_move(-distance_mm, speed_mm_s, acceleration_mm_s2)
+
+    @recorded
+    def run_queue(self):
+        self.async_run(self.app_state.motor_controls.run_motion_queue)
+
+    @recorded
     def home_motor(self, home_up: bool = HOME_UP):
         self.async_run(self.app_state.motor_controls.perform_homing, home_up)
 
+    @recorded
     def move_to_position(self, position_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None,
                          home_up: bool = HOME_UP):
         self.async_run(self.app.query_one(PositionControls).move_to_position, position_mm, speed_mm_s,
                        acceleration_mm_s2, home_up)
 
+    @recorded
     def sleep(self, seconds: float):
         log = self.app.query_one("#logger", RichLog)
-        log.write(f"[cyan]...Sleeping for {seconds} seconds...[/]")
-        self.async_run(asyncio.sleep, seconds)
+        self._bridge.call(log.write, f"[cyan]...Sleeping for {seconds} seconds...[/]")
+        # Sleep until the planned end of the sleep, so the overruns of the moves before it don't add up
+        self.timeline.wait_for_deadline(self.abort_signal)
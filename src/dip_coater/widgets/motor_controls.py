@@ -26,6 +26,7 @@ class MotorControls(Static):
         super().__init__()
         self.app_state = app_state
         self.app_state.homing_found = False
+        self._homing_task = None
 
     def compose(self) -> ComposeResult:
         yield Button("Move UP ↑", id="move-up", variant="primary")
@@ -33,7 +34,7 @@ class MotorControls(Static):
         yield Button("ENABLE motor", id="enable-motor", variant="success")
         yield Button("DISABLE motor", id="disable-motor", variant="error")
         yield Button("Do HOMING", id="do-homing")
-        #yield Button("STOP moving", id="stop-moving", variant="error")         Doesn't work currently...
+        yield Button("STOP moving", id="stop-moving", variant="error")
 
     def _on_mount(self, event: events.Mount) -> None:
         self.update_status_widgets()
@@ -68,7 +69,8 @@ class MotorControls(Static):
     @on(Button.Pressed, "#move-up")
     async def move_up_action(self):
         distance_mm, speed_mm_s, accel_mm_s2, step_mode = self.get_parameters()
-        await self.move_up(distance_mm, speed_mm_s, accel_mm_s2)
+        # Run in a worker, so the STOP button is handled while moving
+        self.run_worker(self.move_up(distance_mm, speed_mm_s, accel_mm_s2), group="moving")
 
     async def move_up(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
         log = self.app.query_one("#logger", RichLog)
@@ -79,14 +81,13 @@ class MotorControls(Static):
             log.write(
                 f"Moving up ({distance_mm=} mm, {speed_mm_s=} mm/s, {acceleration_mm_s2=} mm/s\u00b2, {step_mode=} µs).")
             self.set_motor_state("moving")
-            await asyncio.sleep(0.1)
             try:
                 self.app_state.motor_driver.move_up(distance_mm, speed_mm_s, acceleration_mm_s2, [LIMIT_SWITCH_UP_PIN])
-                stop = await self.app_state.motor_driver.wait_for_motor_done_async()
-                if stop == StopMode.NO:
-                    log.write(f"-> Finished moving up.")
+                result = await self.app_state.motor_driver.wait_for_move_result_async()
+                if result.stop_mode == StopMode.NO:
+                    log.write("-> Finished moving up.")
                 else:
-                    log.write(f"[red]-> Stopped moving up {stop}.[/]")
+                    log.write(f"[red]-> Stopped moving up {result.stop_mode} (at {result.position} µsteps).[/]")
                 self.set_motor_state("enabled")
             except ValueError as e:
                 log.write(f"[red]{e}[/]")
@@ -97,7 +98,8 @@ class MotorControls(Static):
     @on(Button.Pressed, "#move-down")
     async def move_down_action(self):
         distance_mm, speed_mm_s, accel_mm_s2, step_mode = self.get_parameters()
-        await self.move_down(distance_mm, speed_mm_s, accel_mm_s2)
+        # Run in a worker, so the STOP button is handled while moving
+        self.run_worker(self.move_down(distance_mm, speed_mm_s, accel_mm_s2), group="moving")
 
     async def move_down(self, distance_mm: float, speed_mm_s: float, acceleration_mm_s2: float = None):
         log = self.app.query_one("#logger", RichLog)
@@ -108,14 +110,13 @@ class MotorControls(Static):
             log.write(
                 f"Moving down ({distance_mm=} mm, {speed_mm_s=} mm/s, {acceleration_mm_s2=} mm/s\u00b2, {step_mode=} µs).")
             self.set_motor_state("moving")
-            await asyncio.sleep(0.1)
             try:
                 self.app_state.motor_driver.move_down(distance_mm, speed_mm_s, acceleration_mm_s2, [LIMIT_SWITCH_DOWN_PIN])
-                stop = await self.app_state.motor_driver.wait_for_motor_done_async()
-                if stop == StopMode.NO:
-                    log.write(f"-> Finished moving down.")
+                result = await self.app_state.motor_driver.wait_for_move_result_async()
+                if result.stop_mode == StopMode.NO:
+                    log.write("-> Finished moving down.")
                 else:
-                    log.write(f"[red]-> Stopped moving down {stop}.[/]")
+                    log.write(f"[red]-> Stopped moving down {result.stop_mode} (at {result.position} µsteps).[/]")
                 self.set_motor_state("enabled")
             except ValueError as e:
                 log.write(f"[red]{e}[/]")
@@ -123,13 +124,64 @@ class MotorControls(Static):
         else:
             log.write("[red]We cannot move down when the motor is disabled[/]")
 
+    async def move_speed_profile(self, distance_mm: float, speed_profile, acceleration_mm_s2: float = None):
+        log = self.app.query_one("#logger", RichLog)
+        if self.app_state.motor_state == "enabled":
+            def_dist, def_speed, def_accel, step_mode = self.get_parameters()
+            if acceleration_mm_s2 is None:
+                acceleration_mm_s2 = def_accel
+            limit_switch_pin = LIMIT_SWITCH_UP_PIN if distance_mm > 0 else LIMIT_SWITCH_DOWN_PIN
+            log.write(f"Moving with a speed profile ({distance_mm=} mm, {acceleration_mm_s2=} mm/s\u00b2, {step_mode=} µs).")
+            self.set_motor_state("moving")
+            try:
+                self.app_state.motor_driver.run_speed_profile(distance_mm, speed_profile, acceleration_mm_s2,
+                                                              [limit_switch_pin])
+                result = await self.app_state.motor_driver.wait_for_move_result_async()
+                if result.stop_mode == StopMode.NO:
+                    log.write("-> Finished moving with the speed profile.")
+                else:
+                    log.write(f"[red]-> Stopped moving with the speed profile {result.stop_mode} "
+                              f"(at {result.position} µsteps).[/]")
+                self.set_motor_state("enabled")
+            except ValueError as e:
+                log.write(f"[red]{e}[/]")
+                self.set_motor_state("enabled")
+        else:
+            log.write("[red]We cannot move when the motor is disabled[/]")
+
+    async def run_motion_queue(self):
+        log = self.app.query_one("#logger", RichLog)
+        motor_driver = self.app_state.motor_driver
+        if self.app_state.motor_state == "enabled":
+            limit_switch_pins = []
+            if any(distance_mm > 0 for distance_mm, *_ in motor_driver.queued_moves):
+                limit_switch_pins.append(LIMIT_SWITCH_UP_PIN)
+            if any(distance_mm < 0 for distance_mm, *_ in motor_driver.queued_moves):
+                limit_switch_pins.append(LIMIT_SWITCH_DOWN_PIN)
+            log.write(f"Running {len(motor_driver.queued_moves)} queued moves.")
+            self.set_motor_state("moving")
+            try:
+                motor_driver.run_queue(limit_switch_pins)
+                result = await motor_driver.wait_for_move_result_async()
+                if result.stop_mode == StopMode.NO:
+                    log.write("-> Finished queued moves.")
+                else:
+                    log.write(f"[red]-> Stopped queued moves {result.stop_mode} (at {result.position} µsteps).[/]")
+                self.set_motor_state("enabled")
+            except ValueError as e:
+                log.write(f"[red]{e}[/]")
+                self.set_motor_state("enabled")
+        else:
+            motor_driver.clear_queue()
+            log.write("[red]We cannot run the queued moves when the motor is disabled[/]")
+
     @on(Button.Pressed, "#enable-motor")
     async def enable_motor_action(self):
         log = self.app.query_one("#logger", RichLog)
         if self.app_state.motor_state == "disabled":
             self.app_state.motor_driver.enable_motor()
             self.set_motor_state("enabled")
-            log.write(f"[green]Motor is now enabled.[/]")
+            log.write("[green]Motor is now enabled.[/]")
 
     @on(Button.Pressed, "#disable-motor")
     async def disable_motor_action(self):
@@ -143,15 +195,16 @@ class MotorControls(Static):
         elif self.app_state.motor_state == "enabled":
             self.app_state.motor_driver.disable_motor()
             self.set_motor_state("disabled")
-            log.write(f"[dark_orange]Motor is now disabled.[/]")
+            log.write("[dark_orange]Motor is now disabled.[/]")
 
     @on(Button.Pressed, "#do-homing")
     async def do_homing_action(self):
         if self.app_state.motor_state == "enabled":
-            await self.perform_homing()
+            # Run in a worker, so the UI (and this button) stays responsive while homing
+            self.run_worker(self.perform_homing(), group="homing")
         elif self.app_state.motor_state == "homing":
-            # Do nothing when already homing
-            return
+            # Pressing the button again cancels the homing
+            self.cancel_homing()
         else:
             log = self.app.query_one("#logger", RichLog)
             log.write("[red]We cannot do homing when the motor is disabled[/]")
@@ -159,32 +212,55 @@ class MotorControls(Static):
     @on(Button.Pressed, "#stop-moving")
     async def stop_moving_action(self):
         log = self.app.query_one("#logger", RichLog)
+        # Abort the running Coder script or plan first, so it doesn't start a next move after the stopped one
+        aborted = self.app_state.abort_signal.abort()
         if self.app_state.motor_state == "moving":
-            self.app_state.motor_driver.stop_motor()
+            self.app_state.motor_driver.stop_motor(StopMode.HARDSTOP)
             log.write("[dark_orange]Motor movement stopped.[/]")
-        else:
+        elif self.app_state.motor_state == "homing":
+            self.cancel_homing()
+        elif not aborted:
             log.write("[red]No movement to stop[/]")
 
     async def perform_homing(self, home_up: bool = HOME_UP):
         log = self.app.query_one("#logger", RichLog)
-        speed = self.app.query_one(AdvancedSettings).homing_speed
+        advanced_settings = self.app.query_one(AdvancedSettings)
+        speed = advanced_settings.homing_speed
+        fast_speed = advanced_settings.homing_fast_speed if advanced_settings.homing_two_speed else None
 
-        log.write(f"[cyan]Starting limit switch homing ({speed=} mm/s)...[/]")
+        log.write(f"[cyan]Starting limit switch homing ({speed=} mm/s, {fast_speed=} mm/s)...[/]")
         self.set_motor_state("homing")
-        await asyncio.sleep(0.1)
+        homing_button = self.query_one("#do-homing", Button)
+        homing_button.label = "CANCEL homing"
         try:
             distance = HOMING_MAX_DISTANCE if home_up else -HOMING_MAX_DISTANCE
-            homing_found = self.app_state.motor_driver.do_limit_switch_homing(LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_DOWN_PIN,
-                                                                    distance, speed)
+            self._homing_task = asyncio.ensure_future(self.app_state.motor_driver.do_limit_switch_homing_async(
+                LIMIT_SWITCH_UP_PIN, LIMIT_SWITCH_DOWN_PIN, distance, speed, progress=self.app_state.status.update_homing_phase,
+                fast_speed_mm_s=fast_speed))
+            homing_found = await self._homing_task
             if homing_found:
                 log.write("-> Finished homing.")
+                record = self.app_state.motor_driver.homing_records[-1]
+                if record.zero_shift_mm is not None:
+                    log.write(f"   Zero shifted {record.zero_shift_mm:+.4f} mm w.r.t. the previous homing.")
             else:
                 log.write("[red]Homing failed[/]")
             self.set_homing_found(homing_found)
+        except asyncio.CancelledError:
+            log.write("[dark_orange]Homing cancelled.[/]")
+            self.set_homing_found(False)
         except ValueError as e:
             log.write(f"[red]{e}[/]")
+        finally:
+            self._homing_task = None
+            homing_button.label = "Do HOMING"
         self.set_motor_state("enabled")
 
+    def cancel_homing(self):
+        task = self._homing_task
+        if task is not None and not task.done():
+            task.cancel()
+
     def set_homing_found(self, homing_found: bool):
         self.app_state.homing_found = homing_found
         self.app_state.status.update_homing_found(self.app_state.homing_found)
@@ -7,7 +7,7 @@ from textual.containers import Vertical
 from textual.widgets import Label
 from textual.widgets import Rule
 
-from dip_coater.motor.tmc2209 import TMC2209_MotorDriver
+from dip_coater.motor.tmc2209 import TMC2209_MotorDriver, HomingPhase
 from dip_coater.app_state import app_state
 from dip_coater.utils.threading_util import AsyncioStoppableTimer
 
@@ -16,6 +16,7 @@ class Status(Static):
     speed = reactive("Speed: ")
     distance = reactive("Distance: ")
     homing_found = reactive("Homing found: ")
+    homing_phase = reactive("Homing: -")
     limit_switch_up = reactive("Limit switch up: ")
     limit_switch_down = reactive("Limit switch down: ")
     motor = reactive("Motor: ")
@@ -32,6 +33,7 @@ class Status(Static):
             yield Label(id="status-speed")
             yield Label(id="status-distance")
             yield Label(id="status-homing-found")
+            yield Label(id="status-homing-phase")
             yield Label(id="status-limit-switch-up")
             yield Label(id="status-limit-switch-down")
             yield Rule()
@@ -40,7 +42,7 @@ class Status(Static):
 
     def on_mount(self):
         self.update_motor_state(app_state.motor_state)
-        self.position_thread = AsyncioStoppableTimer(0.5, self.fetch_new_position)
+        self.position_thread = AsyncioStoppableTimer(0.5, self.fetch_new_position, clock=app_state.clock)
         self.position_thread.start()
 
     def watch_speed(self, speed: str):
@@ -61,6 +63,17 @@ class Status(Static):
     def update_homing_found(self, homing_finished: bool):
         self.homing_found = f"Homing found: {homing_finished}"
 
+    def watch_homing_phase(self, homing_phase: str):
+        self.query_one("#status-homing-phase", Label).update(homing_phase)
+
+    def update_homing_phase(self, phase: HomingPhase, travelled_mm: float = 0):
+        if phase in (HomingPhase.BACK_OFF, HomingPhase.FAST_APPROACH, HomingPhase.APPROACH, HomingPhase.RELEASE):
+            self.homing_phase = f"Homing: [cyan]{phase.value}[/] ({travelled_mm:.1f} mm)"
+        elif phase == HomingPhase.DONE:
+            self.homing_phase = f"Homing: [green]{phase.value}[/]"
+        else:
+            self.homing_phase = f"Homing: [red]{phase.value}[/]"
+
     def watch_limit_switch_up(self, limit_switch_up: str):
         self.query_one("#status-limit-switch-up", Label).update(limit_switch_up)
 
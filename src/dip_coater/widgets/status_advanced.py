@@ -16,6 +16,7 @@ class StatusAdvanced(Static):
     homing_revs = reactive("Homing revolutions: ")
     homing_threshold = reactive("Homing StallGuard threshold: ")
     homing_speed = reactive("Homing speed: ")
+    homing_fast_speed = reactive("Fast homing speed: ")
 
     def __init__(self, app_state, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -37,6 +38,7 @@ class StatusAdvanced(Static):
             yield Label(id="status-homing-revolutions")
             yield Label(id="status-homing-threshold")
             yield Label(id="status-homing-speed")
+            yield Label(id="status-homing-fast-speed")
 
     def watch_step_mode(self, step_mode: str):
         self.query_one("#status-step-mode", Label).update(step_mode)
@@ -108,3 +110,12 @@ class StatusAdvanced(Static):
 
     def update_homing_speed(self, homing_speed: float):
         self.homing_speed = f"Homing speed: {homing_speed} mm/s"
+
+    def watch_homing_fast_speed(self, homing_fast_speed: str):
+        self.query_one("#status-homing-fast-speed", Label).update(homing_fast_speed)
+
+    def update_homing_fast_speed(self, two_speed: bool, homing_fast_speed: float):
+        if two_speed:
+            self.homing_fast_speed = f"Fast homing speed: {homing_fast_speed} mm/s"
+        else:
+            self.homing_fast_speed = "Fast homing speed: [dark_orange]OFF[/]"
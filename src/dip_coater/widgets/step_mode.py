@@ -29,8 +29,15 @@ class StepMode(Static):
         self.set_step_mode(step_mode, event.pressed.label)
 
     def set_step_mode(self, step_mode: int, step_mode_label):
+        try:
+            self.app_state.motor_driver.set_step_mode(step_mode)
+        except ValueError as e:
+            self.app.query_one("#logger", RichLog).write(f"[red]{e}[/]")
+            # Select the step mode that is still active again
+            mode = next(mode for mode, value in STEP_MODES.items() if value == self.step_mode)
+            self.query_one(f"#{mode}", RadioButton).value = True
+            return
         self.step_mode = step_mode
-        self.app_state.motor_driver.set_step_mode(self.step_mode)
         if STEP_MODE_WRITE_TO_LOG:
             log = self.app.query_one("#logger", RichLog)
             log.write(f"StepMode set to {step_mode_label} µsteps.")
@@ -0,0 +1,62 @@
+""" Restore of the homed position after a restart, with the simulated TMC library and GPIO
+
+A first motor driver is homed (the homed state is set directly) and shut down with the motor held. A second motor
+driver, on the same GPIO (the enable pin stays driven, as over a restart of the app), must restore the homed position
+from the position journal.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # The src directory
+
+try:
+    import TMC_2209
+except ModuleNotFoundError:
+    import MyTMC_2209 as TMC_2209
+    sys.modules["TMC_2209"] = TMC_2209
+
+from TMC_2209._TMC_2209_logger import Loglevel
+from dip_coater.app_state import AppState
+from dip_coater.gpio import get_gpio_instance, GpioState
+from dip_coater.motor.tmc2209 import TMC2209_MotorDriver
+
+
+def create_motor_driver(app_state, journal_path: str) -> TMC2209_MotorDriver:
+    return TMC2209_MotorDriver(app_state, loglevel=Loglevel.ERROR, journal_path=journal_path, hold_motor_on_exit=True)
+
+
+def test_restore_held_homed_position():
+    app_state = AppState()
+    app_state.gpio = get_gpio_instance("simulated")
+    with tempfile.TemporaryDirectory() as directory:
+        journal_path = os.path.join(directory, "position.jsonl")
+
+        motor_driver = create_motor_driver(app_state, journal_path)
+        motor_driver.enable_motor()
+        motor_driver.homing_found = True
+        motor_driver.drive_motor(2.5, 5)
+        motor_driver.wait_for_motor_done()
+        position = motor_driver.get_current_position()
+        motor_driver.cleanup()
+        assert app_state.gpio.input(motor_driver.en_pin) == GpioState.LOW, "The motor was released on shutdown"
+
+        motor_driver = create_motor_driver(app_state, journal_path)
+        assert motor_driver.motor_enabled, "The held motor was released on start-up"
+        assert motor_driver.restore_from_journal(), "The homed position was not restored"
+        assert motor_driver.homing_found
+        assert motor_driver.get_current_position() == position
+
+        # Without holding the motor, the next start-up needs a homing again
+        motor_driver.hold_motor_on_exit = False
+        motor_driver.cleanup()
+        app_state.gpio = get_gpio_instance("simulated")
+        motor_driver = create_motor_driver(app_state, journal_path)
+        assert not motor_driver.motor_enabled
+        assert not motor_driver.restore_from_journal(), "The homed position was restored without holding the motor"
+        motor_driver.cleanup()
+
+
+if __name__ == "__main__":
+    test_restore_held_homed_position()
+    print("Restored the held, homed position")